@@ -4,6 +4,22 @@ from openpyxl import load_workbook
 import numpy as np
 import shutil
 
+from testeBD import trechos_estagios, faixas_estagios, sql_linhas_estagios, aplicar_perfil_sqlite
+from decimacao import indices_decimacao, decimar_colunas
+from medicao import medido
+
+# Colunas de EnsaiosTriaxiais lidas para cada bloco da planilha
+COLUNAS_B = ['time_stage_start', 'rad_press_Original', 'back_press_Original', 'pore_press_Original']
+COLUNAS_ADENSAMENTO = [
+    'stage_no', 'time_test_start', 'time_stage_start',
+    'rad_press_Original', 'rad_vol_Original', 'back_press_Original',
+    'back_vol_Original', 'load_cell_Original', 'pore_press_Original', 'ax_disp_Original'
+]
+COLUNAS_CISALHAMENTO = [
+    'time_stage_start', 'rad_press_Original', 'back_press_Original', 'pore_press_Original',
+    'back_vol_Original', 'ax_disp_Original', 'load_cell_Original', 'ax_strain', 'dev_stress_B'
+]
+
 def safe_float_conversion(value):
     try:
         return float(value)
@@ -25,15 +41,24 @@ def encontrar_primeira_linha_vazia_grupo(sheet, col_indices, linha_inicial=1):
             maior_primeira_livre = linha
     return maior_primeira_livre
 
-def gerar_planilha_para_arquivos(arquivos_selecionados, tipo_ensaio_selecionado, metodo):
+@medido("planilha_excel")
+def gerar_planilha_para_arquivos(arquivos_selecionados, tipo_ensaio_selecionado, metodo,
+                                 modelo_planilha=None, pasta_saida=None, db_path=None):
+    """
+    Preenche as abas 'CP A Data'..'CP E Data' de uma cópia do modelo com
+    os dados dos arquivos selecionados. 'modelo_planilha', 'pasta_saida'
+    e 'db_path' substituem os caminhos padrão (ex.: benchmark.py).
+    Retorna o caminho da planilha gerada (None se nada foi gerado).
+    """
     # Determinar o modelo de planilha com base no TipoEnsaio
-    if tipo_ensaio_selecionado.startswith('TIR'):
-        modelo_planilha = r'C:\Users\lgv_v\Documents\LUIZ\Modelo Planilha Final\ModeloPlanilhaFinal_TIR.xlsx'
-    elif tipo_ensaio_selecionado.startswith('TER'):
-        modelo_planilha = r'C:\Users\lgv_v\Documents\LUIZ\Modelo Planilha Final\ModeloPlanilhaFinal_TER.xlsx'
-    else:
-        print(f"TipoEnsaio '{tipo_ensaio_selecionado}' não reconhecido.")
-        return
+    if modelo_planilha is None:
+        if tipo_ensaio_selecionado.startswith('TIR'):
+            modelo_planilha = r'C:\Users\lgv_v\Documents\LUIZ\Modelo Planilha Final\ModeloPlanilhaFinal_TIR.xlsx'
+        elif tipo_ensaio_selecionado.startswith('TER'):
+            modelo_planilha = r'C:\Users\lgv_v\Documents\LUIZ\Modelo Planilha Final\ModeloPlanilhaFinal_TER.xlsx'
+        else:
+            print(f"TipoEnsaio '{tipo_ensaio_selecionado}' não reconhecido.")
+            return
 
     if not os.path.exists(modelo_planilha):
         print(f"O modelo de planilha não foi encontrado em: {modelo_planilha}")
@@ -41,7 +66,7 @@ def gerar_planilha_para_arquivos(arquivos_selecionados, tipo_ensaio_selecionado,
 
     # Copiar o modelo para criar a nova planilha
     novo_arquivo = os.path.join(
-        r'C:\Users\lgv_v\Documents\LUIZ\Modelo Planilha Final',
+        pasta_saida or r'C:\Users\lgv_v\Documents\LUIZ\Modelo Planilha Final',
         f'Planilha_Preenchida_{tipo_ensaio_selecionado}_{metodo}.xlsx'
     )
     shutil.copy(modelo_planilha, novo_arquivo)
@@ -49,8 +74,9 @@ def gerar_planilha_para_arquivos(arquivos_selecionados, tipo_ensaio_selecionado,
     # Abrir o workbook
     wb = load_workbook(novo_arquivo)
 
-    db_path = r'C:\Users\lgv_v\Documents\LUIZ\database.db'
+    db_path = db_path or r'C:\Users\lgv_v\Documents\LUIZ\database.db'
     conn = sqlite3.connect(db_path)
+    aplicar_perfil_sqlite(conn, leitura=True)
     cursor = conn.cursor()
 
     if not arquivos_selecionados:
@@ -110,41 +136,43 @@ def gerar_planilha_para_arquivos(arquivos_selecionados, tipo_ensaio_selecionado,
             print(f"Valores inválidos para os estágios nos metadados do arquivo {arquivo}.")
             continue
 
-        # Recuperar dados de EnsaiosTriaxiais
-        cursor.execute("""
-            SELECT * FROM EnsaiosTriaxiais WHERE idnome = ?
-        """, (idensaio,))
-        ensaio_data = cursor.fetchall()
-        if not ensaio_data:
+        # Índice de estágios do ensaio (faixas de id em EnsaiosTriaxiais)
+        trechos = trechos_estagios(conn, idensaio)
+        if not trechos:
             print(f"Nenhum dado encontrado para idensaio {idensaio}")
             continue
-        colunas = [description[0] for description in cursor.description]
-
-        data_dict = {col: [] for col in colunas}
-        for row in ensaio_data:
-            for col, value in zip(colunas, row):
-                data_dict[col].append(safe_float_conversion(value))
 
-        def get_stage_data(stage_number):
-            indices = [i for i, val in enumerate(data_dict['stage_no']) if val == stage_number]
-            if not indices:
-                print(f"Nenhum dado encontrado para o estágio {stage_number} no arquivo {arquivo}")
+        def ler_estagios(inicial, final=None, colunas=None):
+            """
+            Linhas dos estágios inicial..final como {coluna: [valores]} ({} se
+            não houver), lendo só as 'colunas' usadas na planilha.
+            """
+            faixas = faixas_estagios(trechos, inicial, final)
+            if not faixas:
                 return {}
-            stage_data = {col: [data_dict[col][i] for i in indices] for col in colunas}
+            sql, params = sql_linhas_estagios(faixas, colunas)
+            cursor.execute(sql, [idensaio] + params)
+            linhas = cursor.fetchall()
+            colunas = [description[0] for description in cursor.description]
+            return {col: [safe_float_conversion(row[i]) for row in linhas]
+                    for i, col in enumerate(colunas)}
+
+        def get_stage_data(stage_number, colunas):
+            stage_data = ler_estagios(stage_number, colunas=colunas)
+            if not stage_data:
+                print(f"Nenhum dado encontrado para o estágio {stage_number} no arquivo {arquivo}")
             return stage_data
 
         # B_data e Adensamento_data para cada estágio exato
-        B_data = get_stage_data(B_stage)
-        adensamento_data = get_stage_data(Adensamento_stage)
+        B_data = get_stage_data(B_stage, COLUNAS_B)
+        adensamento_data = get_stage_data(Adensamento_stage, COLUNAS_ADENSAMENTO)
 
-        # Filtrar dados de cisalhamento entre cis_inicial e cis_final
-        cis_indices = [i for i, val in enumerate(data_dict['stage_no']) if cis_inicial <= val <= cis_final]
-        if not cis_indices:
+        # Dados de cisalhamento entre cis_inicial e cis_final
+        cis_data = ler_estagios(cis_inicial, cis_final, COLUNAS_CISALHAMENTO)
+        if not cis_data:
             print(f"Nenhum dado de cisalhamento encontrado para os estágios {cis_inicial} a {cis_final} no arquivo {arquivo}")
             continue
 
-        cis_data = {col: [data_dict[col][i] for i in cis_indices] for col in colunas}
-
         if not B_data or not adensamento_data or not cis_data:
             print(f"Dados incompletos para o arquivo {arquivo}")
             continue
@@ -253,6 +281,13 @@ def gerar_planilha_para_arquivos(arquivos_selecionados, tipo_ensaio_selecionado,
             'eff_stress_diff': eff_stress_diff
         }
 
+        # Só parte do cisalhamento vai para a planilha: as primeiras 30
+        # linhas e depois uma a cada 10 (mais a última)
+        n_cis = max(len(v) for v in cis_data_preenchimento.values())
+        cis_data_preenchimento = decimar_colunas(
+            cis_data_preenchimento, indices_decimacao(n_cis, "cabeca_passo")
+        )
+
         # Mapeamento p/ Excel (R=18 até AE=31)
         cis_column_names = [
             'time_stage_start', 'time_stage_start_div_60',
@@ -282,3 +317,4 @@ def gerar_planilha_para_arquivos(arquivos_selecionados, tipo_ensaio_selecionado,
     wb.close()
     conn.close()
     print(f"Planilha gerada com sucesso: {novo_arquivo}")
+    return novo_arquivo
@@ -0,0 +1,392 @@
+# acompanhamento.py
+# Modo tail: ensaios ainda em andamento nos equipamentos. O .gds é lido
+# uma vez (iniciar) e, a cada consulta (atualizar/monitorar), só as linhas
+# gravadas depois da última leitura são interpretadas e inseridas.
+#
+# O estado de cada arquivo fica em AcompanhamentoArquivos:
+#   - offset: byte até onde o arquivo já foi lido (sempre fim de linha);
+#   - estado: último valor/acumulado das colunas diff+cumsum;
+#   - resumo: primeira/última linha de cada estágio (METADADOS_PARTE2);
+#   - constantes: valores do METADADOS_PARTE2 usados linha a linha;
+#   - impressao: hash do início do arquivo e dos últimos bytes antes do
+#     offset (ver _impressao).
+# Enquanto as constantes não mudam, as linhas novas são só acrescentadas;
+# se mudarem (ex.: terminou o adensamento), as linhas do ensaio são
+# recalculadas e regravadas. O mesmo vale para um arquivo truncado ou
+# regravado (ensaio reiniciado no equipamento), percebido pelo tamanho
+# menor que o offset ou pela impressão diferente.
+#
+# PARA RODAR, DIGITAR PELO PROMPT:
+# python acompanhamento.py iniciar C:\caminho\ensaio.gds
+# python acompanhamento.py monitorar --intervalo 60
+# python acompanhamento.py finalizar ensaio.gds
+
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from testeBD import DatabaseManager
+from teste import tem_virgula_decimal, hash_arquivo, hash_conteudo
+from teste2 import preparar_metadados_gds
+from teste3 import (
+    read_gds, ler_tabela_gds, preparar_tabela, constantes_amostra,
+    calcular_colunas_base, calcular_colunas_derivadas, montar_df_para_salvar,
+    resumo_estagios, METADADOS_PARTE2, CONSTANTES_LINHAS,
+)
+
+
+###############################################################################
+# Serialização do estado
+###############################################################################
+def _valor_json(valor):
+    """Tipos numpy que o json não conhece (np.float64 já é float)."""
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def _json(obj):
+    return json.dumps(obj, default=_valor_json)
+
+
+def _metadados_json(metadados):
+    """Só os valores simples (sem DataFrame/Series) vão para o estado."""
+    simples = (str, int, float, bool, type(None), np.generic)
+    return _json({k: v for k, v in metadados.items() if isinstance(v, simples)})
+
+
+# Bytes usados na impressão do arquivo: início (metadados, cabeçalho e
+# primeiras linhas) e trecho final antes do offset
+IMPRESSAO_INICIO = 64 * 1024
+IMPRESSAO_FIM = 4 * 1024
+
+
+def _impressao(caminho, offset):
+    """
+    Hash do início do arquivo e dos últimos bytes antes de 'offset': muda
+    se o conteúdo já lido foi regravado, mesmo com o arquivo maior.
+    """
+    with open(caminho, 'rb') as f:
+        inicio = f.read(min(offset, IMPRESSAO_INICIO))
+        f.seek(max(0, offset - IMPRESSAO_FIM))
+        fim = f.read(offset - f.tell())
+    return hash_conteudo(inicio + b'\0' + fim)
+
+
+def _ler_cabecalho(caminho, header_line):
+    """Linha de cabeçalho da tabela (ver read_gds['header_line'])."""
+    with open(caminho, 'r', encoding='latin-1') as f:
+        for i, linha in enumerate(f):
+            if i == header_line:
+                return linha.rstrip('\n')
+    raise ValueError(f"Cabeçalho não encontrado em {caminho}.")
+
+
+###############################################################################
+# Cálculo de um bloco de linhas
+###############################################################################
+def _calcular(df, metadados, estado=None, resumo=None, inicio=0):
+    """
+    Mesmas etapas do TableProcessor.process_table_data sobre um bloco de
+    linhas, continuando 'estado' e 'resumo' dos blocos anteriores.
+
+    Returns:
+        dict: {'df_to_save', 'metadados_parte2', 'estado', 'resumo', 'constantes'}
+    """
+    df = preparar_tabela(df)
+    h_init, d_init, init_dry_mass, v_0, vol_solid, v_w_f = constantes_amostra(metadados)
+    estado = calcular_colunas_base(df, h_init, v_0, anterior=estado)
+    resumo = resumo_estagios(df, resumo, inicio)
+
+    metadados_parte2 = METADADOS_PARTE2(
+        df=resumo,
+        metadados=metadados,
+        init_dry_mass=init_dry_mass,
+        v_0=v_0,
+        vol_solid=vol_solid,
+        v_w_f=v_w_f,
+        h_init=h_init
+    )
+    constantes = _json({c: getattr(metadados_parte2, c) for c in CONSTANTES_LINHAS})
+
+    calcular_colunas_derivadas(df, metadados_parte2, h_init, v_0, vol_solid, d_init)
+    return {
+        'df_to_save': montar_df_para_salvar(df),
+        'metadados_parte2': metadados_parte2,
+        'estado': estado,
+        'resumo': resumo,
+        'constantes': constantes,
+    }
+
+
+def _metadados_banco(metadados, metadados_parte2):
+    """Metadados do arquivo + campos do METADADOS_PARTE2 gravados em MetadadosArquivo."""
+    metadados = dict(metadados)
+    metadados.update(metadados_parte2.exportar_metadados_arquivo())
+    return metadados
+
+
+def _campos_estado(calculo, caminho, offset, n_linhas):
+    return {
+        'offset': offset,
+        'impressao': _impressao(caminho, offset),
+        'n_linhas': n_linhas,
+        'estado': _json(calculo['estado']),
+        'resumo': _json(calculo['resumo'].to_dict(orient='list')),
+        'constantes': calculo['constantes'],
+    }
+
+
+###############################################################################
+# Funções públicas
+###############################################################################
+def iniciar(caminho, db_manager=None):
+    """
+    Lê o .gds até a última linha completa, grava o ensaio no banco e
+    passa a acompanhá-lo. Retorna um dict com 'arquivo', 'acao' e 'linhas'.
+    """
+    db = db_manager or DatabaseManager()
+    filename = os.path.basename(caminho)
+    if db.get_idnome_by_filename(filename):
+        raise ValueError(f"O arquivo {filename} já está no banco de dados.")
+
+    lido = read_gds(caminho, db.get_metadados_map(), usar_cache=False, ate_ultima_linha=True)
+    if lido['df'] is None:
+        raise ValueError("Cabeçalho com 'Stage Number' não encontrado.")
+    if lido['df'].empty:
+        raise ValueError("O arquivo ainda não tem linhas de dados.")
+
+    metadados, _ = preparar_metadados_gds(lido['metadados'], db.get_fixed_metadados(filename))
+    if not metadados:
+        raise ValueError("Nenhum metadado encontrado no arquivo.")
+    metadados_json = _metadados_json(metadados)
+
+    calculo = _calcular(lido['df'], metadados)
+    cabecalho = _ler_cabecalho(caminho, lido['header_line'])
+
+    cursor = db.conn.cursor()
+    try:
+        idnome, _ = db.criar_registro_ensaio(
+            cursor, _metadados_banco(metadados, calculo['metadados_parte2']), filename
+        )
+        db.inserir_linhas_ensaio(cursor, idnome, calculo['df_to_save'])
+        db.inserir_linhas_ficticias(cursor, idnome)
+        db.salvar_estagios(cursor, idnome)
+        db.salvar_ruptura(cursor, idnome)
+
+        campos = _campos_estado(calculo, caminho, lido['registro']['tamanho'], len(lido['df']))
+        campos.update({
+            'caminho': lido['registro']['caminho'],
+            'idnome': idnome,
+            'cabecalho': cabecalho,
+            'metadados': metadados_json,
+            'status': 'ativo',
+        })
+        db.salvar_acompanhamento(filename, campos, commit=False)
+        db.conn.commit()
+    except Exception:
+        db.conn.rollback()
+        raise
+
+    return {'arquivo': filename, 'acao': 'iniciado', 'linhas': len(lido['df'])}
+
+
+def _reconstruir(db, filename, acomp):
+    """
+    Recalcula o arquivo inteiro e regrava as linhas do ensaio (arquivo
+    truncado/substituído ou constantes do METADADOS_PARTE2 alteradas).
+    """
+    caminho = acomp['caminho']
+    lido = read_gds(caminho, usar_cache=False, ate_ultima_linha=True)
+    if lido['df'] is None:
+        raise ValueError("Cabeçalho com 'Stage Number' não encontrado.")
+
+    metadados = json.loads(acomp['metadados'])
+    calculo = _calcular(lido['df'], metadados)
+    idnome = acomp['idnome']
+
+    cursor = db.conn.cursor()
+    try:
+        db.remover_linhas_ensaio(cursor, idnome)
+        db.inserir_linhas_ensaio(cursor, idnome, calculo['df_to_save'])
+        db.inserir_linhas_ficticias(cursor, idnome)
+        db.salvar_estagios(cursor, idnome)
+        db.atualizar_metadados_arquivo(
+            idnome, _metadados_banco(metadados, calculo['metadados_parte2']), commit=False
+        )
+        db.salvar_ruptura(cursor, idnome)
+        campos = _campos_estado(calculo, caminho, lido['registro']['tamanho'], len(lido['df']))
+        campos['cabecalho'] = _ler_cabecalho(caminho, lido['header_line'])
+        db.salvar_acompanhamento(filename, campos, commit=False)
+        db.conn.commit()
+    except Exception:
+        db.conn.rollback()
+        raise
+
+    return {'arquivo': filename, 'acao': 'recalculado', 'linhas': len(lido['df'])}
+
+
+def atualizar(filename, db_manager=None, final=False):
+    """
+    Lê as linhas gravadas depois da última leitura e as acrescenta ao
+    ensaio. Com 'final', uma última linha sem quebra também é lida.
+    Retorna um dict com 'arquivo', 'acao' e 'linhas' (novas/regravadas).
+    """
+    db = db_manager or DatabaseManager()
+    acomp = db.get_acompanhamento(filename)
+    if not acomp:
+        raise ValueError(f"O arquivo {filename} não está em acompanhamento.")
+    if acomp['status'] != 'ativo':
+        return {'arquivo': filename, 'acao': acomp['status'], 'linhas': 0}
+
+    caminho = acomp['caminho']
+    offset = acomp['offset']
+    if os.path.getsize(caminho) < offset:
+        return _reconstruir(db, filename, acomp)
+    # Sem impressão: estado gravado antes da coluna existir
+    if acomp['impressao'] and _impressao(caminho, offset) != acomp['impressao']:
+        return _reconstruir(db, filename, acomp)
+
+    with open(caminho, 'rb') as f:
+        f.seek(offset)
+        dados = f.read()
+    if not final:
+        dados = dados[:dados.rfind(b'\n') + 1]
+    if not dados:
+        return {'arquivo': filename, 'acao': 'sem_dados', 'linhas': 0}
+
+    texto = dados.decode('latin-1')
+    if '\r' in texto:
+        texto = texto.replace('\r\n', '\n').replace('\r', '\n')
+
+    df_novo = ler_tabela_gds(acomp['cabecalho'] + '\n' + texto, tem_virgula_decimal(texto))
+    if df_novo.empty:
+        db.salvar_acompanhamento(filename, {'offset': offset + len(dados),
+                                            'impressao': _impressao(caminho, offset + len(dados))})
+        return {'arquivo': filename, 'acao': 'sem_dados', 'linhas': 0}
+
+    metadados = json.loads(acomp['metadados'])
+    resumo = pd.DataFrame(json.loads(acomp['resumo']))
+    calculo = _calcular(df_novo, metadados, json.loads(acomp['estado']),
+                        resumo, acomp['n_linhas'])
+    if calculo['constantes'] != acomp['constantes']:
+        return _reconstruir(db, filename, acomp)
+
+    idnome = acomp['idnome']
+    cursor = db.conn.cursor()
+    try:
+        db.inserir_linhas_ensaio(cursor, idnome, calculo['df_to_save'])
+        db.inserir_linhas_ficticias(cursor, idnome, substituir=True)
+        db.salvar_estagios(cursor, idnome)
+        db.atualizar_metadados_arquivo(
+            idnome, _metadados_banco(metadados, calculo['metadados_parte2']), commit=False
+        )
+        db.salvar_ruptura(cursor, idnome)
+        db.salvar_acompanhamento(
+            filename,
+            _campos_estado(calculo, caminho, offset + len(dados),
+                           acomp['n_linhas'] + len(df_novo)),
+            commit=False
+        )
+        db.conn.commit()
+    except Exception:
+        db.conn.rollback()
+        raise
+
+    return {'arquivo': filename, 'acao': 'acrescentado', 'linhas': len(df_novo)}
+
+
+def finalizar(filename, db_manager=None):
+    """
+    Lê o restante do arquivo, registra o conteúdo final em
+    RegistroArquivos e encerra o acompanhamento.
+    """
+    db = db_manager or DatabaseManager()
+    resultado = atualizar(filename, db, final=True)
+    acomp = db.get_acompanhamento(filename)
+
+    caminho = acomp['caminho']
+    st = os.stat(caminho)
+    registro = {'caminho': caminho, 'tamanho': st.st_size,
+                'mtime_ns': st.st_mtime_ns, 'hash': hash_arquivo(caminho)}
+    db.registrar_arquivo(filename, registro, acomp['idnome'], commit=False)
+    db.salvar_acompanhamento(filename, {'status': 'finalizado'})
+    resultado['acao'] = 'finalizado'
+    return resultado
+
+
+def monitorar(intervalo=60.0, db_manager=None, ciclos=None):
+    """
+    Atualiza periodicamente todos os arquivos em acompanhamento ativo.
+    'ciclos' limita o número de passagens (None = até Ctrl+C).
+    """
+    db = db_manager or DatabaseManager()
+    feitos = 0
+    while ciclos is None or feitos < ciclos:
+        for filename in db.listar_acompanhamentos('ativo'):
+            try:
+                resultado = atualizar(filename, db)
+                if resultado['linhas']:
+                    print(f"[{resultado['acao'].upper()}] {filename} ({resultado['linhas']} linhas)")
+            except Exception as e:
+                print(f"[ERRO] {filename}: {e}")
+                traceback.print_exc()
+        feitos += 1
+        if ciclos is None or feitos < ciclos:
+            time.sleep(intervalo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Acompanhamento (modo tail) de arquivos .gds de ensaios em andamento."
+    )
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('iniciar', help="Grava o ensaio e passa a acompanhar o arquivo.")
+    p.add_argument('arquivos', nargs='+', help="Caminhos dos arquivos .gds.")
+
+    p = sub.add_parser('monitorar', help="Atualiza periodicamente os arquivos ativos.")
+    p.add_argument('--intervalo', type=float, default=60.0,
+                   help="Segundos entre as leituras (padrão: 60).")
+    p.add_argument('--uma-vez', action='store_true', help="Faz uma única passagem.")
+
+    p = sub.add_parser('finalizar', help="Lê o restante e encerra o acompanhamento.")
+    p.add_argument('arquivos', nargs='+', help="Nomes dos arquivos .gds.")
+
+    sub.add_parser('listar', help="Lista os arquivos em acompanhamento ativo.")
+    args = parser.parse_args(argv)
+
+    db = DatabaseManager()
+    if args.comando == 'monitorar':
+        try:
+            monitorar(args.intervalo, db, ciclos=1 if args.uma_vez else None)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.comando == 'listar':
+        for filename in db.listar_acompanhamentos('ativo'):
+            print(filename)
+        return 0
+
+    funcao = iniciar if args.comando == 'iniciar' else finalizar
+    erros = 0
+    for arquivo in args.arquivos:
+        try:
+            alvo = arquivo if args.comando == 'iniciar' else os.path.basename(arquivo)
+            resultado = funcao(alvo, db)
+            print(f"[{resultado['acao'].upper()}] {resultado['arquivo']} ({resultado['linhas']} linhas)")
+        except Exception as e:
+            erros += 1
+            print(f"[ERRO] {arquivo}: {e}")
+            traceback.print_exc()
+    return 2 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+# benchmark.py
+# Mede o tempo das etapas principais com arquivos .gds sintéticos
+# (gerador_gds.py) de vários tamanhos, para comparar o desempenho entre
+# versões. Etapas medidas para cada tamanho:
+#   fix_gds               correção da vírgula decimal em disco (teste.fix_gds,
+#                         sobre uma cópia do arquivo);
+#   process_table_data    leitura + cálculos (teste3.TableProcessor);
+#   save_to_database      gravação no banco (DatabaseManager);
+#   get_data_for_files    leitura de todas as linhas do ensaio no banco;
+#   planilha_excel        PreencherExcel.gerar_planilha_para_arquivos, com
+#                         um modelo mínimo (abas 'CP A Data'...);
+#   figura                consulta do cisalhamento + graficos.figura_arquivo
+#                         + desenho (backend Agg, sem janela).
+#
+# Tudo é feito numa pasta de trabalho própria (arquivos, banco, cache de
+# tabelas e planilhas), apagada e recriada a cada execução (só se estiver
+# vazia ou tiver sido criada pelo benchmark); o cache de tabelas (cacheGDS)
+# fica nela, então a leitura é sempre "a frio".
+# Cada execução é acrescentada ao arquivo JSON de resultados, com a data,
+# a versão (git) e a plataforma, e o resumo mostra a variação em relação
+# à execução anterior com os mesmos parâmetros.
+#
+# PARA RODAR, DIGITAR PELO PROMPT:
+# python benchmark.py                                   (10 mil, 100 mil e 1 milhão de linhas)
+# python benchmark.py --tamanhos 10000 5000000 --virgula --saida benchmark_resultados.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+
+TAMANHOS_PADRAO = (10_000, 100_000, 1_000_000)
+PASTA_PADRAO = "benchmark_trabalho"
+SAIDA_PADRAO = "benchmark_resultados.json"
+# Arquivo que marca a pasta de trabalho como criada pelo benchmark
+MARCADOR_PASTA = ".benchmark_vale"
+
+ETAPAS = ("fix_gds", "process_table_data", "save_to_database",
+          "get_data_for_files", "planilha_excel", "figura")
+
+COLUNAS_FIGURA = [
+    'dev_stress_A', 'dev_stress_B', 'eff_camb_A', 'eff_camb_B', 'du_kpa',
+    'vol_strain_A', 'vol_strain_B', 'void_ratio_A', 'void_ratio_B',
+    'nqp_A', 'nqp_B', 'm_A', 'm_B', 'ax_strain', 'stage_no'
+]
+
+
+def _versao():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def preparar_pasta(pasta):
+    """
+    Apaga e recria a pasta de trabalho. Uma pasta que já existe e não está
+    vazia só é apagada se tiver o MARCADOR_PASTA de uma execução anterior
+    (protege contra '--pasta .' ou '--pasta LUIZ-Teste').
+    """
+    if os.path.isdir(pasta) and os.listdir(pasta):
+        if not os.path.exists(os.path.join(pasta, MARCADOR_PASTA)):
+            raise ValueError(f"A pasta '{pasta}' já existe, não está vazia e não foi criada "
+                             f"pelo benchmark; escolha outra com --pasta.")
+        shutil.rmtree(pasta)
+    elif os.path.exists(pasta) and not os.path.isdir(pasta):
+        raise ValueError(f"'{pasta}' existe e não é uma pasta.")
+    os.makedirs(pasta, exist_ok=True)
+    open(os.path.join(pasta, MARCADOR_PASTA), "w").close()
+
+
+def _modelo_planilha(caminho):
+    """Modelo mínimo para o PreencherExcel: as abas 'CP A Data'..'CP E Data'."""
+    from openpyxl import Workbook
+    wb = Workbook()
+    wb.active.title = "Report"
+    for letra in "ABCDE":
+        wb.create_sheet(f"CP {letra} Data")
+    wb.save(caminho)
+    return caminho
+
+
+class _Cronometro:
+    """Acumula {etapa: {'duracao_s', 'linhas', 'linhas_por_s'}} de um tamanho."""
+
+    def __init__(self):
+        self.etapas = {}
+
+    def medir(self, etapa, funcao, *args, linhas=None, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcao(*args, **kwargs)
+        duracao = time.perf_counter() - inicio
+        n = linhas(resultado) if callable(linhas) else linhas
+        self.etapas[etapa] = {
+            'duracao_s': round(duracao, 4),
+            'linhas': n,
+            'linhas_por_s': round(n / duracao, 1) if n and duracao > 0 else None,
+        }
+        print(f"  {etapa:<20} {duracao:9.3f} s")
+        return resultado
+
+
+def medir_tamanho(n_linhas, pasta, indice, db, virgula_decimal=False, semente=0):
+    """Gera um .gds de 'n_linhas' linhas e mede cada etapa de ETAPAS com ele."""
+    from teste import fix_gds
+    from teste2 import preparar_metadados_gds
+    from teste3 import TableProcessor, ler_metadados_gds
+    from testeBD import METADADOS_MAPPING
+    from gerador_gds import gerar_gds
+    import PreencherExcel
+
+    filename = f"bench_{n_linhas}.gds"
+    caminho = os.path.join(pasta, filename)
+    inicio = time.perf_counter()
+    # Uma amostra por tamanho: cada arquivo fica com o seu próprio ensaio
+    gerar_gds(caminho, n_linhas, virgula_decimal, semente, idamostra=f"AM{indice:02d}")
+    print(f"{n_linhas} linhas: arquivo gerado em {time.perf_counter() - inicio:.1f} s "
+          f"({os.path.getsize(caminho) / 2**20:.1f} MB)")
+
+    c = _Cronometro()
+    copia = caminho + ".fix.gds"
+    shutil.copy(caminho, copia)
+    c.medir("fix_gds", fix_gds, copia, linhas=n_linhas)
+    os.remove(copia)
+
+    lido = ler_metadados_gds(caminho, METADADOS_MAPPING)
+    metadados, _ = preparar_metadados_gds(dict(lido['metadados']))
+    resultado = c.medir("process_table_data", TableProcessor.process_table_data,
+                        None, metadados, caminho, linhas=n_linhas)
+    if resultado is None:
+        raise RuntimeError(f"process_table_data falhou para {filename}")
+
+    ok = c.medir("save_to_database", db.save_to_database, metadados, resultado['df'],
+                 filename, linhas=n_linhas)
+    if not ok:
+        raise RuntimeError(f"save_to_database falhou para {filename}")
+    del resultado
+
+    c.medir("get_data_for_files", db.get_data_for_files, [filename], linhas=len)
+
+    db_path = db.conn.execute("PRAGMA database_list").fetchone()[2]
+    c.medir("planilha_excel", PreencherExcel.gerar_planilha_para_arquivos,
+            [filename], "TIR_S", f"bench_{n_linhas}",
+            modelo_planilha=os.path.join(pasta, "modelo.xlsx"),
+            pasta_saida=pasta, db_path=db_path)
+
+    def figura():
+        import matplotlib.pyplot as plt
+        import graficos
+        df = db.get_dados_estagios(filename, 8, 8, colunas=COLUNAS_FIGURA)
+        fig, _ = graficos.figura_arquivo(df, filename)
+        fig.canvas.draw()
+        plt.close(fig)
+        return len(df)
+
+    c.medir("figura", figura, linhas=lambda n: n)
+
+    return {
+        'linhas': n_linhas,
+        'tamanho_arquivo_mb': round(os.path.getsize(caminho) / 2**20, 2),
+        'etapas': c.etapas,
+    }
+
+
+def executar_benchmark(tamanhos=TAMANHOS_PADRAO, virgula_decimal=False, pasta=PASTA_PADRAO,
+                       semente=0):
+    """
+    Roda o benchmark (ver cabeçalho) e retorna o registro da execução:
+    {'data', 'versao', 'python', 'plataforma', 'virgula_decimal', 'resultados'}.
+    Deve rodar num processo novo: o DatabaseManager (singleton) e o cache
+    de tabelas são abertos na pasta de trabalho.
+    """
+    preparar_pasta(pasta)
+    # Antes da primeira leitura (o cache de tabelas lê a variável ao ser criado)
+    os.environ["GDS_CACHE_DIR"] = os.path.abspath(os.path.join(pasta, "cache_gds"))
+
+    import matplotlib
+    matplotlib.use("Agg")
+    from testeBD import DatabaseManager
+
+    _modelo_planilha(os.path.join(pasta, "modelo.xlsx"))
+    db = DatabaseManager(db_path=os.path.join(pasta, "benchmark.db"))
+
+    resultados = [medir_tamanho(n, pasta, i + 1, db, virgula_decimal, semente)
+                  for i, n in enumerate(tamanhos)]
+    return {
+        'data': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'versao': _versao(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'virgula_decimal': virgula_decimal,
+        'resultados': resultados,
+    }
+
+
+def salvar_execucao(execucao, saida=SAIDA_PADRAO):
+    """Acrescenta 'execucao' à lista de execuções do arquivo JSON 'saida'."""
+    execucoes = carregar_execucoes(saida)
+    execucoes.append(execucao)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(execucoes, f, indent=2, ensure_ascii=False)
+    return execucoes
+
+
+def carregar_execucoes(saida=SAIDA_PADRAO):
+    if not os.path.exists(saida):
+        return []
+    with open(saida, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def formatar_comparacao(atual, anterior=None):
+    """Tabela etapa × tamanho com o tempo atual e a variação sobre 'anterior'."""
+    base = {}
+    if anterior:
+        base = {r['linhas']: r['etapas'] for r in anterior['resultados']}
+    linhas = [f"{'etapa':<20} {'linhas':>10} {'tempo (s)':>10} {'linhas/s':>12} {'variação':>9}"]
+    for r in atual['resultados']:
+        for etapa in ETAPAS:
+            med = r['etapas'].get(etapa)
+            if not med:
+                continue
+            variacao = ""
+            ant = base.get(r['linhas'], {}).get(etapa)
+            if ant and ant['duracao_s']:
+                variacao = f"{100 * (med['duracao_s'] / ant['duracao_s'] - 1):+.0f}%"
+            taxa = f"{med['linhas_por_s']:.0f}" if med['linhas_por_s'] else ""
+            linhas.append(f"{etapa:<20} {r['linhas']:>10} {med['duracao_s']:>10.3f} "
+                          f"{taxa:>12} {variacao:>9}")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mede as etapas principais com arquivos .gds sintéticos."
+    )
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=list(TAMANHOS_PADRAO),
+                        help="Linhas de cada arquivo (10 mil a 5 milhões).")
+    parser.add_argument('--virgula', action='store_true', help="Arquivos com vírgula decimal.")
+    parser.add_argument('--pasta', default=PASTA_PADRAO,
+                        help="Pasta de trabalho (apagada e recriada; só pasta vazia "
+                             "ou de uma execução anterior).")
+    parser.add_argument('--saida', default=SAIDA_PADRAO,
+                        help="Arquivo JSON com o histórico de execuções.")
+    parser.add_argument('--semente', type=int, default=0, help="Semente dos arquivos.")
+    args = parser.parse_args(argv)
+
+    try:
+        execucao = executar_benchmark(args.tamanhos, args.virgula, args.pasta, args.semente)
+    except ValueError as e:
+        print(f"Erro: {e}")
+        return 1
+    anteriores = [e for e in carregar_execucoes(args.saida)
+                  if e.get('virgula_decimal') == execucao['virgula_decimal']]
+    salvar_execucao(execucao, args.saida)
+
+    print()
+    print(formatar_comparacao(execucao, anteriores[-1] if anteriores else None))
+    print(f"\nResultados gravados em '{args.saida}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
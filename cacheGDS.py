@@ -0,0 +1,130 @@
+# cacheGDS.py
+# Cache colunar (.npz comprimido) das tabelas .gds já lidas, indexado pelo
+# hash do conteúdo do arquivo (ver teste.hash_conteudo / teste3.read_gds).
+#
+# Um reprocessamento (mudança de fórmula ou de metadados) encontra a tabela
+# já tipada no cache e não precisa interpretar o texto CSV de novo.
+# Os arquivos menos usados recentemente são removidos quando o total passa
+# do limite (mtime do arquivo de cache = último acesso).
+#
+# A gravação do .npz comprimido custa mais que a leitura do .gds: as
+# leituras de uma vez só (ingestão, monitorGDS, seleção de arquivo na
+# interface) usam read_gds(usar_cache=False); o cache fica para os fluxos
+# que relêem o mesmo arquivo (reprocessamento, telas do cíclico).
+
+import os
+import json
+import tempfile
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from testeBD import resource_path
+
+# Pasta do cache: GDS_CACHE_DIR ou 'cache_gds' na pasta da aplicação
+# (resource_path, como a pasta de dados), resolvida ao criar o cache
+CACHE_PASTA_PADRAO = "cache_gds"
+CACHE_LIMITE_BYTES = int(os.environ.get("GDS_CACHE_LIMITE_MB", "512")) * 1024 * 1024
+
+_EXTENSAO = ".npz"
+_PREFIXO_COLUNA = "c"
+
+
+class CacheTabelas:
+    """
+    Guarda/recupera {'df', 'bloco_metadados', 'header_line'} por chave
+    (hash do arquivo). Só colunas numéricas são guardadas: uma tabela com
+    colunas de texto (linhas corrompidas) é simplesmente lida do .gds.
+    """
+    def __init__(self, diretorio=None, limite_bytes=None):
+        self.diretorio = (diretorio or os.environ.get("GDS_CACHE_DIR")
+                          or resource_path(CACHE_PASTA_PADRAO))
+        self.limite_bytes = CACHE_LIMITE_BYTES if limite_bytes is None else limite_bytes
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave + _EXTENSAO)
+
+    def obter(self, chave):
+        """Retorna o dict guardado ou None (ausente/ilegível)."""
+        caminho = self._caminho(chave)
+        if not os.path.exists(caminho):
+            return None
+        try:
+            with np.load(caminho, allow_pickle=False) as dados:
+                info = json.loads(str(dados["__info__"]))
+                df = pd.DataFrame(
+                    {nome: dados[f"{_PREFIXO_COLUNA}{i}"] for i, nome in enumerate(info["colunas"])},
+                    columns=info["colunas"]
+                )
+            os.utime(caminho)  # marca o acesso (LRU)
+            return {
+                'df': df,
+                'bloco_metadados': info["bloco_metadados"],
+                'header_line': info["header_line"],
+            }
+        except Exception as e:
+            print(f"Cache de tabela ilegível ({caminho}), será descartado: {e}")
+            self._remover(caminho)
+            return None
+
+    def guardar(self, chave, df, bloco_metadados, header_line):
+        """Grava a tabela no cache; retorna True se gravou."""
+        if any(df[c].dtype.kind not in "biuf" for c in df.columns):
+            return False
+        if df.columns.duplicated().any():
+            return False
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            info = {
+                "colunas": [str(c) for c in df.columns],
+                "bloco_metadados": bloco_metadados,
+                "header_line": header_line,
+            }
+            arrays = {f"{_PREFIXO_COLUNA}{i}": df[c].to_numpy() for i, c in enumerate(df.columns)}
+            arrays["__info__"] = np.array(json.dumps(info))
+
+            # Grava em temporário e troca: leitores nunca veem arquivo pela metade
+            fd, tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp, self._caminho(chave))
+        except Exception as e:
+            print(f"Erro ao gravar cache de tabela: {e}")
+            traceback.print_exc()
+            return False
+
+        self.limpar()
+        return True
+
+    def limpar(self):
+        """Remove os arquivos menos usados até o total ficar abaixo do limite."""
+        try:
+            entradas = [e for e in os.scandir(self.diretorio)
+                        if e.is_file() and e.name.endswith(_EXTENSAO)]
+        except FileNotFoundError:
+            return
+        stats = [(e.path, e.stat()) for e in entradas]
+        total = sum(st.st_size for _, st in stats)
+        for caminho, st in sorted(stats, key=lambda x: x[1].st_mtime):
+            if total <= self.limite_bytes:
+                break
+            self._remover(caminho)
+            total -= st.st_size
+
+    @staticmethod
+    def _remover(caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+_cache_padrao = None
+
+def cache_padrao():
+    """Instância única usada por teste3.read_gds."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = CacheTabelas()
+    return _cache_padrao
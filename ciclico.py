@@ -0,0 +1,357 @@
+# ciclico.py
+# Processamento em blocos dos ensaios triaxiais cíclicos: vários .gds
+# gravados como um único ensaio, com o stage_no de cada arquivo
+# continuando do último estágio dos anteriores.
+#
+# Registros de vários dias passam de milhões de linhas. Em vez de
+# concatenar tudo num DataFrame (e num CSV temporário), cada arquivo é
+# lido em blocos (teste3.ler_gds_em_blocos), em duas passagens:
+#   1) colunas-base, com diff/cumsum continuando entre blocos e arquivos,
+#      e o resumo por estágio -> METADADOS_PARTE2 do ensaio inteiro;
+#   2) colunas-base e derivadas de cada bloco, inseridas direto no banco
+#      (uma única transação).
+# Só um bloco e o resumo por estágio ficam na memória de cada vez.
+#
+# Ao final, a análise por ciclo (analisar_ciclos) roda sobre as séries de
+# tensão desviadora, deformação axial e excesso de poropressão guardadas
+# na 2ª passagem (só essas colunas) e vai para a tabela CiclosEnsaio.
+
+import numpy as np
+import pandas as pd
+
+from testeBD import DatabaseManager, sql_linhas_ensaios
+from teste3 import (
+    ler_gds_em_blocos, map_gds_columns, preparar_tabela, constantes_amostra,
+    calcular_colunas_base, calcular_colunas_derivadas, montar_df_para_salvar,
+    resumo_estagios, safe_divide_array, METADADOS_PARTE2,
+)
+
+# Colunas "_Original" que podem faltar em algum arquivo (ficam NaN)
+COLUNAS_OPCIONAIS = ("rad_vol_Original", "back_vol_Original",
+                     "cur_area_Original", "vol_change_Original")
+
+LINHAS_POR_BLOCO = 100_000
+
+# Colunas da análise por ciclo: tensão desviadora, deformação axial e
+# excesso de poropressão
+COLUNA_Q = "dev_stress_A"
+COLUNA_EPS = "ax_strain"
+COLUNA_DU = "du_kpa"
+
+# Amplitude mínima de uma reversão, como fração da faixa total do sinal
+# (variações menores são ruído e não abrem um novo ciclo)
+AMPLITUDE_MINIMA_RELATIVA = 0.05
+
+
+def ultimo_estagio(caminho, **read_csv_kwargs):
+    """Maior stage_no do arquivo (só a coluna "Stage Number" é lida), ou None."""
+    maior = None
+    for bloco in ler_gds_em_blocos(caminho, usecols=lambda c: c.strip() == "Stage Number",
+                                   **read_csv_kwargs):
+        estagios = pd.to_numeric(bloco["Stage Number"], errors='coerce')
+        if estagios.notna().any():
+            m = estagios.max()
+            maior = m if maior is None else max(maior, m)
+    return maior
+
+
+def deslocamentos_estagios(maximos):
+    """
+    Deslocamento de stage_no de cada arquivo, a partir do maior estágio
+    de cada um (ultimo_estagio): cada arquivo continua do maior estágio
+    já concatenado.
+
+    Returns:
+        tuple: (lista de deslocamentos, último estágio do ensaio)
+    """
+    deslocamentos = []
+    ultimo = None
+    for maximo in maximos:
+        if ultimo is None:
+            deslocamentos.append(0)
+            ultimo = maximo
+        else:
+            deslocamentos.append(ultimo)
+            ultimo = max(ultimo, ultimo + maximo)
+    return deslocamentos, ultimo
+
+
+###############################################################################
+# Análise por ciclo
+###############################################################################
+def _extremos_locais(x):
+    """
+    Posições dos picos e vales locais de 'x' (sem NaN), numa passada
+    vetorizada: onde o sinal da diferença muda (trechos planos herdam o
+    sinal anterior). A primeira e a última posição entram sempre.
+    """
+    if len(x) < 3:
+        return np.arange(len(x))
+    sinal = np.sign(np.diff(x))
+    # trechos planos (diferença 0) herdam o último sinal não nulo
+    ultimos = np.where(sinal != 0, np.arange(len(sinal)), 0)
+    np.maximum.accumulate(ultimos, out=ultimos)
+    sinal = sinal[ultimos]
+    mudancas = np.flatnonzero(sinal[1:] != sinal[:-1]) + 1
+    return np.concatenate(([0], mudancas, [len(x) - 1]))
+
+
+def reversoes(x, amplitude_minima):
+    """
+    Picos e vales alternados de 'x' (sem NaN), ignorando as oscilações
+    menores que 'amplitude_minima' (histerese).
+
+    Os candidatos vêm de _extremos_locais (vetorizado); só eles passam pelo
+    filtro de histerese, que precisa ir em ordem. Entre dois candidatos o
+    sinal é monótono, então o resultado é o mesmo que filtrar todas as linhas.
+    O mínimo antes da primeira subida também conta como vale; se o registro
+    termina em descida, o último mínimo conta como vale.
+
+    Returns:
+        tuple: (posições dos picos, posições dos vales), em ordem crescente.
+    """
+    candidatos = _extremos_locais(x)
+    valores = x[candidatos].tolist()
+    picos, vales = [], []
+    i_max = i_min = 0
+    subindo = None          # direção ainda desconhecida
+    for k, v in enumerate(valores):
+        if v > valores[i_max]:
+            i_max = k
+        if v < valores[i_min]:
+            i_min = k
+        if subindo is not False and v < valores[i_max] - amplitude_minima:
+            if subindo:
+                picos.append(candidatos[i_max])
+            subindo, i_min = False, k
+        elif subindo is not True and v > valores[i_min] + amplitude_minima:
+            vales.append(candidatos[i_min])
+            subindo, i_max = True, k
+    # Registro terminando em descida: o último mínimo fecha o ciclo
+    if subindo is False:
+        vales.append(candidatos[i_min])
+    return np.array(picos, dtype=np.int64), np.array(vales, dtype=np.int64)
+
+
+def analisar_ciclos(q, eps, du, estagios=None, sinal="q", amplitude_minima=None):
+    """
+    Segmenta o registro cíclico em ciclos e calcula as métricas de cada um.
+
+    Um ciclo vai de um vale ao vale seguinte do sinal escolhido ('q' =
+    tensão desviadora, controle de carga; 'eps' = deformação axial,
+    controle de deformação), passando pelo pico entre eles. Todas as
+    métricas saem de reduções vetorizadas sobre os trechos (reduceat),
+    numa passada:
+      - q_max/q_min, eps_max/eps_min e eps_pico_a_pico do ciclo;
+      - modulo_secante = Δq/Δε entre o vale inicial e o pico (kPa, com
+        ε em fração);
+      - area_laco (fórmula do laço de Gauss no plano ε x q, fechando no
+        ponto inicial) e amortecimento = W_D / (4π W_S), com
+        W_S = Δq Δε / 8 (energia elástica do triângulo secante);
+      - du_max, du_final (no vale final) e du_acumulado (du_final menos o
+        du do início do primeiro ciclo).
+
+    Args:
+        q, eps, du: séries (mesmo tamanho) de tensão desviadora, deformação
+            axial e excesso de poropressão. Linhas com NaN em q ou eps
+            são ignoradas.
+        estagios: stage_no de cada linha (opcional, vai para a tabela).
+        amplitude_minima: reversões menores são ignoradas (padrão:
+            AMPLITUDE_MINIMA_RELATIVA da faixa do sinal).
+
+    Returns:
+        DataFrame: um ciclo por linha (colunas de CiclosEnsaio; as
+        posições linha_* são as das séries recebidas).
+    """
+    q = np.asarray(q, dtype=float)
+    eps = np.asarray(eps, dtype=float)
+    du = np.asarray(du, dtype=float)
+    validas = np.flatnonzero(np.isfinite(q) & np.isfinite(eps))
+    x = (q if sinal == "q" else eps)[validas]
+
+    colunas = ["ciclo", "stage_no", "linha_inicio", "linha_pico", "linha_fim",
+               "q_max", "q_min", "eps_max", "eps_min", "eps_pico_a_pico",
+               "modulo_secante", "area_laco", "amortecimento",
+               "du_max", "du_final", "du_acumulado"]
+    if len(x) < 3:
+        return pd.DataFrame(columns=colunas)
+
+    if amplitude_minima is None:
+        amplitude_minima = AMPLITUDE_MINIMA_RELATIVA * float(x.max() - x.min())
+    picos, vales = reversoes(x, amplitude_minima)
+    if len(vales) < 2:
+        return pd.DataFrame(columns=colunas)
+
+    # Um pico entre cada par de vales consecutivos (alternância garantida)
+    inicios, fins = vales[:-1], vales[1:]
+    picos = picos[np.searchsorted(picos, inicios)]
+
+    qv, ev, duv = q[validas], eps[validas], du[validas]
+
+    # Extremos por ciclo ([início, fim) de cada um; o trecho depois do
+    # último vale é descartado)
+    n = len(inicios)
+    q_max = np.fmax.reduceat(qv, vales)[:n]
+    q_min = np.fmin.reduceat(qv, vales)[:n]
+    eps_max = np.fmax.reduceat(ev, vales)[:n]
+    eps_min = np.fmin.reduceat(ev, vales)[:n]
+    du_max = np.fmax.reduceat(duv, vales)[:n]
+
+    # Área do laço (Gauss): arestas i -> i+1 dentro do ciclo + fechamento fim -> início
+    cruzados = np.append(ev[:-1] * qv[1:] - ev[1:] * qv[:-1], 0.0)
+    soma = np.add.reduceat(cruzados, vales)[:n]
+    fechamento = ev[fins] * qv[inicios] - ev[inicios] * qv[fins]
+    area = np.abs(soma + fechamento) / 2.0
+
+    # Secante entre o vale inicial e o pico
+    dq = qv[picos] - qv[inicios]
+    deps = ev[picos] - ev[inicios]
+    modulo = safe_divide_array(dq, deps, np.nan)
+    amortecimento = safe_divide_array(area, np.pi * np.abs(dq * deps) / 2.0, np.nan)
+
+    du_final = duv[fins]
+    ciclos = pd.DataFrame({
+        "ciclo": np.arange(1, n + 1),
+        "stage_no": (np.asarray(estagios, dtype=float)[validas][picos]
+                     if estagios is not None else np.nan),
+        "linha_inicio": validas[inicios],
+        "linha_pico": validas[picos],
+        "linha_fim": validas[fins],
+        "q_max": q_max,
+        "q_min": q_min,
+        "eps_max": eps_max,
+        "eps_min": eps_min,
+        "eps_pico_a_pico": eps_max - eps_min,
+        "modulo_secante": modulo,
+        "area_laco": area,
+        "amortecimento": amortecimento,
+        "du_max": du_max,
+        "du_final": du_final,
+        "du_acumulado": du_final - duv[inicios[0]],
+    })
+    return ciclos[colunas]
+
+
+def calcular_ciclos_ensaio(filename, db_manager=None, **kwargs):
+    """
+    Refaz a análise por ciclo de um ensaio já gravado (lê só as colunas
+    usadas) e regrava CiclosEnsaio. 'kwargs' vão para analisar_ciclos.
+    Retorna o DataFrame de ciclos.
+    """
+    db = db_manager or DatabaseManager()
+    idnome = db.get_idnome_by_filename(filename)
+    if idnome is None:
+        raise ValueError(f"Arquivo '{filename}' não encontrado na tabela 'Cp'.")
+    df = pd.read_sql_query(
+        sql_linhas_ensaios(1, ["stage_no", COLUNA_Q, COLUNA_EPS, COLUNA_DU]),
+        db.conn, params=[idnome]
+    )
+    ciclos = analisar_ciclos(df[COLUNA_Q], df[COLUNA_EPS], df[COLUNA_DU],
+                             estagios=df["stage_no"], **kwargs)
+    cursor = db.conn.cursor()
+    try:
+        db.salvar_ciclos(cursor, idnome, ciclos)
+        db.conn.commit()
+    except Exception:
+        db.conn.rollback()
+        raise
+    return ciclos
+
+
+###############################################################################
+# Processamento em blocos
+###############################################################################
+def _blocos(arquivos, deslocamentos, linhas_por_bloco, read_csv_kwargs):
+    """Blocos já mapeados (preparar_tabela), com o stage_no deslocado."""
+    for caminho, deslocamento in zip(arquivos, deslocamentos):
+        for bloco in ler_gds_em_blocos(caminho, linhas_por_bloco, **read_csv_kwargs):
+            if bloco.empty:
+                continue
+            bloco = map_gds_columns(bloco)
+            if deslocamento:
+                bloco['stage_no'] += deslocamento
+            for col in COLUNAS_OPCIONAIS:
+                if col not in bloco.columns:
+                    bloco[col] = np.nan
+            yield preparar_tabela(bloco)
+
+
+def processar_ciclico(arquivos, metadados, filename, db_manager=None,
+                      linhas_por_bloco=LINHAS_POR_BLOCO, deslocamentos=None,
+                      **read_csv_kwargs):
+    """
+    Calcula e grava no banco, como um único ensaio 'filename', os
+    arquivos cíclicos em 'arquivos' (na ordem), usando os 'metadados' do
+    primeiro arquivo.
+
+    Args:
+        deslocamentos: deslocamento do stage_no de cada arquivo (padrão:
+            deslocamentos_estagios sobre ultimo_estagio de cada um).
+        read_csv_kwargs: repassados ao pd.read_csv (ex.: on_bad_lines='skip').
+
+    Returns:
+        dict: {'filename', 'linhas', 'metadados' (com os atributos do
+               METADADOS_PARTE2), 'metadados_parte2', 'ciclos'
+               (analisar_ciclos)}
+    """
+    db = db_manager or DatabaseManager()
+    if deslocamentos is None:
+        maximos = [ultimo_estagio(a, **read_csv_kwargs) for a in arquivos]
+        if any(m is None for m in maximos):
+            raise ValueError("Arquivo sem linhas de dados (coluna 'Stage Number').")
+        deslocamentos, _ = deslocamentos_estagios(maximos)
+
+    h_init, d_init, init_dry_mass, v_0, vol_solid, v_w_f = constantes_amostra(metadados)
+
+    # 1ª passagem: estado acumulado e resumo por estágio do ensaio inteiro
+    estado = resumo = None
+    n_linhas = 0
+    for bloco in _blocos(arquivos, deslocamentos, linhas_por_bloco, read_csv_kwargs):
+        estado = calcular_colunas_base(bloco, h_init, v_0, anterior=estado)
+        resumo = resumo_estagios(bloco, resumo, n_linhas)
+        n_linhas += len(bloco)
+    if not n_linhas:
+        raise ValueError("Nenhuma linha de dados nos arquivos do ensaio cíclico.")
+
+    metadados_parte2 = METADADOS_PARTE2(
+        df=resumo,
+        metadados=metadados,
+        init_dry_mass=init_dry_mass,
+        v_0=v_0,
+        vol_solid=vol_solid,
+        v_w_f=v_w_f,
+        h_init=h_init
+    )
+    metadados = dict(metadados)
+    metadados.update(metadados_parte2.get_all_attributes())
+
+    # 2ª passagem: colunas calculadas bloco a bloco, gravadas em seguida
+    # (as séries da análise por ciclo são guardadas, como gravadas)
+    series = {c: [] for c in ("stage_no", COLUNA_Q, COLUNA_EPS, COLUNA_DU)}
+    cursor = db.conn.cursor()
+    try:
+        idnome, _ = db.criar_registro_ensaio(cursor, metadados, filename)
+        estado = None
+        for bloco in _blocos(arquivos, deslocamentos, linhas_por_bloco, read_csv_kwargs):
+            estado = calcular_colunas_base(bloco, h_init, v_0, anterior=estado)
+            calcular_colunas_derivadas(bloco, metadados_parte2, h_init, v_0, vol_solid, d_init)
+            df_to_save = montar_df_para_salvar(bloco)
+            db.inserir_linhas_ensaio(cursor, idnome, df_to_save)
+            for c, partes in series.items():
+                partes.append(df_to_save[c].to_numpy(dtype=float))
+        db.inserir_linhas_ficticias(cursor, idnome)
+        db.salvar_estagios(cursor, idnome)
+        db.salvar_ruptura(cursor, idnome)
+
+        series = {c: np.concatenate(partes) for c, partes in series.items()}
+        ciclos = analisar_ciclos(series[COLUNA_Q], series[COLUNA_EPS], series[COLUNA_DU],
+                                 estagios=series["stage_no"])
+        db.salvar_ciclos(cursor, idnome, ciclos)
+        db.conn.commit()
+    except Exception:
+        db.conn.rollback()
+        raise
+
+    return {'filename': filename, 'linhas': n_linhas,
+            'metadados': metadados, 'metadados_parte2': metadados_parte2,
+            'ciclos': ciclos}
@@ -0,0 +1,140 @@
+# decimacao.py
+# Redução do número de pontos das séries dos ensaios para a planilha
+# (PreencherExcel) e para os gráficos (interface), mantendo a forma da curva.
+#
+# Políticas (todas devolvem as posições, em ordem crescente, das linhas
+# mantidas, para aplicar igualmente a todas as colunas):
+#   - "cabeca_passo": as primeiras 'cabeca' linhas e depois uma a cada
+#     'passo' (a regra da planilha individual: 30 linhas, depois 1 em 10);
+#   - "lttb": Largest-Triangle-Three-Buckets sobre o par (x, y) do gráfico,
+#     que preserva picos e mudanças de inclinação;
+#   - "uniforme": passo constante.
+# 'max_pontos' limita o total em qualquer política. Com 'estagios' (o
+# stage_no de cada linha), cada estágio é reduzido em separado, com parte
+# do limite proporcional ao seu tamanho, e o primeiro e o último ponto de
+# cada estágio são sempre mantidos.
+
+import numpy as np
+
+POLITICAS = ("cabeca_passo", "lttb", "uniforme")
+
+# Regra da planilha individual (task.txt)
+LINHAS_CABECA = 30
+PASSO_CAUDA = 10
+
+# Pontos por série nos gráficos
+MAX_PONTOS_GRAFICO = 2000
+
+
+def _cabeca_passo(n, cabeca, passo):
+    indices = np.concatenate((np.arange(min(cabeca, n)), np.arange(cabeca, n, passo)))
+    if n and indices[-1] != n - 1:
+        indices = np.append(indices, n - 1)
+    return indices
+
+
+def _uniforme(n, max_pontos):
+    if n <= max_pontos:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_pontos).round().astype(np.int64))
+
+
+def _lttb(x, y, max_pontos):
+    """Posições escolhidas pelo LTTB (sempre com o primeiro e o último ponto)."""
+    n = len(x)
+    if n <= max_pontos or max_pontos < 3:
+        return _uniforme(n, max(max_pontos, min(n, 2)))
+
+    # Baldes do miolo (sem o primeiro e o último ponto)
+    limites = np.linspace(1, n - 1, max_pontos - 1).astype(np.int64)
+    # Média de cada balde (o "terceiro vértice" do triângulo do balde anterior)
+    medias_x = np.add.reduceat(x[1:n - 1], limites[:-1] - 1) / np.diff(limites)
+    medias_y = np.add.reduceat(y[1:n - 1], limites[:-1] - 1) / np.diff(limites)
+    medias_x = np.append(medias_x, x[-1])
+    medias_y = np.append(medias_y, y[-1])
+
+    escolhidos = np.empty(max_pontos, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    a = 0
+    for b in range(max_pontos - 2):
+        ini, fim = limites[b], limites[b + 1]
+        # Área (x2) do triângulo (ponto anterior, candidato, média do próximo balde)
+        area = np.abs((x[a] - medias_x[b + 1]) * (y[ini:fim] - y[a])
+                      - (x[a] - x[ini:fim]) * (medias_y[b + 1] - y[a]))
+        a = ini + int(np.argmax(area))
+        escolhidos[b + 1] = a
+    return escolhidos
+
+
+def _limpar(valores, n):
+    v = np.asarray(valores, dtype=float) if valores is not None else np.arange(n, dtype=float)
+    # NaN não entram nas médias/áreas do LTTB
+    return np.where(np.isfinite(v), v, 0.0)
+
+
+def indices_decimacao(n, politica="lttb", max_pontos=None, x=None, y=None,
+                      estagios=None, cabeca=LINHAS_CABECA, passo=PASSO_CAUDA):
+    """
+    Posições das linhas mantidas de uma série de 'n' linhas.
+
+    Args:
+        politica: uma de POLITICAS.
+        max_pontos: limite de pontos (None: sem limite, só a política).
+        x, y: série do gráfico, para o "lttb" (sem x, usa a posição).
+        estagios: stage_no de cada linha; reduz cada estágio em separado.
+        cabeca, passo: parâmetros do "cabeca_passo".
+
+    Returns:
+        np.ndarray de posições (int64), crescentes.
+    """
+    if politica not in POLITICAS:
+        raise ValueError(f"Política de decimação desconhecida: {politica!r}")
+    if n == 0:
+        return np.arange(0)
+
+    if estagios is not None:
+        estagios = np.asarray(estagios)
+        inicios = np.concatenate(([0], np.flatnonzero(estagios[1:] != estagios[:-1]) + 1))
+    else:
+        inicios = np.array([0])
+    fins = np.append(inicios[1:], n)
+
+    xv, yv = _limpar(x, n), _limpar(y, n)
+    partes = []
+    for ini, fim in zip(inicios, fins):
+        tamanho = fim - ini
+        cota = None
+        if max_pontos is not None:
+            cota = max(2, int(max_pontos * tamanho / n))
+        if politica == "cabeca_passo":
+            indices = _cabeca_passo(tamanho, cabeca, passo)
+            if cota is not None and len(indices) > cota:
+                indices = indices[_uniforme(len(indices), cota)]
+        elif politica == "lttb":
+            indices = _lttb(xv[ini:fim], yv[ini:fim], cota if cota is not None else tamanho)
+        else:
+            indices = _uniforme(tamanho, cota if cota is not None else tamanho)
+        partes.append(indices + ini)
+    return np.concatenate(partes)
+
+
+def decimar_colunas(colunas, indices):
+    """{coluna: lista} com só as posições 'indices' de cada lista."""
+    return {nome: [valores[i] for i in indices if i < len(valores)]
+            for nome, valores in colunas.items()}
+
+
+def decimar_df(df, x_col, y_col, max_pontos=MAX_PONTOS_GRAFICO, politica="lttb",
+               coluna_estagio="stage_no"):
+    """
+    Linhas de 'df' para plotar y_col × x_col com no máximo ~max_pontos
+    pontos (por estágio, se 'coluna_estagio' existir em 'df').
+    """
+    if len(df) <= max_pontos:
+        return df
+    estagios = df[coluna_estagio].to_numpy() if coluna_estagio in df.columns else None
+    indices = indices_decimacao(len(df), politica, max_pontos,
+                                x=df[x_col].to_numpy(dtype=float),
+                                y=df[y_col].to_numpy(dtype=float),
+                                estagios=estagios)
+    return df.iloc[indices]
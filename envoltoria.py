@@ -0,0 +1,223 @@
+# envoltoria.py
+# Envoltórias de resistência por amostra e tipo de ensaio, a partir dos
+# pontos de ruptura já gravados em RupturaEnsaio (ruptura.py), sem reler
+# as séries dos ensaios:
+#   - Mohr-Coulomb: reta q = a + M·p' pelos pontos de ruptura adotados
+#     (fail_crit de cada ensaio), convertida para c' e φ' (compressão
+#     triaxial):  sen φ' = 3M/(6+M),  c' = a·(3 - sen φ')/(6·cos φ');
+#   - Estado crítico: reta q = M·p' pela origem, pelos últimos pontos do
+#     cisalhamento (critério 'ultimo').
+# Lados A e B são ajustados em separado.
+#
+# Uma consulta traz os pontos de todos os corpos de prova aprovados da
+# campanha (DatabaseManager.get_rupturas_campanha) e os mínimos quadrados
+# de todos os grupos (amostra, tipo, lado) saem de somas por grupo
+# (np.bincount), sem laço por amostra. O ajuste robusto (opcional) é o de
+# Huber, por mínimos quadrados reponderados (IRLS), também vetorizado.
+#
+# PARA RODAR, DIGITAR PELO PROMPT:
+# python envoltoria.py --contrato 123 --campanha C123
+# python envoltoria.py --contrato 123 --campanha C123 --robusto --csv envoltorias.csv
+
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from testeBD import DatabaseManager
+
+# Constante de Huber (95% de eficiência com erros normais)
+HUBER_K = 1.345
+ITERACOES_ROBUSTO = 50
+TOLERANCIA_ROBUSTO = 1e-8
+
+CHAVES_GRUPO = ["idamostra", "tipo", "lado"]
+
+
+###############################################################################
+# Mínimos quadrados por grupo
+###############################################################################
+def _somas(grupos, n_grupos, pesos):
+    return lambda v: np.bincount(grupos, weights=pesos * v, minlength=n_grupos)
+
+
+def _retas(x, y, grupos, n_grupos, pesos, origem):
+    """Coeficientes (a, M) da reta de cada grupo, com 'pesos' por ponto."""
+    soma = _somas(grupos, n_grupos, pesos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if origem:
+            return np.zeros(n_grupos), soma(x * y) / soma(x * x)
+        sw, sx, sy = soma(1.0), soma(x), soma(y)
+        inclinacao = (sw * soma(x * y) - sx * sy) / (sw * soma(x * x) - sx * sx)
+        return (sy - inclinacao * sx) / sw, inclinacao
+
+
+def _mediana_grupos(valores, grupos, n_grupos):
+    """Mediana de 'valores' em cada grupo (NaN nos grupos vazios)."""
+    ordem = np.lexsort((valores, grupos))
+    ordenados = valores[ordem]
+    contagem = np.bincount(grupos, minlength=n_grupos)
+    inicios = np.concatenate(([0], np.cumsum(contagem)[:-1]))
+    medianas = np.full(n_grupos, np.nan)
+    ok = contagem > 0
+    baixo = inicios[ok] + (contagem[ok] - 1) // 2
+    alto = inicios[ok] + contagem[ok] // 2
+    medianas[ok] = (ordenados[baixo] + ordenados[alto]) / 2.0
+    return medianas
+
+
+def ajustar_retas(x, y, grupos, n_grupos=None, origem=False, robusto=False):
+    """
+    Ajuste por mínimos quadrados de y = a + M·x (ou y = M·x, com 'origem')
+    em cada grupo, todos de uma vez.
+
+    Args:
+        x, y: pontos (arrays do mesmo tamanho, sem NaN).
+        grupos: nº do grupo (0..n_grupos-1) de cada ponto.
+        robusto: ajuste de Huber (IRLS), pouco sensível a pontos
+            discrepantes; a escala dos resíduos é a MAD de cada grupo.
+
+    Returns:
+        dict de arrays por grupo: 'a', 'M', 'r2' e 'n' (nº de pontos).
+        Grupos sem pontos suficientes (2, ou 1 com 'origem') ficam NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    grupos = np.asarray(grupos, dtype=np.int64)
+    if n_grupos is None:
+        n_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+
+    pesos = np.ones(len(x))
+    a, m = _retas(x, y, grupos, n_grupos, pesos, origem)
+    if robusto:
+        for _ in range(ITERACOES_ROBUSTO):
+            residuos = y - (a[grupos] + m[grupos] * x)
+            escala = 1.4826 * _mediana_grupos(np.abs(residuos), grupos, n_grupos)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                u = np.abs(residuos) / (HUBER_K * escala[grupos])
+                pesos = np.where(u > 1.0, 1.0 / u, 1.0)
+            # Resíduos todos nulos (escala 0): mantém os pesos unitários
+            pesos = np.where(np.isfinite(pesos), pesos, 1.0)
+            a_novo, m_novo = _retas(x, y, grupos, n_grupos, pesos, origem)
+            with np.errstate(invalid='ignore'):
+                convergiu = np.nanmax(np.abs(np.r_[a_novo - a, m_novo - m]), initial=0.0) < TOLERANCIA_ROBUSTO
+            a, m = a_novo, m_novo
+            if convergiu:
+                break
+
+    n = np.bincount(grupos, minlength=n_grupos)
+    media_y = np.bincount(grupos, weights=y, minlength=n_grupos) / np.maximum(n, 1)
+    ss_res = np.bincount(grupos, weights=(y - a[grupos] - m[grupos] * x) ** 2, minlength=n_grupos)
+    ss_tot = np.bincount(grupos, weights=(y - media_y[grupos]) ** 2, minlength=n_grupos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(ss_tot > 0, 1.0 - ss_res / ss_tot, np.nan)
+
+    poucos = n < (1 if origem else 2)
+    a, m, r2 = (np.where(poucos, np.nan, v) for v in (a, m, r2))
+    return {'a': a, 'M': m, 'r2': r2, 'n': n}
+
+
+def parametros_mohr_coulomb(M, a):
+    """
+    (c', φ' em graus) da reta q = a + M·p' em compressão triaxial.
+    M fora da faixa física (0 <= M < 3) fica NaN.
+    """
+    M = np.asarray(M, dtype=float)
+    a = np.asarray(a, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        seno = np.where((M >= 0) & (M < 3), 3.0 * M / (6.0 + M), np.nan)
+        phi = np.arcsin(seno)
+        c = a * (3.0 - seno) / (6.0 * np.cos(phi))
+    return c, np.degrees(phi)
+
+
+###############################################################################
+# Funções públicas
+###############################################################################
+def ajustar_envoltorias(rupturas, robusto=False):
+    """
+    Envoltórias de cada grupo (idamostra, tipo, lado) de 'rupturas' (o
+    DataFrame de DatabaseManager.get_rupturas_campanha).
+
+    Returns:
+        DataFrame: uma linha por grupo, com n_pontos, M, intercepto_kpa,
+        c_kpa, phi_graus e r2 (Mohr-Coulomb, pontos adotados) e n_cs, M_cs,
+        phi_cs_graus e r2_cs (estado crítico, critério 'ultimo').
+    """
+    colunas = CHAVES_GRUPO + ["n_pontos", "M", "intercepto_kpa", "c_kpa", "phi_graus", "r2",
+                              "n_cs", "M_cs", "phi_cs_graus", "r2_cs"]
+    if rupturas is None or rupturas.empty:
+        return pd.DataFrame(columns=colunas)
+
+    validos = rupturas.dropna(subset=["q", "p_efetiva"])
+    codigos, chaves = pd.MultiIndex.from_frame(validos[CHAVES_GRUPO]).factorize()
+    n_grupos = len(chaves)
+    pico = (validos["adotado"] == 1).to_numpy()
+    cs = (validos["criterio"] == "ultimo").to_numpy()
+    x = validos["p_efetiva"].to_numpy(dtype=float)
+    y = validos["q"].to_numpy(dtype=float)
+
+    mc = ajustar_retas(x[pico], y[pico], codigos[pico], n_grupos, robusto=robusto)
+    ec = ajustar_retas(x[cs], y[cs], codigos[cs], n_grupos, origem=True, robusto=robusto)
+    c, phi = parametros_mohr_coulomb(mc['M'], mc['a'])
+    _, phi_cs = parametros_mohr_coulomb(ec['M'], 0.0)
+
+    resultado = pd.DataFrame(list(chaves), columns=CHAVES_GRUPO)
+    resultado["n_pontos"] = mc['n']
+    resultado["M"] = mc['M']
+    resultado["intercepto_kpa"] = mc['a']
+    resultado["c_kpa"] = c
+    resultado["phi_graus"] = phi
+    resultado["r2"] = mc['r2']
+    resultado["n_cs"] = ec['n']
+    resultado["M_cs"] = ec['M']
+    resultado["phi_cs_graus"] = phi_cs
+    resultado["r2_cs"] = ec['r2']
+    return resultado.sort_values(CHAVES_GRUPO, kind="stable").reset_index(drop=True)[colunas]
+
+
+def envoltorias_campanha(idcontrato, idcampanha, robusto=False, status='Aprovado',
+                         db_manager=None):
+    """
+    Envoltórias de todas as amostras e tipos de ensaio da campanha, com os
+    corpos de prova de status 'status' (None: todos).
+    Retorna None em caso de erro na leitura do banco.
+    """
+    db = db_manager or DatabaseManager()
+    rupturas = db.get_rupturas_campanha(idcontrato, idcampanha, status=status)
+    if rupturas is None:
+        return None
+    return ajustar_envoltorias(rupturas, robusto=robusto)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ajusta as envoltórias (c', φ' e M) das amostras de uma campanha."
+    )
+    parser.add_argument('--contrato', required=True, help="idcontrato.")
+    parser.add_argument('--campanha', required=True, help="idcampanha.")
+    parser.add_argument('--robusto', action='store_true', help="Ajuste robusto (Huber).")
+    parser.add_argument('--todos', action='store_true',
+                        help="Usa todos os corpos de prova, não só os 'Aprovado'.")
+    parser.add_argument('--csv', default=None, help="Grava o resultado neste arquivo CSV.")
+    args = parser.parse_args(argv)
+
+    resultado = envoltorias_campanha(args.contrato, args.campanha, robusto=args.robusto,
+                                     status=None if args.todos else 'Aprovado')
+    if resultado is None:
+        return 1
+    if resultado.empty:
+        print("Nenhum ponto de ruptura na seleção.")
+        return 0
+
+    if args.csv:
+        resultado.to_csv(args.csv, index=False)
+        print(f"Envoltórias gravadas em '{args.csv}'.")
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(resultado.round(4).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
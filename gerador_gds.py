@@ -0,0 +1,252 @@
+# gerador_gds.py
+# Gera arquivos .gds sintéticos (mesmo formato das exportações do
+# equipamento) para medir o desempenho com cargas repetíveis: bloco de
+# metadados ("Chave","Valor") seguido da tabela "Stage Number", com os
+# estágios de um ensaio triaxial CIU:
+#   1     montagem
+#   2..5  saturação (rampas de pressão confinante e contrapressão)
+#   6     verificação do parâmetro B
+#   7     adensamento isotrópico
+#   8     cisalhamento não drenado (até 20% de deformação axial)
+# Os números dos estágios vão para os metadados (B, Adensamento,
+# Cisalhamento Inicial/Final). Mesma 'semente' => mesmo arquivo.
+#
+# Com 'virgula_decimal', os números saem no formato brasileiro entre
+# aspas ("1.234,567"), como nas exportações com vírgula decimal.
+#
+# PARA RODAR, DIGITAR PELO PROMPT:
+# python gerador_gds.py saida.gds --linhas 100000
+# python gerador_gds.py saida.gds --linhas 5000000 --virgula --semente 3
+
+import sys
+import csv
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from teste3 import GDS_HEADER_MAPPING
+
+LINHAS_POR_BLOCO = 500_000
+
+# (stage_no, fração das linhas, passo de tempo em s)
+ESTAGIOS = (
+    (1, 0.02, 10.0),
+    (2, 0.03, 5.0),
+    (3, 0.03, 5.0),
+    (4, 0.03, 5.0),
+    (5, 0.03, 5.0),
+    (6, 0.03, 2.0),
+    (7, 0.23, 20.0),
+    (8, 0.60, 6.0),
+)
+ESTAGIO_B = 6
+ESTAGIO_ADENSAMENTO = 7
+ESTAGIO_CISALHAMENTO = 8
+
+ALTURA_MM = 100.0
+DIAMETRO_MM = 50.0
+
+
+def metadados_sinteticos(idcontrato="C123", idcampanha="BH1", idamostra="AM01",
+                         sequencial=1, cp="A", sigma3=100.0):
+    """Metadados (chave do .gds -> valor) de um corpo de prova sintético."""
+    return [
+        ("Job reference:", idcontrato),
+        ("Borehole:", idcampanha),
+        ("Sample Name:", idamostra),
+        ("Description of Sample:", f"17S{sequencial:02d}"),
+        ("Test Number:", f"{cp}R1"),
+        ("Depth:", "12.5"),
+        ("Initial Height (mm)", f"{ALTURA_MM}"),
+        ("Initial Diameter (mm)", f"{DIAMETRO_MM}"),
+        ("Ram Diameter", "20"),
+        ("Initial mass (g):", "380.5"),
+        ("Initial dry mass (g):", "315.2"),
+        ("Specific Gravity (kN/m³):", "2.68"),
+        ("Volume de umidade médio INICIAL", "0.207"),
+        ("Volume de umidade médio FINAL", "0.195"),
+        ("Specify failure criterion (max deviator stress/deviator stress at 15% strain/max eff. stress/other:",
+         "max deviator stress"),
+        ("B", str(ESTAGIO_B)),
+        ("Adensamento", str(ESTAGIO_ADENSAMENTO)),
+        ("Cisalhamento Inicial", str(ESTAGIO_CISALHAMENTO)),
+        ("Cisalhamento Final", str(ESTAGIO_CISALHAMENTO)),
+    ]
+
+
+def _tamanhos_estagios(n_linhas):
+    tamanhos = np.array([max(1, int(round(f * n_linhas))) for _, f, _ in ESTAGIOS])
+    tamanhos[-1] += n_linhas - tamanhos.sum()
+    return tamanhos
+
+
+def tabela_sintetica(n_linhas, sigma3=100.0, semente=0):
+    """
+    DataFrame com as colunas do .gds (nomes de GDS_HEADER_MAPPING) e
+    séries com a forma de um ensaio CIU real, mais ruído de leitura.
+    """
+    rng = np.random.default_rng(semente)
+    tamanhos = _tamanhos_estagios(n_linhas)
+    stage = np.repeat([s for s, _, _ in ESTAGIOS], tamanhos)
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    # Posição (0..1) da linha dentro do seu estágio
+    k = np.arange(n_linhas) - np.repeat(inicios, tamanhos)
+    frac = k / np.repeat(np.maximum(tamanhos - 1, 1), tamanhos)
+    dt = np.repeat([p for _, _, p in ESTAGIOS], tamanhos)
+    t_estagio = k * dt
+    t_ensaio = np.cumsum(dt) - dt[0]
+
+    back = np.zeros(n_linhas)
+    rad = np.zeros(n_linhas)
+    pore = np.zeros(n_linhas)
+    back_vol = np.zeros(n_linhas)
+    ax_disp = np.zeros(n_linhas)
+    q = np.zeros(n_linhas)
+
+    def em(s):
+        return stage == s
+
+    # Montagem: pressões baixas
+    rad[em(1)], back[em(1)], pore[em(1)] = 20.0, 10.0, 5.0
+    # Saturação: quatro rampas de 100 kPa (σ'c = 10 kPa)
+    for i, s in enumerate((2, 3, 4, 5)):
+        m = em(s)
+        back[m] = 10.0 + 100.0 * (i + frac[m])
+        rad[m] = back[m] + 10.0
+        pore[m] = back[m] - 2.0 * np.exp(-5 * frac[m])
+        back_vol[m] = 800.0 * (i + frac[m])
+    fim_sat = back[em(5)][-1]
+    # Verificação de B: +50 kPa na confinante com a drenagem fechada
+    m = em(6)
+    back[m], back_vol[m] = fim_sat, 3200.0
+    rad[m] = fim_sat + 10.0 + 50.0
+    pore[m] = fim_sat + 0.97 * 50.0 * (1 - np.exp(-8 * frac[m]))
+    # Adensamento isotrópico até σ'3 (drenado pela base)
+    m = em(7)
+    back[m] = fim_sat
+    rad[m] = fim_sat + sigma3
+    pore[m] = fim_sat + (sigma3 - 10.0) * np.exp(-6 * frac[m])
+    back_vol[m] = 3200.0 + 0.04 * sigma3 * 100 * (1 - np.exp(-6 * frac[m]))
+    ax_disp[m] = 0.004 * sigma3 * (1 - np.exp(-6 * frac[m]))
+    # Cisalhamento não drenado: q hiperbólico com leve amolecimento
+    m = em(8)
+    disp_c = ax_disp[em(7)][-1]
+    eps = 0.20 * frac[m]
+    ax_disp[m] = disp_c + eps * (ALTURA_MM - disp_c)
+    q_max = 1.2 * sigma3
+    q[m] = q_max * eps / (0.01 + eps) * (1 - 0.8 * np.maximum(eps - 0.08, 0))
+    back[m], rad[m] = fim_sat, fim_sat + sigma3
+    back_vol[m] = back_vol[em(7)][-1]
+    pore[m] = fim_sat + 0.45 * q[m] - 0.15 * q_max * np.maximum(eps - 0.05, 0) / 0.15
+
+    # Ruído de leitura dos transdutores
+    rad += rng.normal(0, 0.05, n_linhas)
+    back += rng.normal(0, 0.05, n_linhas)
+    pore += rng.normal(0, 0.08, n_linhas)
+    back_vol += rng.normal(0, 0.5, n_linhas)
+    ax_disp += rng.normal(0, 0.0005, n_linhas)
+    q += rng.normal(0, 0.3, n_linhas)
+
+    area_0 = np.pi * DIAMETRO_MM ** 2 / 4
+    ax_strain = np.where(stage == ESTAGIO_CISALHAMENTO, (ax_disp - disp_c) / (ALTURA_MM - disp_c), 0.0)
+    area = area_0 / (1 - ax_strain)
+    load = q * area / 1e6        # kN
+    eff_rad = rad - pore
+    eff_ax = eff_rad + q
+    p_total = rad + q / 3
+    p_efetiva = eff_rad + q / 3
+    with np.errstate(divide='ignore', invalid='ignore'):
+        razao_total = np.where(rad != 0, (rad + q) / rad, 0.0)
+        razao_efetiva = np.where(eff_rad != 0, eff_ax / eff_rad, 0.0)
+
+    colunas = {
+        "Stage Number": stage,
+        "Time since start of test (s)": t_ensaio,
+        "Time since start of stage (s)": t_estagio,
+        "Radial Pressure (kPa)": rad,
+        "Radial Volume (mm³)": -back_vol * 0.9 + rng.normal(0, 0.5, n_linhas),
+        "Back Pressure (kPa)": back,
+        "Back Volume (mm³)": back_vol,
+        "Load Cell (kN)": load,
+        "Pore Pressure (kPa)": pore,
+        "Axial Displacement (mm)": ax_disp,
+        "Axial Force (kN)": load + 0.002,
+        "Axial Strain (%)": ax_strain * 100,
+        "Av Diameter Change (mm)": DIAMETRO_MM * (np.sqrt(1 / (1 - ax_strain)) - 1),
+        "Radial Strain (%)": -ax_strain * 50,
+        "Axial Stress (kPa)": rad + q,
+        "Eff. Axial Stress (kPa)": eff_ax,
+        "Eff. Radial Stress (kPa)": eff_rad,
+        "Deviator Stress (kPa)": q,
+        "Total Stress Ratio": razao_total,
+        "Eff. Stress Ratio": razao_efetiva,
+        "Current Area (mm²)": area,
+        "Shear Strain (%)": ax_strain * 100 * 2 / 3,
+        "Cambridge p (kPa)": p_total,
+        "Eff. Cambridge p' (kPa)": p_efetiva,
+        "Max Shear Stress t (kPa)": q / 2,
+        "Volume Change (mm³)": back_vol - back_vol[0],
+        "B Value": np.where(stage == ESTAGIO_B, (pore - fim_sat) / 50.0, 0.0),
+        "Mean Stress s/Eff. Axial Stress 2": (eff_ax + eff_rad) / 2,
+    }
+    # Mesma ordem de colunas do GDS_HEADER_MAPPING
+    return pd.DataFrame({nome: colunas[nome] for nome in GDS_HEADER_MAPPING})
+
+
+def _formatar_virgula(valor):
+    # "1234.5" -> "1.234,500000"
+    return f"{valor:,.6f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def gerar_gds(caminho, n_linhas=10_000, virgula_decimal=False, semente=0,
+              sigma3=100.0, **metadados_kwargs):
+    """
+    Grava em 'caminho' um .gds sintético com 'n_linhas' linhas na tabela
+    (ver tabela_sintetica) e os metadados de metadados_sinteticos.
+    A tabela é gerada e gravada em blocos de LINHAS_POR_BLOCO linhas.
+    Retorna 'caminho'.
+    """
+    metadados = metadados_sinteticos(sigma3=sigma3, **metadados_kwargs)
+    tabela = tabela_sintetica(n_linhas, sigma3=sigma3, semente=semente)
+
+    with open(caminho, "w", encoding="latin-1", newline="") as f:
+        for chave, valor in metadados:
+            if virgula_decimal:
+                try:
+                    valor = _formatar_virgula(float(valor)).rstrip("0").rstrip(",")
+                except ValueError:
+                    pass
+            f.write(f'"{chave}","{valor}"\r\n')
+        f.write(",".join(f'"{c}"' for c in tabela.columns) + "\r\n")
+
+        for ini in range(0, n_linhas, LINHAS_POR_BLOCO):
+            bloco = tabela.iloc[ini:ini + LINHAS_POR_BLOCO]
+            if virgula_decimal:
+                texto = bloco.drop(columns="Stage Number").map(_formatar_virgula)
+                texto.insert(0, "Stage Number", bloco["Stage Number"])
+                texto.to_csv(f, header=False, index=False, lineterminator="\r\n",
+                             quoting=csv.QUOTE_NONNUMERIC)
+            else:
+                bloco.to_csv(f, header=False, index=False, lineterminator="\r\n",
+                             float_format="%.6f")
+    return caminho
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um arquivo .gds sintético.")
+    parser.add_argument('caminho', help="Arquivo .gds de saída.")
+    parser.add_argument('--linhas', type=int, default=10_000, help="Linhas da tabela.")
+    parser.add_argument('--virgula', action='store_true', help="Números com vírgula decimal.")
+    parser.add_argument('--semente', type=int, default=0, help="Semente do ruído.")
+    parser.add_argument('--sigma3', type=float, default=100.0,
+                        help="Tensão confinante efetiva do adensamento (kPa).")
+    args = parser.parse_args(argv)
+
+    gerar_gds(args.caminho, args.linhas, args.virgula, args.semente, args.sigma3)
+    print(f"Arquivo gerado: {args.caminho} ({args.linhas} linhas)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
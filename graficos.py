@@ -0,0 +1,127 @@
+# graficos.py
+# Montagem das figuras (matplotlib) dos gráficos do cisalhamento, sem
+# nada de Tk: a interface embute a figura na janela e o benchmark.py mede
+# a construção com o backend que estiver ativo (Agg, sem tela).
+# As séries passam pela decimação (decimacao.decimar_df) antes do scatter.
+
+import matplotlib.pyplot as plt
+
+from decimacao import decimar_df
+
+# Pares (y, x) do gráfico de um arquivo
+PARES_ARQUIVO = [
+    ('dev_stress_A', 'ax_strain'),   # 1
+    ('dev_stress_B', 'ax_strain'),   # 2
+    ('dev_stress_A', 'eff_camb_A'),  # 3
+    ('dev_stress_B', 'eff_camb_B'),  # 4
+    ('du_kpa',       'ax_strain'),   # 5
+    ('vol_strain_A', 'ax_strain'),   # 6
+    ('vol_strain_B', 'ax_strain'),   # 7
+    ('void_ratio_A', 'eff_camb_A'),  # 8
+    ('void_ratio_B', 'eff_camb_B'),  # 9
+    ('nqp_A',        'ax_strain'),   # 10
+    ('nqp_B',        'ax_strain'),   # 11
+    ('m_A',          'ax_strain'),   # 12
+    ('m_B',          'ax_strain'),   # 13
+]
+
+# Pares (y, x) do gráfico da amostra (todos os arquivos juntos)
+PARES_AMOSTRA = [
+    ('void_ratio_A', 'eff_camb_A'),
+    ('void_ratio_B', 'eff_camb_B'),
+    ('dev_stress_A', 'eff_camb_A'),
+    ('dev_stress_B', 'eff_camb_B'),
+    ('nqp_A',        'ax_strain'),
+    ('nqp_B',        'ax_strain'),
+]
+
+# Gráficos da amostra com o ponto do fim do cisalhamento (RupturaEnsaio 'ultimo')
+PARES_COM_ULTIMO = [
+    ('void_ratio_A', 'eff_camb_A'),
+    ('void_ratio_B', 'eff_camb_B'),
+]
+
+
+def _grade(n, cols=3):
+    rows = n // cols + int(n % cols > 0)
+    fig, axs = plt.subplots(rows, cols, figsize=(18, 6 * rows))
+    axs = axs.flatten()
+    # Remover subplots que sobraram (se houver)
+    for i in range(n, len(axs)):
+        fig.delaxes(axs[i])
+    return fig, axs[:n]
+
+
+def _eixos(ax, y_col, x_col, separador="x"):
+    ax.grid(True)
+    ax.set_xlabel(x_col)
+    ax.set_ylabel(y_col)
+    ax.set_title(f"{y_col} {separador} {x_col}")
+
+
+def figura_arquivo(df, rotulo, pares=PARES_ARQUIVO):
+    """
+    Figura dos gráficos de um arquivo (scatter sem linha e sem legenda
+    fixa; 'rotulo' aparece no hover). Retorna (fig, artists).
+    """
+    fig, axs = _grade(len(pares))
+    artists = []
+    for ax, (y_col, x_col) in zip(axs, pares):
+        pontos = decimar_df(df, x_col, y_col)
+        sc = ax.scatter(
+            pontos[x_col],
+            pontos[y_col],
+            s=8,             # Tamanho do ponto
+            linewidths=0.5,  # Contorno mais fino
+            edgecolors='blue',
+            facecolors='none',
+            label=rotulo     # Para exibir no hover
+        )
+        _eixos(ax, y_col, x_col)
+        artists.append(sc)
+
+    plt.tight_layout()
+    return fig, artists
+
+
+def figura_amostra(datasets, cores, ultimos=None, pares=PARES_AMOSTRA):
+    """
+    Figura dos gráficos da amostra: um scatter por arquivo ('datasets':
+    {arquivo: DataFrame}, 'cores': {arquivo: cor}) e, nos PARES_COM_ULTIMO,
+    o ponto do fim do cisalhamento ('ultimos': {arquivo: {lado: linha de
+    RupturaEnsaio}}) como uma bola preta maior. Retorna (fig, artists).
+    """
+    ultimos = ultimos or {}
+    fig, axs = _grade(len(pares))
+    artists = []
+    for ax, (y_col, x_col) in zip(axs, pares):
+        for arq, df_cis in datasets.items():
+            if df_cis.empty:
+                continue
+            cor = cores[arq]
+
+            # ----- pontos normais (vazados) ---------------------
+            pontos = decimar_df(df_cis, x_col, y_col)
+            sc = ax.scatter(
+                pontos[x_col], pontos[y_col],
+                s=8, edgecolors=cor, facecolors='none',
+                linewidths=0.5, label=arq
+            )
+            artists.append(sc)
+
+            # ----- OUTLIER apenas nos dois gráficos alvo -------
+            lado = y_col[-1]
+            if (y_col, x_col) in PARES_COM_ULTIMO and lado in ultimos.get(arq, {}):
+                last = ultimos[arq][lado]
+                out = ax.scatter(
+                    last['p_efetiva'], last['e'],   # eff_camb e void_ratio do lado
+                    s=80, marker='o',
+                    facecolors='black', edgecolors='black',
+                    alpha=0.9, label=f"{arq}-out"
+                )
+                artists.append(out)
+
+        _eixos(ax, y_col, x_col, "×")
+
+    plt.tight_layout()
+    return fig, artists
@@ -0,0 +1,202 @@
+# ingestao.py
+# Ingestão em lote (sem interface) dos arquivos .gds ainda não salvos.
+#
+# PARA RODAR, DIGITAR PELO PROMPT:
+# python ingestao.py                      (usa a pasta LUIZ-Teste)
+# python ingestao.py C:\caminho\da\pasta --workers 4
+
+import os
+import sys
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+from testeBD import DatabaseManager, resource_path
+from teste2 import preparar_metadados_gds
+from teste3 import TableProcessor, read_gds
+from medicao import ColetorProcessos
+
+
+###############################################################################
+# Trabalho de cada processo (leitura + cálculos, sem acesso ao banco)
+###############################################################################
+def processar_arquivo(caminho, metadados_map, fixed_metadados):
+    """
+    Executado nos processos do pool: lê o .gds, prepara os metadados
+    (mesmo fluxo da interface) e roda o TableProcessor.
+    Não grava nada; quem grava é o processo principal (gravar_resultado).
+    """
+    filename = os.path.basename(caminho)
+    try:
+        # Sem cache: arquivo lido uma vez só (o recálculo lê do banco), e a
+        # gravação do .npz comprimido custaria mais que a própria leitura
+        lido = read_gds(caminho, metadados_map, usar_cache=False)
+        if lido['df'] is None:
+            raise ValueError("Cabeçalho com 'Stage Number' não encontrado.")
+
+        metadados, _ = preparar_metadados_gds(lido['metadados'], dict(fixed_metadados))
+        if not metadados:
+            raise ValueError("Nenhum metadado encontrado no arquivo.")
+
+        result = TableProcessor.process_table_data(None, metadados, caminho, df=lido['df'])
+        if result is None:
+            raise ValueError("Falha ao processar os dados do arquivo.")
+
+        return {'filename': filename, 'ok': True, 'erro': None,
+                'metadados': metadados, 'df': result['df'],
+                'registro': lido['registro']}
+
+    except Exception as e:
+        traceback.print_exc()
+        return {'filename': filename, 'ok': False, 'erro': str(e),
+                'metadados': None, 'df': None, 'registro': None}
+
+
+###############################################################################
+# Funções públicas
+###############################################################################
+def listar_pendentes(directory, db_manager=None):
+    """
+    Retorna os .gds de 'directory' que ainda não estão na tabela Cp
+    (ver DatabaseManager.escanear_diretorio).
+    """
+    db = db_manager or DatabaseManager()
+    return db.escanear_diretorio(directory)['novos']
+
+
+def gravar_resultado(db, resultado):
+    """
+    Grava no banco o resultado de processar_arquivo (só no processo
+    principal: um único escritor). Retorna o item do relatório
+    ({'arquivo', 'status', 'mensagem', 'linhas'}).
+    """
+    item = {'arquivo': resultado['filename'], 'status': 'ERRO',
+            'mensagem': resultado['erro'], 'linhas': 0}
+    if resultado['ok']:
+        if db.save_to_database(resultado['metadados'], resultado['df'],
+                               filename=resultado['filename'],
+                               registro=resultado['registro']):
+            item['status'] = 'OK'
+            item['mensagem'] = ''
+            item['linhas'] = len(resultado['df'])
+        else:
+            item['mensagem'] = "Falha ao salvar no banco de dados (ver log)."
+    return item
+
+
+def processar_pendentes(directory, arquivos, metadados_map, fixed_metadados, workers=None):
+    """
+    Processa 'arquivos' de 'directory' num pool de processos (leitura e
+    cálculos, sem acesso ao banco) e gera os resultados de processar_arquivo
+    à medida que ficam prontos. Não toca no banco: pode rodar numa thread
+    separada (interface), com a gravação feita por quem consome.
+    """
+    workers = workers or os.cpu_count() or 1
+    fila = iter(arquivos)
+
+    with ColetorProcessos() as coletor, \
+            ProcessPoolExecutor(max_workers=workers, **coletor.pool_kwargs) as pool:
+        # Janela limitada de tarefas em andamento: evita acumular na memória
+        # as tabelas já calculadas enquanto o escritor grava.
+        pendentes = set()
+
+        def submeter():
+            for nome in fila:
+                pendentes.add(pool.submit(processar_arquivo,
+                                          os.path.join(directory, nome),
+                                          metadados_map, fixed_metadados))
+                if len(pendentes) >= 2 * workers:
+                    break
+
+        submeter()
+        while pendentes:
+            feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                yield futuro.result()
+            submeter()
+
+
+def ingerir_pendentes(directory, arquivos=None, workers=None, db_manager=None, progresso=None):
+    """
+    Processa em paralelo os arquivos pendentes de 'directory' e grava
+    cada resultado no banco a partir de um único escritor (este processo).
+
+    Args:
+        directory: pasta com os .gds.
+        arquivos: lista de nomes a processar (padrão: listar_pendentes).
+        workers: nº de processos (padrão: os.cpu_count()).
+        db_manager: DatabaseManager já aberto (padrão: o singleton).
+        progresso: callback opcional progresso(feitos, total, item_relatorio).
+
+    Returns:
+        list[dict]: relatório com 'arquivo', 'status' ('OK'/'ERRO'),
+        'mensagem' e 'linhas' para cada arquivo.
+    """
+    db = db_manager or DatabaseManager()
+    if arquivos is None:
+        arquivos = listar_pendentes(directory, db)
+    if not arquivos:
+        return []
+
+    metadados_map = db.get_metadados_map()
+    fixed_metadados = db.get_fixed_metadados(None)
+
+    relatorio = []
+    total = len(arquivos)
+    for resultado in processar_pendentes(directory, arquivos, metadados_map,
+                                         fixed_metadados, workers):
+        item = gravar_resultado(db, resultado)
+        relatorio.append(item)
+        if progresso:
+            progresso(len(relatorio), total, item)
+
+    return relatorio
+
+
+def formatar_relatorio(relatorio):
+    """Texto do relatório (uma linha por arquivo + resumo)."""
+    linhas = []
+    for item in relatorio:
+        if item['status'] == 'OK':
+            linhas.append(f"[OK]   {item['arquivo']} ({item['linhas']} linhas)")
+        else:
+            linhas.append(f"[ERRO] {item['arquivo']}: {item['mensagem']}")
+    ok = sum(1 for item in relatorio if item['status'] == 'OK')
+    linhas.append(f"Total: {len(relatorio)} | OK: {ok} | ERRO: {len(relatorio) - ok}")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ingestão em lote dos arquivos .gds ainda não salvos no banco."
+    )
+    parser.add_argument('directory', nargs='?', default=resource_path('LUIZ-Teste'),
+                        help="Pasta com os arquivos .gds (padrão: LUIZ-Teste).")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Número de processos (padrão: nº de núcleos).")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"O diretório {args.directory} não existe.")
+        return 1
+
+    db = DatabaseManager()
+    varredura = db.escanear_diretorio(args.directory)
+    for nome in varredura['alterados']:
+        print(f"[AVISO] {nome} foi modificado depois de salvo no banco de dados.")
+
+    relatorio = ingerir_pendentes(args.directory, arquivos=varredura['novos'],
+                                  workers=args.workers, db_manager=db)
+    if not relatorio:
+        print("Todos os arquivos .gds da pasta já foram salvos no banco de dados.")
+        return 0
+
+    print(formatar_relatorio(relatorio))
+    return 0 if all(item['status'] == 'OK' for item in relatorio) else 2
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
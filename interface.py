@@ -7,7 +7,6 @@ import os
 import io
 import sys
 import matplotlib.pyplot as plt
-from teste   import fix_gds 
 from teste1 import FileProcessor
 from teste2 import StageProcessor
 from teste3 import TableProcessor, CisalhamentoData # Certifique-se de que o nome do arquivo está correto
@@ -17,12 +16,17 @@ import numpy as np
 import pandas as pd
 from testeBD import DatabaseManager  # Importar a classe DatabaseManager de testeBD.py
 import re
+import queue
+import threading
 import traceback
 import PreencherExcel
 import teste1
 import teste2
 import teste3
 import testeBD
+import ingestao
+import graficos
+from medicao import medido
 
 
 class InterfaceApp:
@@ -45,6 +49,8 @@ class InterfaceApp:
         self.selected_file = None
         self.metadados = {}
         self.metadados_parte2 = None
+        self.gds_df = None
+        self.gds_registro = None
         self.terminal_output = ""
         self.logged_in_user = None
 
@@ -210,18 +216,27 @@ class InterfaceApp:
             self.create_main_menu()
             return
 
-        all_files = [f for f in os.listdir(directory) if f.endswith('.gds')]
+        # Varredura pelo registro (tamanho/mtime/hash): arquivos inalterados
+        # não são abertos; os alterados após a ingestão são sinalizados.
+        varredura = self.db_manager.escanear_diretorio(directory)
+        arquivos_nao_salvos = varredura['novos']
+        arquivos_alterados = varredura['alterados']
 
-        if not all_files:
+        if not any(varredura.values()):
             messagebox.showinfo("Informação", "Nenhum arquivo .gds encontrado.")
             self.create_main_menu()
             return
 
-        # Buscar no banco de dados quais filenames já estão salvos
-        arquivos_salvos = self.db_manager.get_existing_filenames()
+        if arquivos_alterados:
+            messagebox.showwarning(
+                "Arquivos alterados",
+                "Os arquivos abaixo foram modificados depois de salvos no banco de dados:\n\n"
+                + "\n".join(arquivos_alterados)
+            )
 
-        # Filtrar os arquivos que não estão salvos no banco
-        arquivos_nao_salvos = [f for f in all_files if f not in arquivos_salvos]
+        if varredura['em_andamento']:
+            # Ensaios em andamento são gravados pelo acompanhamento.py (modo tail)
+            print("Arquivos em acompanhamento (modo tail): " + ", ".join(varredura['em_andamento']))
 
         if not arquivos_nao_salvos:
             messagebox.showinfo("Informação", "Todos os arquivos .gds da pasta já foram salvos no banco de dados.")
@@ -240,7 +255,90 @@ class InterfaceApp:
         button_frame.pack(pady=10)
 
         tk.Button(button_frame, text="Avançar", command=self.select_file, width=15).grid(row=0, column=0, padx=10)
-        tk.Button(button_frame, text="Voltar", command=self.create_main_menu, width=15).grid(row=0, column=1, padx=10)
+        tk.Button(button_frame, text="Ingerir Todos",
+                  command=lambda: self.ingerir_todos(directory, arquivos_nao_salvos),
+                  width=15).grid(row=0, column=1, padx=10)
+        tk.Button(button_frame, text="Voltar", command=self.create_main_menu, width=15).grid(row=0, column=2, padx=10)
+
+    def ingerir_todos(self, directory, arquivos):
+        """
+        Ingestão em lote (ingestao.py) de todos os arquivos pendentes:
+        leitura e cálculos num pool de processos, disparado por uma thread
+        para a janela continuar respondendo; a gravação no banco fica nesta
+        thread (a conexão do SQLite é dela), um resultado por vez, lidos da
+        fila com root.after. Ao final exibe o relatório por arquivo.
+        """
+        if not messagebox.askyesno(
+            "Confirmação",
+            f"Ingerir {len(arquivos)} arquivo(s) com os metadados lidos do próprio .gds?"
+        ):
+            return
+
+        self.clear_screen()
+        self.root.title("Ingestão em Lote")
+
+        frame = tk.Frame(self.root)
+        frame.pack(pady=20, fill=tk.BOTH, expand=True)
+
+        total = len(arquivos)
+        status_label = tk.Label(frame, text=f"Processando 0 de {total}...")
+        status_label.pack(pady=10)
+        # Desabilitado até o fim da ingestão
+        voltar = tk.Button(frame, text="Voltar", command=self.create_main_menu,
+                           width=15, state=tk.DISABLED)
+        voltar.pack(side=tk.BOTTOM, pady=10)
+
+        metadados_map = self.db_manager.get_metadados_map()
+        fixed_metadados = self.db_manager.get_fixed_metadados(None)
+        # Fila curta: a thread espera enquanto esta grava (memória limitada)
+        fila = queue.Queue(maxsize=2)
+        fim = object()
+
+        def trabalhar():
+            try:
+                for resultado in ingestao.processar_pendentes(directory, arquivos,
+                                                              metadados_map, fixed_metadados):
+                    fila.put(resultado)
+                fila.put(fim)
+            except Exception as e:
+                traceback.print_exc()
+                fila.put(e)
+
+        relatorio = []
+
+        def consumir():
+            try:
+                resultado = fila.get_nowait()
+            except queue.Empty:
+                self.root.after(100, consumir)
+                return
+
+            if resultado is fim:
+                concluir()
+                return
+            if isinstance(resultado, Exception):
+                messagebox.showerror("Erro", f"Falha na ingestão em lote: {resultado}")
+                self.create_main_menu()
+                return
+
+            item = ingestao.gravar_resultado(self.db_manager, resultado)
+            relatorio.append(item)
+            status_label.config(text=f"Processando {len(relatorio)} de {total}... "
+                                     f"({item['arquivo']}: {item['status']})")
+            self.root.after(1, consumir)
+
+        def concluir():
+            status_label.config(text="Ingestão concluída.")
+
+            text = tk.Text(frame, width=100, height=25)
+            text.insert(tk.END, ingestao.formatar_relatorio(relatorio))
+            text.config(state=tk.DISABLED)
+            text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+            voltar.config(state=tk.NORMAL)
+
+        threading.Thread(target=trabalhar, daemon=True).start()
+        self.root.after(100, consumir)
 
     def select_file_ciclico(self):
         """
@@ -319,53 +417,24 @@ class InterfaceApp:
         self.selected_file = self.file_listbox.get(index)
         directory = r'C:\Users\lgv_v\Documents\LUIZ-Teste'
         file_path = os.path.join(directory, self.selected_file)
-        file_path = fix_gds(file_path)
+        # Vírgula decimal é corrigida em memória na leitura (read_gds);
+        # o arquivo original não é mais reescrito.
         self.file_path = file_path
 
         processor = FileProcessor(directory)
         try:
-            self.metadados = processor.process_gds_file(file_path)
+            # Leitura única: metadados + tabela (reaproveitada em save_metadata);
+            # sem cache de tabelas, o arquivo é salvo no banco e não é relido
+            lido = processor.read_gds_file(file_path, usar_cache=False)
+            if lido is None:
+                raise ValueError("Falha ao ler o arquivo .gds.")
+            self.metadados = lido['metadados']
+            self.gds_df = lido['df']
+            self.gds_registro = lido['registro']
             self.fixed_metadados = self.db_manager.get_fixed_metadados(self.selected_file)
-            if self.fixed_metadados:
-                for k, v in self.fixed_metadados.items():
-                    if k not in self.metadados or not self.metadados[k]:
-                        self.metadados[k] = v
-
-            if "idcontrato" in self.metadados and not self.metadados.get("Job reference:"):
-                self.metadados["Job reference:"] = self.metadados["idcontrato"]
-            if "idcampanha" in self.metadados and not self.metadados.get("Borehole:"):
-                self.metadados["Borehole:"] = self.metadados["idcampanha"]
-            if "idamostra" in self.metadados and not self.metadados.get("Sample Name:"):
-                self.metadados["Sample Name:"] = self.metadados["idamostra"]
-            if "tipo" in self.metadados and not self.metadados.get("Description of Sample:"):
-                self.metadados["Description of Sample:"] = self.metadados["tipo"]
-            if "test_number" in self.metadados and not self.metadados.get("Test Number:"):
-                self.metadados["Test Number:"] = self.metadados["test_number"]
-
-            # Ajusta caso o FileProcessor tenha usado a chave "Description of Sample" (sem dois-pontos)
-            if "Description of Sample" in self.metadados and "Description of Sample:" not in self.metadados:
-                self.metadados["Description of Sample:"] = self.metadados["Description of Sample"]
-                del self.metadados["Description of Sample"]
-
-            desc_value = self.metadados.get("Description of Sample:", "").strip()
-            match_desc = re.match(r"(\d+)[Ss](\d+)", desc_value)
-            if match_desc:
-                self.metadados["idtipoensaio"] = int(match_desc.group(1))
-                self.metadados["sequencial"] = int(match_desc.group(2))
-            else:
-                self.metadados["idtipoensaio"] = 0
-                self.metadados["sequencial"] = 0
-
-            test_value = self.metadados.get("Test Number:", "").strip()
-            match_test = re.match(r"([A-Za-z]+)[Rr]?(\d+)", test_value)
-            if match_test:
-                self.metadados["cp"] = match_test.group(1)[0].upper()
-                self.metadados["repeticao"] = int(match_test.group(2))
-            else:
-                self.metadados["cp"] = None
-                self.metadados["repeticao"] = None
-
-            self.unify_metadados_keys()
+            self.metadados, self.metadata_items = teste2.preparar_metadados_gds(
+                self.metadados, self.fixed_metadados
+            )
             if not self.metadados:
                 raise ValueError("Nenhum metadado encontrado no arquivo.")
 
@@ -380,181 +449,26 @@ class InterfaceApp:
         """
         Ajusta as chaves de metadados lidas do arquivo, mapeando-as para
         as colunas que realmente queremos salvar no banco de dados.
-        Aqui ocorre a lógica de converter 'Cisalhamento' em dois valores:
-        '_cis_inicial' e '_cis_final'.
+        Ver teste2.unify_metadados_keys.
         """
-        desired_order = ["_B", "_ad", "_cis_inicial", "_cis_final", "w_0", "w_f",
-                        "idcontrato", "idcampanha", "idamostra", "idtipoensaio",
-                        "sequencial", "cp", "repeticao"]
-
-        possible_aliases = {
-            "B": "_B",
-            "Adensamento": "_ad",
-
-            "Cisalhamento Inicial": "_cis_inicial",
-            "Cisalhamento Final": "_cis_final",
-            "Sequencial": "sequencial",
-            "Volume de umidade médio INICIAL": "w_0",
-            "Volume de umidade médio FINAL": "w_f",
-            "Initial Height (mm)": "h_init",
-            "Initial Diameter (mm)": "d_init",
-            "Ram Diameter": "ram_diam",
-            "Specific Gravity (kN/m³):": "spec_grav",
-            "Job reference:": "idcontrato",
-            "Borehole:": "idcampanha",
-            "Sample Name:": "idamostra",
-            "Depth:": "depth",
-            "Sample Date (dd/mm/yyyy):": "samp_date",
-            "Description of Sample:": "tipo",
-            "Initial mass (g):": "init_mass",
-            "Initial dry mass (g):": "init_dry_mass",
-            "Specific Gravity (ass/meas):": "spec_grav_assmeas",
-            "Date Test Started:": "date_test_started",
-            "Date Test Finished:": "date_test_finished",
-            "Specimen Type (dis/undis):": "spec_type",
-            "Top Drain Used (y/n):": "top_drain",
-            "Base Drain Used (y/n):": "base_drain",
-            "Side Drains Used (y/n):": "side_drains",
-            "Final Mass:": "fin_mass",
-            "Final Dry Mass:": "fin_dry_mass",
-            "Machine No.:": "mach_no",
-            "Pressure System:": "press_sys",
-            "Cell No.:": "cell_no",
-            "Ring No.:": "ring_no",
-            "Job Location:": "job_loc",
-            "Membrane Thickness (mm):": "mem_thick",
-            "Test Number:": "test_number",
-            "Technician Name:": "tech_name",
-            "Sample Liquid Limit (%):": "liq_lim",
-            "Sample Plastic Limit (%):": "plas_lim",
-            "Average Water Content of Sample Trimmings (%):": "avg_wc_trim",
-            "Additional Notes (info source or occurrence and size of large particles etc.):": "notes",
-            "% by mass of Sample retained on No. 4 sieve (Gravel):": "mass_no4",
-            "% by mass of Sample retained on No. 10 sieve (Coarse Sand):": "mass_no10",
-            "% by mass of Sample retained on No. 40 sieve (Medium Sand):": "mass_no40",
-            "% by mass of Sample retained on No. 200 sieve (Fine Sand):": "mass_no200",
-            "% by mass of Sample Silt (0.074 to 0.005 mm):": "mass_silt",
-            "% by mass of Sample Clay (smaller than 0.005 mm):": "mass_clay",
-            "% by mass of Sample Colloids (smaller than 0.001 mm):": "mass_coll",
-            "Trimming Procedure (turntable/cutting shoe/direct test/ring lined sampler):": "trim_proc",
-            "Moisture Condition (natural moisture/inundated):": "moist_cond",
-            "Axial Stress at Inundation (kPa):": "ax_stress_inund",
-            "Description of Water Used:": "water_desc",
-            "Test Method (A/B):": "test_meth",
-            "Interpretation Procedure for Cv (1/2/Both):": "interp_cv",
-            "All Departures from Outlined ASTM D2435/D2435M-11 Procedure:": "astm_dep",
-            "Specify how the water content was obtained (cuttings/entire specimen):": "wc_obt",
-            "Specify method for specimen saturation (dry method/wet method):": "sat_meth",
-            "Specify method to determine post_consolidation specimen area (A/B/A and B):": "post_consol_area",
-            "Specify failure criterion (max deviator stress/deviator stress at 15% strain/max eff. stress/other:": "fail_crit",
-            "Load carried by filter paper strips (kN/mm):": "load_filt_paper",
-            "Specimen perimeter covered by filter paper (mm):": "filt_paper_cov",
-            "Young's modulus of membrane material (kPa):": "young_mod_mem",
-            "Time of Test": "test_time",
-            "Date of Test": "test_date",
-            "Start of Repeated Data": "start_rep_data",
-            "dry_unit_weight": "dry_unit_weight",
-            "init_void_ratio": "init_void_ratio",
-            "init_sat": "init_sat",
-            "final_moisture": "final_moisture",
-            "Saturacao_c": "Saturacao_c",
-            "v_0": "v_0",
-            "vol_solid": "vol_solid",
-            "v_w_f": "v_w_f",
-            "ax_disp_0": "ax_disp_0",
-            "back_vol_0": "back_vol_0",
-            "back_press_0": "back_press_0",
-            "rad_press_0": "rad_press_0",
-            "pore_press_0": "pore_press_0",
-            "ax_disp_c": "ax_disp_c",
-            "back_vol_c": "back_vol_c",
-            "h_init_c": "h_init_c",
-            "back_vol_f": "back_vol_f",
-            "v_c_A": "v_c_A",
-            "cons_void_vol_A": "cons_void_vol_A",
-            "cons_void_vol_B": "cons_void_vol_B",
-            "v_c_B": "v_c_B",
-            "w_c_A": "w_c_A",
-            "w_c_B": "w_c_B",
-            "void_ratio_c": "void_ratio_c",
-            "void_ratio_f": "void_ratio_f",
-            "void_ratio_m": "void_ratio_m",
-            "vol_change_c": "vol_change_c",
-            "vol_change_f_c": "vol_change_f_c",
-            "final_void_vol": "final_void_vol",
-            "consolidated_area_A": "consolidated_area_A",
-            "consolidated_area_B": "consolidated_area_B",            
-            "camb_p_A0": "camb_p_A0",
-            "camb_p_B0": "camb_p_B0"
-        }
-
-        # 1) Renomear as chaves do dicionário self.metadados conforme 'possible_aliases'
-        for old_key, new_key in list(possible_aliases.items()):
-            if old_key in self.metadados:
-                # Se new_key estiver vazio ou não existir, substitui
-                if new_key not in self.metadados or not self.metadados[new_key]:
-                    self.metadados[new_key] = self.metadados[old_key]
-                del self.metadados[old_key]
-
-        # 2) Exemplo: caso o arquivo .gds ainda use apenas "Cisalhamento"
-        # e a gente queira automaticamente criar '_cis_inicial' e '_cis_final'
-        if "Cisalhamento" in self.metadados:
-            valor_cis = str(self.metadados["Cisalhamento"]).strip()
-            if "-" in valor_cis:
-                ini, fim = valor_cis.split("-")
-            else:
-                ini, fim = valor_cis, valor_cis  # Ex.: se vier "8", então 8-8
-            self.metadados["_cis_inicial"] = ini
-            self.metadados["_cis_final"] = fim
-            del self.metadados["Cisalhamento"]
-
-        # 3) Ordenar metadados conforme 'desired_order'
-        ordered_metadata = []
-        remaining_metadata = []
-
-        for key, value in self.metadados.items():
-            if key in desired_order:
-                ordered_metadata.append((key, value))
-            else:
-                remaining_metadata.append((key, value))
-
-        # Reordena a lista final
-        self.metadata_items = ordered_metadata + remaining_metadata
-
-        # 4) Filtra apenas as colunas que serão salvas em MetadadosArquivo (se desejado)
-        # Exemplo:
-        metadadosarquivo_cols = [
-            "_B", "_ad", "_cis_inicial", "_cis_final",
-            "w_0", "w_f", "h_init", "d_init", "ram_diam", "spec_grav","sequencial",
-            "idcontrato", "idcampanha", "idamostra", "idtipoensaio", "depth",
-            "samp_date", "tipo", "init_mass", "init_dry_mass", "spec_grav_assmeas",
-            # ...
-        ]
-
-        final_dict = {}
-        for col in metadadosarquivo_cols:
-            if col in self.metadados:
-                final_dict[col] = self.metadados[col]
-
-        # Exemplos de cp e repeticao que podem não estar em metadadosarquivo_cols
-        if "cp" in self.metadados:
-            final_dict["cp"] = self.metadados["cp"]
-        if "repeticao" in self.metadados:
-            final_dict["repeticao"] = self.metadados["repeticao"]
-
-        self.metadados = final_dict
+        self.metadados, self.metadata_items = teste2.unify_metadados_keys(self.metadados)
 
 
     def save_metadata(self):
         try:
-            result = TableProcessor.process_table_data(self.db_manager, self.metadados, self.file_path)
+            result = TableProcessor.process_table_data(
+                self.db_manager, self.metadados, self.file_path,
+                df=self.gds_df
+            )
             if result is None:
                 raise ValueError("Falha ao processar os dados do arquivo. Verifique se o arquivo está correto.")
 
             df_to_save = result['df']
             metadados_parte2 = result['metadados_parte2']
 
-            self.db_manager.save_to_database(self.metadados, df_to_save, filename=os.path.basename(self.file_path))
+            self.db_manager.save_to_database(self.metadados, df_to_save,
+                                             filename=os.path.basename(self.file_path),
+                                             registro=self.gds_registro)
 
             # Exibe a messagebox de sucesso
             messagebox.showinfo("Sucesso", "Metadados salvos com sucesso!")
@@ -1209,22 +1123,17 @@ class InterfaceApp:
         except (ValueError, TypeError):
             return default
         
+    @medido("grafico_arquivo")
     def plotar_graficos_arquivo(self, arquivo_selecionado):
 
         try:
-            # 1) Obter dados do arquivo (DataFrame do banco)
-            data = self.db_manager.get_data_for_file(arquivo_selecionado)
-            if data is None:
-                messagebox.showerror("Erro", "Não foi possível obter os dados para plotagem.")
-                return
-
-            # 2) Obter metadados do arquivo
+            # 1) Obter metadados do arquivo
             metadados = self.db_manager.get_metadata_for_file(arquivo_selecionado)
             if not metadados:
                 messagebox.showerror("Erro", "Nenhum metadado encontrado para o arquivo selecionado.")
                 return
 
-            # 3) Ler cisalhamento inicial e final (dinâmico a partir dos metadados)
+            # 2) Ler cisalhamento inicial e final (dinâmico a partir dos metadados)
             try:
                 cis_inicial = int(float(metadados.get("Cisalhamento Inicial", 8)))
                 cis_final   = int(float(metadados.get("Cisalhamento Final", 8)))
@@ -1232,10 +1141,7 @@ class InterfaceApp:
                 messagebox.showerror("Erro", f"Erro ao converter valores de Cisalhamento para inteiro: {ve}")
                 return
 
-            # 4) Converter a lista de dicts em DataFrame e filtrar colunas numéricas
-            import pandas as pd
-            df = pd.DataFrame(data)
-
+            # 3) Colunas usadas nos gráficos
             numeric_columns = [
                 'dev_stress_A', 'dev_stress_B',
                 'eff_camb_A', 'eff_camb_B',
@@ -1248,15 +1154,24 @@ class InterfaceApp:
                 'ax_strain',
                 'stage_no'
             ]
+
+            # 4) Obter do banco só as linhas do cisalhamento (índice de estágios)
+            #    e só as colunas dos gráficos
+            data = self.db_manager.get_dados_estagios(
+                arquivo_selecionado, cis_inicial, cis_final, colunas=numeric_columns
+            )
+            if data is None:
+                messagebox.showerror("Erro", "Não foi possível obter os dados para plotagem.")
+                return
+
+            import pandas as pd
+            df = pd.DataFrame(data)
             for col in numeric_columns:
                 if col in df.columns:
                     df[col] = pd.to_numeric(df[col], errors='coerce')
 
-            # 5) Filtrar dados no intervalo do stage de cisalhamento
-            df_cisalhamento = df[
-                (df['stage_no'] >= cis_inicial) &
-                (df['stage_no'] <= cis_final)
-            ]
+            # 5) Dados no intervalo do stage de cisalhamento (já filtrados na consulta)
+            df_cisalhamento = df
             if df_cisalhamento.empty:
                 messagebox.showinfo(
                     "Informação",
@@ -1264,58 +1179,9 @@ class InterfaceApp:
                 )
                 return
 
-            # 6) Definir os pares de colunas para 12 gráficos
-            plots = [
-                ('dev_stress_A', 'ax_strain'),   # 1
-                ('dev_stress_B', 'ax_strain'),   # 2
-                ('dev_stress_A', 'eff_camb_A'),  # 3
-                ('dev_stress_B', 'eff_camb_B'),  # 4
-                ('du_kpa',       'ax_strain'),   # 5 
-                ('vol_strain_A',   'ax_strain'),
-                ('vol_strain_B',    'ax_strain'),   # 6
-                ('void_ratio_A', 'eff_camb_A'),  # 7
-                ('void_ratio_B', 'eff_camb_B'),  # 8
-                ('nqp_A',        'ax_strain'),   # 9
-                ('nqp_B',        'ax_strain'),   # 10
-                ('m_A',          'ax_strain'),   # 11
-                ('m_B',          'ax_strain'),   # 12
-            ]
-
+            # 6) e 7) Figura com os 13 gráficos (scatter sem linha e sem legenda fixa)
             import mplcursors
-            import matplotlib.pyplot as plt
-
-            num_plots = len(plots)  # 12
-            cols = 3
-            rows = num_plots // cols + int(num_plots % cols > 0)  # => 4 linhas (12 subplots)
-
-            fig, axs = plt.subplots(rows, cols, figsize=(18, 6 * rows))
-            axs = axs.flatten()
-
-            # 7) Plotar (scatter) sem linha e sem legenda fixa
-            artists = []
-            for i, (y_col, x_col) in enumerate(plots):
-                ax = axs[i]
-                sc = ax.scatter(
-                    df_cisalhamento[x_col],
-                    df_cisalhamento[y_col],
-                    s=8,             # Tamanho do ponto
-                    linewidths=0.5,  # Contorno mais fino
-                    edgecolors='blue',
-                    facecolors='none',
-                    label=arquivo_selecionado  # Para exibir no hover
-                )
-                ax.grid(True)
-                ax.set_xlabel(x_col)
-                ax.set_ylabel(y_col)
-                ax.set_title(f"{y_col} x {x_col}")
-
-                artists.append(sc)
-
-            # Remover subplots que sobraram (se houver)
-            for i in range(num_plots, len(axs)):
-                fig.delaxes(axs[i])
-
-            plt.tight_layout()
+            fig, artists = graficos.figura_arquivo(df_cisalhamento, arquivo_selecionado)
 
             # 8) Criar janela Tk com scrollbar
             graph_window = tk.Toplevel(self.root)
@@ -1364,7 +1230,7 @@ class InterfaceApp:
 
             tk.Button(
                 button_frame, text="Configurar Escalas",
-                command=lambda: self.configurar_escalas(fig, axs),
+                command=lambda: self.configurar_escalas(fig, fig.axes),
                 width=20
             ).pack(side="left", padx=5)
 
@@ -1452,6 +1318,7 @@ class InterfaceApp:
             return None
 
     # Funções de Plotagem de Gráficos Unificadas
+    @medido("grafico_amostra")
     def plotar_graficos_amostra(self, amostra_selecionada):
         """
         Plota os 6 gráficos unificados da amostra e, apenas nos gráficos
@@ -1459,6 +1326,7 @@ class InterfaceApp:
         adiciona um ponto‑outlier com as coordenadas:
             X = último eff_camb_{A|B} do estágio de cisalhamento
             Y = último void_ratio_{A|B} do estágio de cisalhamento
+        (lidos de RupturaEnsaio, critério 'ultimo', gravado com o ensaio).
         O ponto é uma bola maior (s=80) preenchida em cor distinta (preto).
         """
         try:
@@ -1473,24 +1341,18 @@ class InterfaceApp:
                 return
 
             # ------------------------------------------------------------
-            # 2) Buscar dados desses arquivos no banco
+            # 2) e 3) Buscar no banco só o estágio de cisalhamento de cada
+            #         arquivo (faixas de id do índice de estágios)
             # ------------------------------------------------------------
-            data = self.db_manager.get_data_for_files(selected_files)
-            if not data:
-                messagebox.showinfo("Informação", "Nenhum dado encontrado.")
-                return
-
             import pandas as pd
-            data_by_file = {}
-            for row in data:
-                arq = row['NomeCompleto']
-                data_by_file.setdefault(arq, []).append(row)
-
-            # ------------------------------------------------------------
-            # 3) Filtro do estágio de cisalhamento para cada arquivo
-            # ------------------------------------------------------------
+            num_cols = [
+                'void_ratio_A','void_ratio_B','eff_camb_A','eff_camb_B',
+                'dev_stress_A','dev_stress_B','nqp_A','nqp_B',
+                'ax_strain','stage_no'
+            ]
             datasets = {}
-            for arq, linhas in data_by_file.items():
+            ultimos = {}   # arquivo -> {lado: linha de RupturaEnsaio}
+            for arq in selected_files:
                 meta = self.db_manager.get_metadata_for_file(arq)
                 try:
                     cis_ini = int(float(meta.get("Cisalhamento Inicial", 8)))
@@ -1498,18 +1360,19 @@ class InterfaceApp:
                 except (ValueError, TypeError):
                     cis_ini, cis_fim = 8, 11
 
-                df = pd.DataFrame(linhas)
+                df = self.db_manager.get_dados_estagios(arq, cis_ini, cis_fim, colunas=num_cols)
+                if df is None:
+                    continue
 
-                num_cols = [
-                    'void_ratio_A','void_ratio_B','eff_camb_A','eff_camb_B',
-                    'dev_stress_A','dev_stress_B','nqp_A','nqp_B',
-                    'ax_strain','stage_no'
-                ]
                 for col in num_cols:
                     if col in df.columns:
                         df[col] = pd.to_numeric(df[col], errors='coerce')
 
-                df_cis = df[(df['stage_no'] >= cis_ini) & (df['stage_no'] <= cis_fim)]
+                rup = self.db_manager.get_rupturas(arq, 'ultimo')
+                if rup is not None:
+                    ultimos[arq] = {row['lado']: row for _, row in rup.iterrows()}
+
+                df_cis = df
                 if df_cis.empty:
                     messagebox.showwarning(
                         "Aviso",
@@ -1525,72 +1388,15 @@ class InterfaceApp:
             # 4) Definições gerais de plotagem
             # ------------------------------------------------------------
             import mplcursors
-            import matplotlib.pyplot as plt
             import random, matplotlib.colors as mcolors
 
             colors = list(mcolors.TABLEAU_COLORS.values())
             cores_arq = {arq: random.choice(colors) for arq in datasets.keys()}
 
-            plots = [
-                ('void_ratio_A', 'eff_camb_A'),
-                ('void_ratio_B', 'eff_camb_B'),
-                ('dev_stress_A', 'eff_camb_A'),
-                ('dev_stress_B', 'eff_camb_B'),
-                ('nqp_A',        'ax_strain'),
-                ('nqp_B',        'ax_strain')
-            ]
-            n = len(plots)                # 6
-            cols, rows = 3, (n + 2) // 3  # 2 linhas
-
-            fig, axs = plt.subplots(rows, cols, figsize=(18, 6 * rows))
-            axs = axs.flatten()
-
-            artists = []
             # ------------------------------------------------------------
-            # 5) Loop pelos sub‑plots e arquivos
+            # 5) Sub‑plots com os arquivos (e o ponto final do cisalhamento)
             # ------------------------------------------------------------
-            for (y_col, x_col), ax in zip(plots, axs):
-                for arq, df_cis in datasets.items():
-                    if df_cis.empty:
-                        continue
-                    cor = cores_arq[arq]
-
-                    # ----- pontos normais (vazados) ---------------------
-                    sc = ax.scatter(
-                        df_cis[x_col], df_cis[y_col],
-                        s=8, edgecolors=cor, facecolors='none',
-                        linewidths=0.5, label=arq
-                    )
-                    artists.append(sc)
-
-                    # ----- OUTLIER apenas nos dois gráficos alvo -------
-                    if (y_col, x_col) in [
-                        ('void_ratio_A', 'eff_camb_A'),
-                        ('void_ratio_B', 'eff_camb_B')
-                    ] and not df_cis.empty:
-
-                        last = df_cis.iloc[-1]
-                        x_out = last[x_col]  # eff_camb_A ou eff_camb_B
-                        y_out = last[y_col]  # void_ratio_A ou void_ratio_B
-
-                        out = ax.scatter(
-                            x_out, y_out,
-                            s=80, marker='o',
-                            facecolors='black', edgecolors='black',
-                            alpha=0.9, label=f"{arq}-out"
-                        )
-                        artists.append(out)
-
-                ax.grid(True)
-                ax.set_xlabel(x_col)
-                ax.set_ylabel(y_col)
-                ax.set_title(f"{y_col} × {x_col}")
-
-            # Remove eixos vazios (se houver)
-            for j in range(len(plots), len(axs)):
-                fig.delaxes(axs[j])
-
-            plt.tight_layout()
+            fig, artists = graficos.figura_amostra(datasets, cores_arq, ultimos)
 
             # ------------------------------------------------------------
             # 6) Embutir no Tkinter (scroll etc.)
@@ -1639,7 +1445,7 @@ class InterfaceApp:
             # ------------------------------------------------------------
             btn_frm = tk.Frame(frm); btn_frm.pack(pady=10)
             tk.Button(btn_frm, text="Configurar Escalas",
-                      command=lambda: self.configurar_escalas(fig, axs),
+                      command=lambda: self.configurar_escalas(fig, fig.axes),
                       width=20).pack(side="left", padx=10)
             tk.Button(btn_frm, text="Filtrar Arquivos",
                       command=lambda: self.filtrar_arquivos(graph_win, amostra_selecionada),
@@ -2079,7 +1885,7 @@ import datetime
 
 # Importações dos módulos de processamento e acesso ao banco
 from teste1 import FileProcessor
-from teste3 import TableProcessor, find_header_line
+from teste3 import TableProcessor
 from testeBD import DatabaseManager
 
 def preparar_metadados_para_edicao(metadados):
@@ -2109,11 +1915,10 @@ from tkinter import messagebox, filedialog
 import traceback
 import pandas as pd
 import datetime
-import tempfile
 
 # Importa os módulos de processamento e acesso ao banco
 from teste1 import FileProcessor
-from teste3 import TableProcessor, find_header_line
+from teste3 import TableProcessor
 from testeBD import DatabaseManager
 
 def preparar_metadados_para_edicao(metadados):
@@ -2143,12 +1948,12 @@ def preparar_metadados_para_edicao(metadados):
 import tkinter as tk
 from tkinter import messagebox, filedialog
 import pandas as pd
-import tempfile
 import datetime
 import traceback
 import re
 from teste1 import FileProcessor
-from teste3 import TableProcessor, find_header_line
+from teste3 import TableProcessor, ler_metadados_gds
+import ciclico
 from testeBD import resource_path  # Supondo que resource_path esteja definido em testeBD ou similar
 
 class TriaxialCiclicoWindow(tk.Frame):
@@ -2159,8 +1964,9 @@ class TriaxialCiclicoWindow(tk.Frame):
       1) Selecionar o primeiro arquivo .gds (mesma lógica do fluxo "Encontrar Arquivos").
       2) Adicionar arquivos subsequentes, ajustando 'stage_no' (concatenação).
       3) Permitir a edição dos metadados do primeiro arquivo.
-      4) Processar os dados – mantendo as colunas _Original conforme lidas e calculando as derivadas
-         via TableProcessor – e salvar tudo no banco como um único ensaio.
+      4) Processar os dados – mantendo as colunas _Original conforme lidas e calculando as derivadas –
+         e salvar tudo no banco como um único ensaio. Os arquivos são lidos em blocos
+         (ciclico.processar_ciclico); só os caminhos e o maior estágio de cada um ficam na memória.
     
     Nota: Todo o fluxo (exceto os gráficos) ocorre na mesma janela principal, e ao finalizar,
           a tela de resultado é exibida com botões para plotar os gráficos individuais.
@@ -2173,8 +1979,8 @@ class TriaxialCiclicoWindow(tk.Frame):
         self.main_app = main_app  # Referência à instância principal (InterfaceApp)
 
         # Estado interno
-        self.df_ciclico = pd.DataFrame()
-        self.df_list = []
+        self.arquivos = []      # caminhos dos .gds, na ordem
+        self.maximos = []       # maior stage_no de cada arquivo (ciclico.ultimo_estagio)
         self.num_files_added = 0
         self.metadados_first = {}  # Dicionário dos metadados do primeiro arquivo
 
@@ -2208,12 +2014,12 @@ class TriaxialCiclicoWindow(tk.Frame):
         if not file_path:
             return  # Usuário cancelou
         try:
-            file_path = fix_gds(file_path)
             directory = resource_path('LUIZ-Teste')
             self.first_file_path = file_path
-            # 1) Ler os metadados (linhas antes de "Stage Number")
+            # 1) Ler só os metadados (a tabela é lida em blocos ao salvar)
             processor = FileProcessor(directory)
-            metadados = processor.process_gds_file(file_path)
+            lido = ler_metadados_gds(file_path, processor.metadados_map)
+            metadados = lido['metadados']
             if not metadados:
                 raise ValueError("Nenhum metadado encontrado. Verifique o formato do arquivo.")
             print("Metadados lidos:", metadados)
@@ -2254,20 +2060,16 @@ class TriaxialCiclicoWindow(tk.Frame):
             self.main_app.metadados = metadados
             self.main_app.unify_metadados_keys()
             self.metadados_first = dict(self.main_app.metadados)
-            # 3) Ler o CSV a partir da linha "Stage Number"
-            header_line = find_header_line(file_path)
-            if header_line is None:
+            # 3) Maior estágio da tabela a partir da linha "Stage Number"
+            if lido['header_line'] is None:
                 raise ValueError("Cabeçalho 'Stage Number' não encontrado no arquivo .gds.")
-            df = pd.read_csv(file_path, encoding='latin-1', skiprows=header_line, on_bad_lines='skip')
-            df.rename(columns=lambda x: x.strip(), inplace=True)
-            if "Stage Number" in df.columns:
-                df.rename(columns={"Stage Number": "stage_no"}, inplace=True)
-            elif "stage_no" not in df.columns:
-                raise ValueError("Coluna 'Stage Number' (ou 'stage_no') não encontrada no CSV.")
-            self.df_ciclico = df.copy()
-            self.df_list = [df.copy()]
+            maximo = ciclico.ultimo_estagio(file_path, on_bad_lines='skip')
+            if maximo is None:
+                raise ValueError("Coluna 'Stage Number' sem dados no arquivo .gds.")
+            self.arquivos = [file_path]
+            self.maximos = [maximo]
             self.num_files_added = 1
-            last_stage = self.df_ciclico['stage_no'].max()
+            _, last_stage = ciclico.deslocamentos_estagios(self.maximos)
             self.label_stage.config(text=f"Último stage: {last_stage}")
             self.btn_add_next.config(state="normal")
             self.btn_save.config(state="normal")
@@ -2284,22 +2086,14 @@ class TriaxialCiclicoWindow(tk.Frame):
         if not file_path:
             return
         try:
-            file_path = fix_gds(file_path)
-            header_line = find_header_line(file_path)
-            if header_line is None:
+            maximo = ciclico.ultimo_estagio(file_path, on_bad_lines='skip')
+            if maximo is None:
                 raise ValueError("Não encontrou 'Stage Number' no arquivo adicional.")
-            df_next = pd.read_csv(file_path, encoding='latin-1', skiprows=header_line, on_bad_lines='skip')
-            df_next.rename(columns=lambda x: x.strip(), inplace=True)
-            if "Stage Number" in df_next.columns:
-                df_next.rename(columns={"Stage Number": "stage_no"}, inplace=True)
-            elif "stage_no" not in df_next.columns:
-                raise ValueError("Coluna 'Stage Number' (ou 'stage_no') não encontrada no arquivo adicional.")
-            last_stage = self.df_ciclico['stage_no'].max()
-            df_next['stage_no'] += last_stage  # Atualiza os stage_no para continuidade
-            self.df_ciclico = pd.concat([self.df_ciclico, df_next], ignore_index=True)
-            self.df_list.append(df_next.copy())
+            # stage_no continua do último estágio (deslocamento aplicado ao salvar)
+            self.arquivos.append(file_path)
+            self.maximos.append(maximo)
             self.num_files_added += 1
-            new_last_stage = self.df_ciclico['stage_no'].max()
+            _, new_last_stage = ciclico.deslocamentos_estagios(self.maximos)
             self.label_stage.config(text=f"Último stage: {new_last_stage}")
             messagebox.showinfo("Sucesso", f"Arquivo #{self.num_files_added} adicionado.\nÚltimo stage agora: {new_last_stage}")
             if self.num_files_added > 1:
@@ -2310,10 +2104,10 @@ class TriaxialCiclicoWindow(tk.Frame):
 
     def on_voltar_file(self):
         if self.num_files_added > 1:
-            self.df_list.pop()
+            self.arquivos.pop()
+            self.maximos.pop()
             self.num_files_added -= 1
-            self.df_ciclico = pd.concat(self.df_list, ignore_index=True)
-            last_stage = self.df_ciclico['stage_no'].max()
+            _, last_stage = ciclico.deslocamentos_estagios(self.maximos)
             self.label_stage.config(text=f"Último stage: {last_stage}")
             messagebox.showinfo("Voltar", "Último arquivo removido.")
             if self.num_files_added == 1:
@@ -2322,7 +2116,7 @@ class TriaxialCiclicoWindow(tk.Frame):
             messagebox.showwarning("Aviso", "Não há arquivos para remover além do primeiro.")
 
     def on_save(self):
-        if self.df_ciclico.empty:
+        if not self.arquivos:
             messagebox.showerror("Erro", "Nenhum dado concatenado para salvar.")
             return
         # Em vez de abrir uma janela pop-up para editar os metadados, navegamos para um novo frame
@@ -2332,39 +2126,17 @@ class TriaxialCiclicoWindow(tk.Frame):
         try:
             # 1) Atualiza os metadados do primeiro arquivo com os valores editados.
             self.metadados_first = dict(updated_metadados)
-            df_concatenado = self.df_ciclico.copy()
-
-            # 2) Renomeia "stage_no" para "Stage Number" para o processamento
-            df_temp = df_concatenado.copy()
-            if "stage_no" in df_temp.columns:
-                df_temp.rename(columns={"stage_no": "Stage Number"}, inplace=True)
-
-            # 3) Garante que as colunas _Original obrigatórias existam
-            for col in ["rad_vol_Original", "back_vol_Original", "cur_area_Original", "vol_change_Original"]:
-                if col not in df_temp.columns:
-                    df_temp[col] = pd.NA
-
-            # 4) Salva o DataFrame temporário em um arquivo CSV para processamento
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".csv", mode="w", newline="", encoding="latin-1")
-            temp_filepath = temp_file.name
-            df_temp.to_csv(temp_filepath, index=False)
-            temp_file.close()
-
-            # 5) Processa os dados chamando o TableProcessor (fluxo estático)
-            result = TableProcessor.process_table_data(self.db_manager, self.metadados_first, temp_filepath)
-            if not result:
-                messagebox.showerror("Erro", "Falha ao processar os dados pelo TableProcessor. Verifique se o arquivo está correto.")
-                return
-            df_final = result["df"]
-            metadados_parte2 = result["metadados_parte2"]
-
-            # 6) Atualiza os metadados com os valores calculados
-            self.metadados_first.update(metadados_parte2.get_all_attributes())
 
-            # 7) Salva o DataFrame final no banco de dados
+            # 2) a 7) Lê os arquivos em blocos (stage_no deslocado, colunas _Original
+            #    ausentes = NaN), calcula e grava no banco como um único ensaio
             ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
             final_filename = f"Ciclico_{ts}.gds"
-            self.db_manager.save_to_database(self.metadados_first, df_final, final_filename)
+            deslocamentos, _ = ciclico.deslocamentos_estagios(self.maximos)
+            result = ciclico.processar_ciclico(
+                self.arquivos, self.metadados_first, final_filename, self.db_manager,
+                deslocamentos=deslocamentos, on_bad_lines='skip'
+            )
+            self.metadados_first = result["metadados"]
 
             # 8) Log: exibe cabeçalhos e as duas primeiras linhas do registro salvo
             cursor = self.db_manager.conn.execute("SELECT * FROM EnsaiosTriaxiais LIMIT 2")
@@ -2378,14 +2150,15 @@ class TriaxialCiclicoWindow(tk.Frame):
             # 9) Cria uma cópia dos metadados atualizados para exibição
             resultados = self.metadados_first.copy()
 
-            messagebox.showinfo("Sucesso", f"Arquivos cíclicos salvos como '{final_filename}'!")
+            messagebox.showinfo("Sucesso", f"Arquivos cíclicos salvos como '{final_filename}'!\n"
+                                           f"{len(result['ciclos'])} ciclo(s) identificado(s).")
 
             # 10) Exibe a tela de resultados iniciais, passando os metadados e o nome do arquivo salvo
             self.show_resultados_iniciais(resultados, final_filename)
 
             # 11) Limpa o estado do fluxo cíclico
-            self.df_ciclico = pd.DataFrame()
-            self.df_list.clear()
+            self.arquivos = []
+            self.maximos = []
             self.num_files_added = 0
             self.metadados_first.clear()
             # Desabilita os botões se ainda existirem (usando winfo_exists para evitar erros caso tenham sido destruídos)
@@ -2508,6 +2281,8 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # necessário para o pool da ingestão no executável
     print("ABRIU APLICAÇÃO")
     from testeBD import DatabaseManager
     from interface import InterfaceApp  # Certifique-se de que InterfaceApp está definido corretamente
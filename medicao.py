@@ -0,0 +1,300 @@
+# medicao.py
+# Medição de tempo das etapas do processamento (leitura do .gds,
+# mapeamento do cabeçalho, cálculos, gravação no banco, planilha Excel e
+# gráficos), para ver qual etapa piorou depois de uma atualização.
+#
+# Cada etapa é um "span" (bloco with ou função decorada). Ao terminar, uma
+# linha JSON vai para o log rotativo (medicao.jsonl, 5 arquivos de 5 MB):
+#   {"ts", "span", "pai", "pid", "duracao_s", "linhas", "linhas_por_s",
+#    "pico_memoria_mb", ...atributos}
+# "pai" é o span que contém este (no mesmo processo). "pico_memoria_mb"
+# é o pico de memória alocada pelo Python/numpy durante o span (só com a
+# medição de memória ligada, que usa tracemalloc e deixa tudo mais lento).
+#
+# Configuração por variáveis de ambiente (ou configurar()):
+#   VALE_MEDICAO=0            desliga o log;
+#   VALE_MEDICAO_ARQUIVO=...  caminho do log (padrão: medicao.jsonl);
+#   VALE_MEDICAO_MEMORIA=1    mede o pico de memória de cada span;
+#   VALE_PERFIL=<span>        roda o primeiro span com esse nome sob o
+#                             cProfile e grava perfil_<span>_<pid>.prof
+#                             e .txt (20 funções por tempo acumulado);
+#   VALE_DEPURACAO=1          liga as mensagens de depuração (dump do
+#                             METADADOS_PARTE2, primeiras linhas lidas).
+#
+# Com vários processos (pools do ingestao.py, monitorGDS.py e recalculo.py)
+# só o processo principal escreve no log (o logging não sabe rotacionar um
+# arquivo usado por vários processos): os filhos mandam os registros por
+# uma fila (ColetorProcessos, passado ao pool como initializer). Num
+# processo filho sem coletor os registros são descartados.
+
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+import logging
+import functools
+import threading
+import tracemalloc
+import multiprocessing
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+ARQUIVO_PADRAO = "medicao.jsonl"
+TAMANHO_MAXIMO_LOG = 5 * 1024 * 1024
+ARQUIVOS_LOG = 5
+
+_config = None
+_logger = None
+_pid_logger = None
+_local = threading.local()
+_perfil_feito = set()
+
+
+def _ligado(nome, padrao):
+    valor = os.environ.get(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() not in ("0", "", "false", "nao", "não", "off")
+
+
+def configurar(ativo=None, arquivo=None, memoria=None, perfil=None, depuracao=None):
+    """
+    Ajusta a medição deste processo (o que não for informado vem das
+    variáveis de ambiente). Retorna a configuração em vigor.
+    """
+    global _config, _logger, _pid_logger
+    config = {
+        'ativo': _ligado("VALE_MEDICAO", True),
+        'arquivo': os.environ.get("VALE_MEDICAO_ARQUIVO", ARQUIVO_PADRAO),
+        'memoria': _ligado("VALE_MEDICAO_MEMORIA", False),
+        'perfil': os.environ.get("VALE_PERFIL") or None,
+        'depuracao': _ligado("VALE_DEPURACAO", False),
+    }
+    for chave, valor in (('ativo', ativo), ('arquivo', arquivo), ('memoria', memoria),
+                         ('perfil', perfil), ('depuracao', depuracao)):
+        if valor is not None:
+            config[chave] = valor
+
+    if _logger is not None:
+        for handler in list(_logger.handlers):
+            _logger.removeHandler(handler)
+            handler.close()
+        _logger = None
+        _pid_logger = None
+    if config['memoria'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _config = config
+    return config
+
+
+def _configuracao():
+    return _config if _config is not None else configurar()
+
+
+def depuracao():
+    """True se as mensagens de depuração estiverem ligadas (VALE_DEPURACAO)."""
+    return _configuracao()['depuracao']
+
+
+def _trocar_handler(handler):
+    """Põe 'handler' como o único do logger de medição deste processo."""
+    global _logger, _pid_logger
+    _logger = logging.getLogger("vale.medicao")
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+    for antigo in list(_logger.handlers):
+        _logger.removeHandler(antigo)
+        if _pid_logger == os.getpid():
+            antigo.close()  # o herdado por fork é do pai: não fechar
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    _pid_logger = os.getpid()
+    return _logger
+
+
+def _abrir_logger():
+    if multiprocessing.parent_process() is not None:
+        # Processo filho sem ColetorProcessos: não escreve no log do pai
+        return _trocar_handler(logging.NullHandler())
+    try:
+        # Sem delay: o arquivo é aberto aqui, e a falha (pasta sem
+        # permissão de escrita) cai no NullHandler em vez de gerar um
+        # traceback do logging a cada span
+        handler = RotatingFileHandler(_configuracao()['arquivo'], maxBytes=TAMANHO_MAXIMO_LOG,
+                                      backupCount=ARQUIVOS_LOG, encoding="utf-8")
+    except OSError as e:
+        print(f"Não foi possível abrir o log de medição: {e}")
+        handler = logging.NullHandler()
+    return _trocar_handler(handler)
+
+
+def _registrar(registro):
+    if _logger is None or _pid_logger != os.getpid():
+        # Ainda não aberto, ou herdado do pai num processo criado por fork
+        _abrir_logger()
+    _logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+def _inicializar_processo(fila):
+    """initializer dos processos do pool: os registros vão para 'fila'."""
+    _configuracao()  # antes: configurar() descarta o handler em uso
+    _trocar_handler(QueueHandler(fila))
+
+
+class ColetorProcessos:
+    """
+    Leva ao log deste processo os registros dos processos de um pool:
+        with ColetorProcessos() as coletor:
+            with ProcessPoolExecutor(..., **coletor.pool_kwargs) as pool: ...
+    """
+
+    def __enter__(self):
+        if _logger is None or _pid_logger != os.getpid():
+            _abrir_logger()
+        self.fila = multiprocessing.Queue()
+        self._ouvinte = QueueListener(self.fila, *_logger.handlers)
+        self._ouvinte.start()
+        self.pool_kwargs = {'initializer': _inicializar_processo, 'initargs': (self.fila,)}
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        self._ouvinte.stop()  # grava o que ainda estiver na fila
+        self.fila.close()
+        self.fila.join_thread()
+        return False
+
+
+def _pilha():
+    if not hasattr(_local, 'pilha'):
+        _local.pilha = []
+    return _local.pilha
+
+
+class Span:
+    """
+    Bloco medido: 'with span("kernel", arquivo=...) as s: ...; s.linhas = n'.
+    Atributos extras vão para o registro (devem ser serializáveis em JSON).
+    """
+
+    def __init__(self, nome, linhas=None, **atributos):
+        self.nome = nome
+        self.linhas = linhas
+        self.atributos = atributos
+        self.duracao = None
+        self.pico_memoria = None
+
+    def __enter__(self):
+        config = _configuracao()
+        self._ativo = config['ativo'] or config['perfil'] == self.nome
+        if not self._ativo:
+            return self
+
+        pilha = _pilha()
+        self._pai = pilha[-1].nome if pilha else None
+        pilha.append(self)
+
+        self._memoria = tracemalloc.is_tracing()
+        if self._memoria:
+            # O pico é zerado a cada span; o do span de fora é recomposto na saída
+            self._pico_anterior = tracemalloc.get_traced_memory()[1]
+            self._pico_filhos = 0
+            tracemalloc.reset_peak()
+
+        self._perfil = None
+        if config['perfil'] == self.nome and self.nome not in _perfil_feito:
+            _perfil_feito.add(self.nome)
+            self._perfil = cProfile.Profile()
+            self._perfil.enable()
+
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        if not self._ativo:
+            return False
+        self.duracao = time.perf_counter() - self._inicio
+
+        if self._perfil is not None:
+            self._perfil.disable()
+            self._gravar_perfil()
+
+        pilha = _pilha()
+        if pilha and pilha[-1] is self:
+            pilha.pop()
+        if self._memoria:
+            pico = max(tracemalloc.get_traced_memory()[1], self._pico_filhos)
+            self.pico_memoria = pico / (1024 * 1024)
+            if pilha and getattr(pilha[-1], '_memoria', False):
+                # O span de fora fica com o pico deste e com o que já tinha antes
+                pilha[-1]._pico_filhos = max(pilha[-1]._pico_filhos, pico, self._pico_anterior)
+
+        if _configuracao()['ativo']:
+            registro = {
+                'ts': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'span': self.nome,
+                'pai': self._pai,
+                'pid': os.getpid(),
+                'duracao_s': round(self.duracao, 6),
+                'linhas': self.linhas,
+                'linhas_por_s': (round(self.linhas / self.duracao, 1)
+                                 if self.linhas and self.duracao > 0 else None),
+                'pico_memoria_mb': (round(self.pico_memoria, 3)
+                                    if self.pico_memoria is not None else None),
+            }
+            if tipo is not None:
+                registro['erro'] = f"{tipo.__name__}: {valor}"
+            registro.update(self.atributos)
+            try:
+                _registrar(registro)
+            except Exception as e:
+                print(f"Erro ao gravar o log de medição: {e}")
+        return False
+
+    def _gravar_perfil(self):
+        base = os.path.join(os.path.dirname(os.path.abspath(_configuracao()['arquivo'])),
+                            f"perfil_{self.nome}_{os.getpid()}")
+        try:
+            self._perfil.dump_stats(base + ".prof")
+            texto = io.StringIO()
+            pstats.Stats(self._perfil, stream=texto).sort_stats("cumulative").print_stats(20)
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(texto.getvalue())
+            print(f"Perfil do span '{self.nome}' gravado em {base}.prof")
+        except Exception as e:
+            print(f"Erro ao gravar o perfil do span '{self.nome}': {e}")
+
+
+def span(nome, linhas=None, **atributos):
+    """Span (context manager) com o nome da etapa; ver Span."""
+    return Span(nome, linhas, **atributos)
+
+
+def medido(nome, linhas=None):
+    """
+    Decorador: mede cada chamada da função como o span 'nome'.
+    'linhas' (opcional) é uma função que recebe o retorno e dá o nº de
+    linhas processadas (erros nessa contagem são ignorados).
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with Span(nome) as s:
+                resultado = funcao(*args, **kwargs)
+                if linhas is not None:
+                    try:
+                        s.linhas = linhas(resultado)
+                    except Exception:
+                        s.linhas = None
+                return resultado
+        return medida
+    return decorador
+
+
+def ler_log(arquivo=None):
+    """Registros do log de medição (só o arquivo atual) como lista de dicts."""
+    arquivo = arquivo or _configuracao()['arquivo']
+    if not os.path.exists(arquivo):
+        return []
+    with open(arquivo, encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
@@ -0,0 +1,204 @@
+# monitorGDS.py
+# Serviço que vigia a pasta de exportação (LUIZ-Teste) e ingere sozinho os
+# .gds novos, sem precisar abrir "Encontrar Arquivos" na interface.
+#
+# - Varredura barata com os.scandir a cada 'intervalo' segundos: só os
+#   arquivos cujo (tamanho, mtime) mudou são considerados.
+# - Debounce: um arquivo só entra na fila depois de ficar 'estabilidade'
+#   segundos sem mudar (o equipamento ainda pode estar gravando).
+# - A fila é a tabela FilaIngestao (persiste entre execuções); o cálculo
+#   roda num pool de processos (ingestao.processar_arquivo) e a gravação
+#   fica neste processo (um único escritor).
+# - Arquivos já salvos e modificados depois são só avisados; ensaios em
+#   modo tail (acompanhamento.py) são ignorados.
+#
+# PARA RODAR, DIGITAR PELO PROMPT (ou agendar no início da sessão do Windows):
+# python monitorGDS.py                      (usa a pasta LUIZ-Teste)
+# python monitorGDS.py C:\caminho\da\pasta --intervalo 5 --estabilidade 30 --workers 2
+
+import os
+import sys
+import time
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from testeBD import DatabaseManager, resource_path
+from ingestao import processar_arquivo, gravar_resultado
+from medicao import ColetorProcessos
+
+
+class MonitorPasta:
+    """
+    Vigia 'directory' e mantém a FilaIngestao em dia. Cada chamada de
+    passo() faz uma varredura, enfileira os arquivos estáveis, despacha
+    os pendentes para o pool e grava os que terminaram.
+    """
+    def __init__(self, directory, db_manager=None, estabilidade=10.0, workers=None):
+        self.directory = directory
+        self.db = db_manager or DatabaseManager()
+        self.estabilidade = estabilidade
+        self.workers = workers or os.cpu_count() or 1
+
+        self._vistos = {}      # nome -> ((tamanho, mtime_ns), instante em que foi visto assim)
+        self._tratados = {}    # nome -> (tamanho, mtime_ns) já enfileirado/avisado
+        self._em_execucao = {} # futuro -> nome
+        self._primeira = True  # na 1ª varredura, só o mtime diz desde quando o arquivo está parado
+
+    def varrer(self):
+        """{nome: (tamanho, mtime_ns)} dos .gds da pasta."""
+        assinaturas = {}
+        with os.scandir(self.directory) as it:
+            for e in it:
+                if e.name.endswith('.gds') and e.is_file():
+                    st = e.stat()
+                    assinaturas[e.name] = (st.st_size, st.st_mtime_ns)
+        return assinaturas
+
+    def verificar(self, agora=None):
+        """
+        Varre a pasta e enfileira os arquivos novos que já estão estáveis.
+        Retorna a lista de nomes enfileirados.
+        """
+        agora = time.time() if agora is None else agora
+        atual = self.varrer()
+
+        for nome in list(self._vistos):
+            if nome not in atual:
+                del self._vistos[nome]
+                self._tratados.pop(nome, None)
+        for nome, assinatura in atual.items():
+            if nome not in self._vistos or self._vistos[nome][0] != assinatura:
+                self._vistos[nome] = (assinatura, 0.0 if self._primeira else agora)
+        self._primeira = False
+
+        # Estável: sem mudança há 'estabilidade' segundos, pelas varreduras e
+        # pelo mtime (o relógio do compartilhamento pode estar adiantado)
+        estaveis = [
+            nome for nome, (assinatura, desde) in self._vistos.items()
+            if self._tratados.get(nome) != assinatura
+            and agora - max(desde, assinatura[1] / 1e9) >= self.estabilidade
+        ]
+        if not estaveis:
+            return []
+
+        varredura = self.db.escanear_diretorio(self.directory)
+        novos = set(varredura['novos'])
+        alterados = set(varredura['alterados'])
+
+        enfileirados = []
+        for nome in estaveis:
+            tamanho, mtime_ns = self._vistos[nome][0]
+            if nome in novos:
+                caminho = os.path.abspath(os.path.join(self.directory, nome))
+                if self.db.enfileirar_arquivo(nome, caminho, tamanho, mtime_ns, commit=False):
+                    enfileirados.append(nome)
+            elif nome in alterados:
+                print(f"[AVISO] {nome} foi modificado depois de salvo no banco de dados.")
+            self._tratados[nome] = (tamanho, mtime_ns)
+        self.db.conn.commit()
+        return enfileirados
+
+    def despachar(self, pool):
+        """Envia ao pool os pendentes da fila (janela de 2 x workers)."""
+        vagas = 2 * self.workers - len(self._em_execucao)
+        if vagas <= 0:
+            return
+        itens = self.db.proximos_da_fila(vagas)
+        if not itens:
+            return
+        metadados_map = self.db.get_metadados_map()
+        fixed_metadados = self.db.get_fixed_metadados(None)
+        for filename, caminho in itens:
+            self.db.marcar_fila(filename, 'processando', commit=False)
+            futuro = pool.submit(processar_arquivo, caminho, metadados_map, fixed_metadados)
+            self._em_execucao[futuro] = filename
+        self.db.conn.commit()
+
+    def coletar(self):
+        """Grava no banco os arquivos já processados. Retorna os itens do relatório."""
+        relatorio = []
+        for futuro in [f for f in self._em_execucao if f.done()]:
+            filename = self._em_execucao.pop(futuro)
+            try:
+                item = gravar_resultado(self.db, futuro.result())
+            except Exception as e:
+                traceback.print_exc()
+                item = {'arquivo': filename, 'status': 'ERRO', 'mensagem': str(e), 'linhas': 0}
+            self.db.marcar_fila(filename, 'ok' if item['status'] == 'OK' else 'erro',
+                                item['mensagem'] or None)
+            relatorio.append(item)
+        return relatorio
+
+    @staticmethod
+    def _imprimir(relatorio):
+        for item in relatorio:
+            if item['status'] == 'OK':
+                print(f"[OK]   {item['arquivo']} ({item['linhas']} linhas)")
+            else:
+                print(f"[ERRO] {item['arquivo']}: {item['mensagem']}")
+
+    def passo(self, pool):
+        """Uma passagem: varredura, fila, despacho e gravação."""
+        for nome in self.verificar():
+            print(f"[FILA] {nome}")
+        self.despachar(pool)
+        relatorio = self.coletar()
+        self._imprimir(relatorio)
+        return relatorio
+
+    def executar(self, intervalo=5.0, ciclos=None):
+        """
+        Laço principal (até Ctrl+C, ou 'ciclos' passagens). Itens deixados
+        'processando' por uma execução interrompida voltam para a fila.
+        """
+        retomados = self.db.retomar_fila()
+        if retomados:
+            print(f"{retomados} arquivo(s) retomado(s) da fila.")
+
+        feitos = 0
+        with ColetorProcessos() as coletor, \
+                ProcessPoolExecutor(max_workers=self.workers, **coletor.pool_kwargs) as pool:
+            try:
+                while ciclos is None or feitos < ciclos:
+                    self.passo(pool)
+                    feitos += 1
+                    time.sleep(intervalo)
+            finally:
+                # Grava o que já foi despachado antes de sair
+                while self._em_execucao:
+                    time.sleep(0.2)
+                    self._imprimir(self.coletar())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Vigia a pasta de .gds e ingere automaticamente os arquivos novos."
+    )
+    parser.add_argument('directory', nargs='?', default=resource_path('LUIZ-Teste'),
+                        help="Pasta com os arquivos .gds (padrão: LUIZ-Teste).")
+    parser.add_argument('--intervalo', type=float, default=5.0,
+                        help="Segundos entre as varreduras (padrão: 5).")
+    parser.add_argument('--estabilidade', type=float, default=10.0,
+                        help="Segundos sem mudança para considerar o arquivo completo (padrão: 10).")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Número de processos (padrão: nº de núcleos).")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"O diretório {args.directory} não existe.")
+        return 1
+
+    monitor = MonitorPasta(args.directory, estabilidade=args.estabilidade, workers=args.workers)
+    print(f"Monitorando {args.directory} (Ctrl+C para sair)...")
+    try:
+        monitor.executar(args.intervalo)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
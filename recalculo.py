@@ -0,0 +1,285 @@
+# recalculo.py
+# Recálculo em lote das colunas calculadas de ensaios já gravados no banco
+# (ex.: depois de uma correção de fórmula no teste3.py), sem reler os .gds.
+#
+# - Cada ensaio é recalculado a partir das colunas "_Original" de
+#   EnsaiosTriaxiais e da linha de MetadadosArquivo, num pool de processos.
+#   Os corpos de prova de uma amostra vão juntos para o mesmo processo e
+#   são calculados num único lote (teste3.calcular_amostra).
+# - A gravação fica neste processo (um único escritor): as colunas
+#   calculadas, os campos do METADADOS_PARTE2 e os pontos de ruptura
+#   (RupturaEnsaio) de cada ensaio são regravados numa única transação
+#   (UPDATE em lote, executemany).
+# - O progresso fica na tabela RecalculoEnsaios: uma execução interrompida
+#   continua de onde parou; --reiniciar recalcula a seleção inteira.
+#
+# Obs.: na gravação os NaN viram 0. Linhas com todos os "_Original" iguais
+# a 0 (linhas do .gds sem leituras, ex.: rodapé) voltam a NaN antes do
+# recálculo, como estavam na ingestão; os demais valores são os gravados.
+#
+# PARA RODAR, DIGITAR PELO PROMPT:
+# python recalculo.py                                   (todos os ensaios)
+# python recalculo.py --contrato 123 --amostra 01 --tipo TIPO --workers 4
+# python recalculo.py --reiniciar                       (ignora o progresso anterior)
+
+import os
+import sys
+import sqlite3
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+from testeBD import DatabaseManager, sql_linhas_ensaios, aplicar_perfil_sqlite
+from teste3 import (
+    calcular_amostra, inicios_grupos, GDS_COLUNAS_ORIGINAIS, GDS_COLUNAS_CALCULADAS,
+)
+from medicao import ColetorProcessos
+
+
+###############################################################################
+# Trabalho de cada processo (leitura + cálculos, sem escrita no banco)
+###############################################################################
+def _ler_ensaios(db_path, idnomes):
+    """
+    Lê (conexão própria, só leitura) as colunas "_Original" e os metadados
+    de 'idnomes' com uma consulta para cada tabela. As linhas fictícias
+    (sem time_test_start) ficam de fora.
+
+    Returns:
+        list: [(idnome, ids das linhas, DataFrame, metadados), ...] na
+        ordem de 'idnomes'.
+    """
+    conn = sqlite3.connect(db_path)
+    aplicar_perfil_sqlite(conn, leitura=True)
+    try:
+        tabela = pd.read_sql_query(
+            sql_linhas_ensaios(len(idnomes), ['id'] + GDS_COLUNAS_ORIGINAIS),
+            conn, params=list(idnomes)
+        )
+        c = conn.execute(
+            f"SELECT * FROM MetadadosArquivo WHERE idnome IN ({', '.join(['?'] * len(idnomes))})",
+            list(idnomes)
+        )
+        colunas = [d[0] for d in c.description]
+        metadados = {row[colunas.index('idnome')]: dict(zip(colunas, row)) for row in c.fetchall()}
+    finally:
+        conn.close()
+
+    medidas = [col for col in GDS_COLUNAS_ORIGINAIS if col.endswith('_Original')]
+    sem_leitura = (tabela[medidas] == 0).all(axis=1)
+    tabela.loc[sem_leitura, medidas] = np.nan
+
+    inicios = inicios_grupos(tabela['idnome'])
+    fins = np.append(inicios[1:], len(tabela))
+    trechos = {int(tabela['idnome'].iat[i]): (i, f) for i, f in zip(inicios, fins)}
+
+    ensaios = []
+    for idnome in idnomes:
+        if idnome not in trechos:
+            raise ValueError(f"Ensaio {idnome} sem linhas em EnsaiosTriaxiais.")
+        if idnome not in metadados:
+            raise ValueError(f"Ensaio {idnome} sem linha em MetadadosArquivo.")
+        ini, fim = trechos[idnome]
+        trecho = tabela.iloc[ini:fim]
+        ensaios.append((idnome, trecho['id'].to_numpy(),
+                        trecho[GDS_COLUNAS_ORIGINAIS].reset_index(drop=True),
+                        metadados[idnome]))
+    return ensaios
+
+
+def recalcular_amostra(db_path, idnomes):
+    """
+    Executado nos processos do pool: refaz os cálculos dos ensaios
+    'idnomes' (os corpos de prova de uma amostra) num único lote
+    (teste3.calcular_amostra). Se o lote falhar, cada ensaio é refeito
+    sozinho, e só o que tem problema fica com erro.
+    Não grava nada; quem grava é o processo principal (gravar_recalculo).
+
+    Returns:
+        list[dict]: um resultado por ensaio, na ordem de 'idnomes'.
+    """
+    try:
+        ensaios = _ler_ensaios(db_path, idnomes)
+        lote = calcular_amostra([e[2] for e in ensaios], [e[3] for e in ensaios])
+    except Exception as e:
+        if len(idnomes) > 1:
+            return [recalcular_ensaio(db_path, idnome) for idnome in idnomes]
+        traceback.print_exc()
+        return [{'idnome': idnomes[0], 'ok': False, 'erro': str(e),
+                 'ids': None, 'df': None, 'metadados': None}]
+
+    fins = np.append(lote['inicios'][1:], len(lote['df']))
+    resultados = []
+    for (idnome, ids, _, _), ini, fim, metadados_parte2 in zip(
+            ensaios, lote['inicios'], fins, lote['metadados_parte2']):
+        resultados.append({
+            'idnome': idnome, 'ok': True, 'erro': None, 'ids': ids,
+            'df': lote['df'].iloc[ini:fim][GDS_COLUNAS_CALCULADAS],
+            'metadados': metadados_parte2.exportar_metadados_arquivo()
+        })
+    return resultados
+
+
+def recalcular_ensaio(db_path, idnome):
+    """recalcular_amostra de um único ensaio; retorna o seu resultado."""
+    return recalcular_amostra(db_path, [idnome])[0]
+
+
+###############################################################################
+# Funções públicas
+###############################################################################
+def gravar_recalculo(db, resultado):
+    """
+    Regrava no banco o resultado de recalcular_ensaio (linhas, metadados
+    e status 'ok' numa única transação). Retorna o item do relatório
+    ({'idnome', 'status', 'mensagem', 'linhas'}).
+    """
+    idnome = resultado['idnome']
+    item = {'idnome': idnome, 'status': 'ERRO', 'mensagem': resultado['erro'], 'linhas': 0}
+    if resultado['ok']:
+        cursor = db.conn.cursor()
+        try:
+            linhas = db.regravar_colunas_calculadas(cursor, resultado['ids'], resultado['df'])
+            db.atualizar_campos_metadados(cursor, idnome, resultado['metadados'])
+            db.salvar_ruptura(cursor, idnome)
+            db.marcar_recalculo(idnome, 'ok', commit=False)
+            db.conn.commit()
+            item.update(status='OK', mensagem='', linhas=linhas)
+        except Exception as e:
+            db.conn.rollback()
+            traceback.print_exc()
+            item['mensagem'] = f"Falha ao gravar no banco de dados: {e}"
+    if item['status'] != 'OK':
+        db.marcar_recalculo(idnome, 'erro', item['mensagem'])
+    return item
+
+
+def recalcular_ensaios(idcontrato=None, idamostra=None, tipo_ensaio=None,
+                       reiniciar=False, workers=None, db_manager=None, progresso=None):
+    """
+    Recalcula em paralelo, um lote por amostra, os ensaios selecionados
+    (ver DatabaseManager.selecionar_ensaios) ainda pendentes em
+    RecalculoEnsaios.
+
+    Args:
+        idcontrato, idamostra, tipo_ensaio: filtros da seleção (opcionais).
+        reiniciar: recalcula toda a seleção, mesmo os já feitos.
+        workers: nº de processos (padrão: os.cpu_count()).
+        db_manager: DatabaseManager já aberto (padrão: o singleton).
+        progresso: callback opcional progresso(feitos, total, item_relatorio).
+
+    Returns:
+        list[dict]: relatório com 'idnome', 'status' ('OK'/'ERRO'),
+        'mensagem' e 'linhas' para cada ensaio.
+    """
+    db = db_manager or DatabaseManager()
+    retomados = db.retomar_recalculo()
+    if retomados:
+        print(f"{retomados} ensaio(s) retomado(s) de um recálculo interrompido.")
+
+    # Ensaios ainda acompanhados em modo tail são recalculados pelo acompanhamento.py
+    em_tail = set(db.listar_acompanhamentos('ativo'))
+    selecao = [row for row in db.selecionar_ensaios(idcontrato, idamostra, tipo_ensaio)
+               if row[1] not in em_tail]
+    db.enfileirar_recalculo([row[0] for row in selecao], reiniciar=reiniciar)
+    pendentes_ids = set(db.pendentes_recalculo([row[0] for row in selecao]))
+
+    # Um lote por amostra (idcontrato, idcampanha, idamostra)
+    amostras = {}
+    for idnome, _, *amostra in selecao:
+        if idnome in pendentes_ids:
+            amostras.setdefault(tuple(amostra), []).append(idnome)
+    if not amostras:
+        return []
+
+    db_path = db.conn.execute("PRAGMA database_list").fetchone()[2]
+    workers = workers or os.cpu_count() or 1
+
+    relatorio = []
+    total = len(pendentes_ids)
+    fila = iter(amostras.values())
+
+    def gravar(resultado):
+        item = gravar_recalculo(db, resultado)
+        relatorio.append(item)
+        if progresso:
+            progresso(len(relatorio), total, item)
+
+    with ColetorProcessos() as coletor, \
+            ProcessPoolExecutor(max_workers=workers, **coletor.pool_kwargs) as pool:
+        # Janela limitada de tarefas em andamento (como em ingestao.py)
+        pendentes = set()
+
+        def submeter():
+            for idnomes in fila:
+                for idnome in idnomes:
+                    db.marcar_recalculo(idnome, 'processando', commit=False)
+                db.conn.commit()
+                pendentes.add(pool.submit(recalcular_amostra, db_path, idnomes))
+                if len(pendentes) >= 2 * workers:
+                    break
+
+        submeter()
+        while pendentes:
+            feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                for resultado in futuro.result():
+                    gravar(resultado)
+            submeter()
+
+    db.otimizar_se_preciso()
+    return relatorio
+
+
+def formatar_relatorio(relatorio):
+    """Texto do relatório (uma linha por ensaio + resumo)."""
+    linhas = []
+    for item in relatorio:
+        if item['status'] == 'OK':
+            linhas.append(f"[OK]   idnome {item['idnome']} ({item['linhas']} linhas)")
+        else:
+            linhas.append(f"[ERRO] idnome {item['idnome']}: {item['mensagem']}")
+    ok = sum(1 for item in relatorio if item['status'] == 'OK')
+    linhas.append(f"Total: {len(relatorio)} | OK: {ok} | ERRO: {len(relatorio) - ok}")
+    return "\n".join(linhas)
+
+
+def _imprimir_progresso(feitos, total, item):
+    if item['status'] == 'OK':
+        print(f"[{feitos}/{total}] idnome {item['idnome']}: OK ({item['linhas']} linhas)")
+    else:
+        print(f"[{feitos}/{total}] idnome {item['idnome']}: ERRO - {item['mensagem']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Recalcula as colunas calculadas dos ensaios já gravados no banco."
+    )
+    parser.add_argument('--contrato', default=None, help="Só os ensaios deste idcontrato.")
+    parser.add_argument('--amostra', default=None, help="Só os ensaios desta idamostra.")
+    parser.add_argument('--tipo', default=None,
+                        help="Só os ensaios deste tipo (TipoEnsaio.tipo ou idtipoensaio).")
+    parser.add_argument('--reiniciar', action='store_true',
+                        help="Recalcula toda a seleção, ignorando o progresso anterior.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Número de processos (padrão: nº de núcleos).")
+    args = parser.parse_args(argv)
+
+    relatorio = recalcular_ensaios(args.contrato, args.amostra, args.tipo,
+                                   reiniciar=args.reiniciar, workers=args.workers,
+                                   progresso=_imprimir_progresso)
+    if not relatorio:
+        print("Nenhum ensaio pendente de recálculo na seleção.")
+        return 0
+
+    print(formatar_relatorio(relatorio))
+    return 0 if all(item['status'] == 'OK' for item in relatorio) else 2
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# ruptura.py
+# Ponto de ruptura de cada ensaio (lados A e B), pelos critérios do campo
+# fail_crit dos metadados:
+#   - q_max:     máxima tensão desviadora;
+#   - q_15:      tensão desviadora a 15% de deformação axial (ou o último
+#                ponto, se o ensaio não chegou a 15%);
+#   - razao_max: máxima razão de tensões efetivas (σ'1/σ'3, o mesmo ponto
+#                do máximo de q/p' = nqp).
+# Também vai para a tabela o último ponto do cisalhamento ('ultimo').
+#
+# O cálculo é vetorizado e aceita uma tabela empilhada de vários ensaios
+# (ver teste3.calcular_amostra / inicios_grupos): os índices de cada
+# critério saem de reduções por trecho (reduceat), sem laço por ensaio.
+# O resultado é gravado em RupturaEnsaio (testeBD.salvar_ruptura) junto
+# com o ensaio, e as telas e relatórios da amostra o leem de lá.
+
+import numpy as np
+import pandas as pd
+
+CRITERIOS = ("q_max", "q_15", "razao_max", "ultimo")
+CRITERIO_PADRAO = "q_max"
+
+# Deformação axial (fração) do critério q_15
+DEFORMACAO_CRITERIO_15 = 0.15
+
+# Colunas de EnsaiosTriaxiais usadas (além de stage_no)
+COLUNAS_RUPTURA = (
+    "ax_strain", "pore_press_Original", "du_kpa", "eff_rad_stress",
+    "dev_stress_A", "dev_stress_B", "eff_camb_A", "eff_camb_B",
+    "void_ratio_A", "void_ratio_B", "nqp_A", "nqp_B",
+    "eff_ax_stress_A", "eff_ax_stress_B",
+)
+
+
+def criterio_ruptura(fail_crit):
+    """
+    Critério (chave de CRITERIOS) do texto livre de fail_crit ("max deviator
+    stress", "deviator stress at 15% strain", "max eff. stress", ...).
+    Vazio ou não reconhecido: CRITERIO_PADRAO.
+    """
+    texto = str(fail_crit or "").strip().lower()
+    if "15" in texto:
+        return "q_15"
+    if any(p in texto for p in ("eff", "efet", "ratio", "razão", "razao")):
+        return "razao_max"
+    return CRITERIO_PADRAO
+
+
+def _trechos(n, inicios):
+    inicios = np.asarray(inicios if inicios is not None else [0], dtype=np.int64)
+    fins = np.append(inicios[1:], n)
+    return inicios, fins, np.repeat(np.arange(len(inicios)), fins - inicios)
+
+
+def _primeiro_maximo(valores, inicios, trecho):
+    """Posição do primeiro máximo de cada trecho (NaN ignorados)."""
+    v = np.where(np.isnan(valores), -np.inf, valores)
+    maximos = np.maximum.reduceat(v, inicios)
+    acertos = np.flatnonzero(v == maximos[trecho])
+    _, primeiros = np.unique(trecho[acertos], return_index=True)
+    return acertos[primeiros]
+
+
+def _primeiro_acima(valores, limite, inicios, fins, trecho):
+    """Posição da primeira linha >= 'limite' de cada trecho (senão, a última)."""
+    with np.errstate(invalid='ignore'):
+        acertos = np.flatnonzero(valores >= limite)
+    posicoes = fins - 1
+    trechos_ok, primeiros = np.unique(trecho[acertos], return_index=True)
+    posicoes[trechos_ok] = acertos[primeiros]
+    return posicoes
+
+
+def pontos_ruptura(df, inicios=None):
+    """
+    Estado na ruptura de cada ensaio de 'df' (linhas do cisalhamento, sem
+    as fictícias, com COLUNAS_RUPTURA e stage_no), para cada critério de
+    CRITERIOS e cada lado.
+
+    Args:
+        inicios: posição da primeira linha de cada ensaio numa tabela
+            empilhada (padrão: um único ensaio).
+
+    Returns:
+        DataFrame: uma linha por (trecho, criterio, lado), com 'linha'
+        (posição em 'df'), stage_no, ax_strain, q, p_efetiva, e, u, du,
+        nqp, razao_tensoes (σ'1/σ'3), eff_ax_stress e eff_rad_stress.
+    """
+    colunas = ["trecho", "criterio", "lado", "linha", "stage_no", "ax_strain",
+               "q", "p_efetiva", "e", "u", "du", "nqp", "razao_tensoes",
+               "eff_ax_stress", "eff_rad_stress"]
+    if df.empty:
+        return pd.DataFrame(columns=colunas)
+
+    valores = {c: df[c].to_numpy(dtype=float) for c in ("stage_no",) + COLUNAS_RUPTURA}
+    inicios, fins, trecho = _trechos(len(df), inicios)
+    ax_strain = valores["ax_strain"]
+    q_15 = _primeiro_acima(ax_strain, DEFORMACAO_CRITERIO_15, inicios, fins, trecho)
+
+    partes = []
+    for lado in ("A", "B"):
+        posicoes = {
+            "q_max": _primeiro_maximo(valores[f"dev_stress_{lado}"], inicios, trecho),
+            "q_15": q_15,
+            "razao_max": _primeiro_maximo(valores[f"nqp_{lado}"], inicios, trecho),
+            "ultimo": fins - 1,
+        }
+        for criterio in CRITERIOS:
+            i = posicoes[criterio]
+            eff_ax = valores[f"eff_ax_stress_{lado}"][i]
+            eff_rad = valores["eff_rad_stress"][i]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                razao = np.where(eff_rad != 0, eff_ax / eff_rad, np.nan)
+            partes.append(pd.DataFrame({
+                "trecho": np.arange(len(inicios)),
+                "criterio": criterio,
+                "lado": lado,
+                "linha": i,
+                "stage_no": valores["stage_no"][i],
+                "ax_strain": ax_strain[i],
+                "q": valores[f"dev_stress_{lado}"][i],
+                "p_efetiva": valores[f"eff_camb_{lado}"][i],
+                "e": valores[f"void_ratio_{lado}"][i],
+                "u": valores["pore_press_Original"][i],
+                "du": valores["du_kpa"][i],
+                "nqp": valores[f"nqp_{lado}"][i],
+                "razao_tensoes": razao,
+                "eff_ax_stress": eff_ax,
+                "eff_rad_stress": eff_rad,
+            }))
+    return (pd.concat(partes, ignore_index=True)
+              .sort_values("trecho", kind="stable")
+              .reset_index(drop=True)[colunas])
@@ -1,12 +1,15 @@
 # teste.py
 import csv
+import hashlib
+import io
 import os
 import shutil
 import tempfile
 import re
 from typing import Iterable
 
-__all__ = ["fix_gds"]
+__all__ = ["fix_gds", "tem_virgula_decimal", "corrige_texto", "DecimalCommaReader",
+           "hash_conteudo", "hash_arquivo"]
 
 # ------------------------------------------------------------------ #
 # utilidades internas
@@ -30,9 +33,104 @@ def _corrige_linha(campos: Iterable[str]) -> list[str]:
         corrigidos.append(t)
     return corrigidos
 
+# Campo entre aspas com vírgula decimal, ex.: "1.234,5" ou "-0,25"
+# (mesma heurística de _num_re, aplicada direto sobre o texto CSV)
+_campo_virgula_re = re.compile(r'"\s*([\s\'+-]*\d{1,3}(?:\.\d{3})*,\d+)\s*"')
+_detecta_virgula_re = re.compile(r'"\d+,\d+')
+
+def _corrige_campo(m: "re.Match") -> str:
+    t = m.group(1).strip()
+    return '"' + t.replace(".", "").replace(",", ".") + '"'
+
 # ------------------------------------------------------------------ #
-# função pública
+# funções públicas
 # ------------------------------------------------------------------ #
+def tem_virgula_decimal(texto: str) -> bool:
+    """
+    True se o texto tiver algum campo entre aspas no padrão "1,5"
+    (exportação com locale pt-BR).
+    """
+    return _detecta_virgula_re.search(texto) is not None
+
+def corrige_texto(texto: str) -> str:
+    """
+    Converte, em memória, os campos numéricos com vírgula decimal para
+    ponto ("1.234,5" -> "1234.5"). Linhas sem esses campos ficam iguais.
+    """
+    return _campo_virgula_re.sub(_corrige_campo, texto)
+
+class DecimalCommaReader(io.TextIOBase):
+    """
+    Envoltório de leitura (somente leitura) que corrige a vírgula decimal
+    à medida que o parser consome o texto. Pode ser passado direto ao
+    pd.read_csv: nenhum arquivo temporário é criado e o original não é
+    alterado.
+
+    A fonte é lida em blocos de linhas completas (~`bloco` caracteres),
+    então um campo nunca é cortado ao meio.
+    """
+    def __init__(self, fonte, bloco: int = 1 << 20):
+        self._fonte = fonte
+        self._bloco = bloco
+        self._buffer = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def _encher(self, minimo: int) -> None:
+        while len(self._buffer) < minimo:
+            linhas = self._fonte.readlines(self._bloco)
+            if not linhas:
+                break
+            self._buffer += corrige_texto("".join(linhas))
+
+    def read(self, size=-1) -> str:
+        if size is None or size < 0:
+            resto = self._buffer + corrige_texto(self._fonte.read())
+            self._buffer = ""
+            return resto
+        self._encher(size)
+        saida, self._buffer = self._buffer[:size], self._buffer[size:]
+        return saida
+
+    def readline(self, size=-1) -> str:
+        while "\n" not in self._buffer:
+            tamanho = len(self._buffer)
+            self._encher(tamanho + 1)
+            if len(self._buffer) == tamanho:
+                break
+        fim = self._buffer.find("\n") + 1 or len(self._buffer)
+        if size is not None and 0 <= size < fim:
+            fim = size
+        linha, self._buffer = self._buffer[:fim], self._buffer[fim:]
+        return linha
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        linha = self.readline()
+        if not linha:
+            raise StopIteration
+        return linha
+
+def hash_conteudo(dados: bytes) -> str:
+    """
+    Hash (hex) do conteúdo bruto de um arquivo. Usado pelo registro de
+    arquivos ingeridos (RegistroArquivos) para detectar alterações.
+    """
+    return hashlib.blake2b(dados, digest_size=16).hexdigest()
+
+def hash_arquivo(caminho: str, bloco: int = 1 << 20) -> str:
+    """
+    Mesmo hash de hash_conteudo, calculado lendo o arquivo em blocos.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(caminho, "rb") as f:
+        for parte in iter(lambda: f.read(bloco), b""):
+            h.update(parte)
+    return h.hexdigest()
+
 def fix_gds(path_original: str) -> str:
     """
     – Se o arquivo já estiver no padrão inglês, nada é feito.  
@@ -40,6 +138,10 @@ def fix_gds(path_original: str) -> str:
       (metadados **e** tabela) para ponto, mantendo o próprio arquivo.
 
     Retorna sempre o mesmo caminho recebido (`path_original`).
+
+    Obs.: reescreve o arquivo em disco. A importação usa
+    teste3.read_gds, que faz a mesma correção em memória
+    (DecimalCommaReader) sem tocar no original.
     """
     # 1) Lê rapidamente – se não encontrar “, \d” dentro de aspas,
     #    presumimos que já está OK
@@ -2,6 +2,7 @@
 
 import os
 from testeBD import DatabaseManager
+from teste3 import parse_metadata_lines, read_gds
 
 class FileProcessor:
     def __init__(self, directory):
@@ -17,41 +18,28 @@ class FileProcessor:
         """
         try:
             with open(gds_file, 'r', encoding='latin-1') as file:
-                lines = file.readlines()
+                metadata_lines = []
+                for line in file:
+                    # Parar no cabeçalho da tabela; se não houver "Stage Number",
+                    # o arquivo inteiro é considerado "metadados".
+                    if "Stage Number" in line:
+                        break
+                    metadata_lines.append(line)
 
-            # 1) Encontrar a linha do cabeçalho (que contém "Stage Number")
-            header_index = None
-            for i, line in enumerate(lines):
-                if "Stage Number" in line:
-                    header_index = i
-                    break
+            return parse_metadata_lines(metadata_lines, self.metadados_map)
 
-            # Se não encontrar a linha "Stage Number", assume que não há tabela
-            # e consideramos o arquivo inteiro como "metadados".
-            if header_index is None:
-                header_index = len(lines)
-
-            # 2) Extrair metadados apenas das linhas acima do cabeçalho
-            metadata_lines = lines[:header_index]
-
-            metadados = {}
-            for line in metadata_lines:
-                # Cada linha de metadados supõe ter o formato "Chave,Valor"
-                parts = line.strip().split(',')
-                if len(parts) == 2 and parts[1].strip():
-                    chave_completa = parts[0].strip().strip('"')
-                    valor = parts[1].strip().strip('"')
-
-                    # Verificar se existe abreviação no dicionário do BD
-                    abreviacao = self.metadados_map.get(chave_completa)
-                    if abreviacao:
-                        metadados[abreviacao] = valor
-                    else:
-                        # Se não houver mapeamento, manter a chave original
-                        metadados[chave_completa] = valor
-
-            return metadados
+        except Exception as e:
+            print(f"Erro ao processar o arquivo '{gds_file}': {e}")
+            return None
 
+    def read_gds_file(self, gds_file, **read_csv_kwargs):
+        """
+        Lê o arquivo .gds uma única vez, devolvendo metadados (já com as
+        abreviações de self.metadados_map) e a tabela a partir de
+        "Stage Number". Ver teste3.read_gds.
+        """
+        try:
+            return read_gds(gds_file, self.metadados_map, **read_csv_kwargs)
         except Exception as e:
             print(f"Erro ao processar o arquivo '{gds_file}': {e}")
             return None
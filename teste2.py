@@ -1,5 +1,6 @@
 # teste2.py
 
+import re
 from testeBD import DatabaseManager
 
 class StageProcessor:
@@ -37,4 +38,230 @@ class StageProcessor:
 
         except Exception as e:
             print(f"Erro ao processar o estágio dos dados: {e}")
-            return metadados
\ No newline at end of file
+            return metadados
+
+
+def unify_metadados_keys(metadados):
+    """
+    Ajusta as chaves de metadados lidas do arquivo, mapeando-as para
+    as colunas que realmente queremos salvar no banco de dados.
+    Aqui ocorre a lógica de converter 'Cisalhamento' em dois valores:
+    '_cis_inicial' e '_cis_final'.
+
+    Returns:
+        tuple: (dict final para MetadadosArquivo, lista (chave, valor) ordenada)
+    """
+    desired_order = ["_B", "_ad", "_cis_inicial", "_cis_final", "w_0", "w_f",
+                    "idcontrato", "idcampanha", "idamostra", "idtipoensaio",
+                    "sequencial", "cp", "repeticao"]
+
+    possible_aliases = {
+        "B": "_B",
+        "Adensamento": "_ad",
+
+        "Cisalhamento Inicial": "_cis_inicial",
+        "Cisalhamento Final": "_cis_final",
+        "Sequencial": "sequencial",
+        "Volume de umidade médio INICIAL": "w_0",
+        "Volume de umidade médio FINAL": "w_f",
+        "Initial Height (mm)": "h_init",
+        "Initial Diameter (mm)": "d_init",
+        "Ram Diameter": "ram_diam",
+        "Specific Gravity (kN/m³):": "spec_grav",
+        "Job reference:": "idcontrato",
+        "Borehole:": "idcampanha",
+        "Sample Name:": "idamostra",
+        "Depth:": "depth",
+        "Sample Date (dd/mm/yyyy):": "samp_date",
+        "Description of Sample:": "tipo",
+        "Initial mass (g):": "init_mass",
+        "Initial dry mass (g):": "init_dry_mass",
+        "Specific Gravity (ass/meas):": "spec_grav_assmeas",
+        "Date Test Started:": "date_test_started",
+        "Date Test Finished:": "date_test_finished",
+        "Specimen Type (dis/undis):": "spec_type",
+        "Top Drain Used (y/n):": "top_drain",
+        "Base Drain Used (y/n):": "base_drain",
+        "Side Drains Used (y/n):": "side_drains",
+        "Final Mass:": "fin_mass",
+        "Final Dry Mass:": "fin_dry_mass",
+        "Machine No.:": "mach_no",
+        "Pressure System:": "press_sys",
+        "Cell No.:": "cell_no",
+        "Ring No.:": "ring_no",
+        "Job Location:": "job_loc",
+        "Membrane Thickness (mm):": "mem_thick",
+        "Test Number:": "test_number",
+        "Technician Name:": "tech_name",
+        "Sample Liquid Limit (%):": "liq_lim",
+        "Sample Plastic Limit (%):": "plas_lim",
+        "Average Water Content of Sample Trimmings (%):": "avg_wc_trim",
+        "Additional Notes (info source or occurrence and size of large particles etc.):": "notes",
+        "% by mass of Sample retained on No. 4 sieve (Gravel):": "mass_no4",
+        "% by mass of Sample retained on No. 10 sieve (Coarse Sand):": "mass_no10",
+        "% by mass of Sample retained on No. 40 sieve (Medium Sand):": "mass_no40",
+        "% by mass of Sample retained on No. 200 sieve (Fine Sand):": "mass_no200",
+        "% by mass of Sample Silt (0.074 to 0.005 mm):": "mass_silt",
+        "% by mass of Sample Clay (smaller than 0.005 mm):": "mass_clay",
+        "% by mass of Sample Colloids (smaller than 0.001 mm):": "mass_coll",
+        "Trimming Procedure (turntable/cutting shoe/direct test/ring lined sampler):": "trim_proc",
+        "Moisture Condition (natural moisture/inundated):": "moist_cond",
+        "Axial Stress at Inundation (kPa):": "ax_stress_inund",
+        "Description of Water Used:": "water_desc",
+        "Test Method (A/B):": "test_meth",
+        "Interpretation Procedure for Cv (1/2/Both):": "interp_cv",
+        "All Departures from Outlined ASTM D2435/D2435M-11 Procedure:": "astm_dep",
+        "Specify how the water content was obtained (cuttings/entire specimen):": "wc_obt",
+        "Specify method for specimen saturation (dry method/wet method):": "sat_meth",
+        "Specify method to determine post_consolidation specimen area (A/B/A and B):": "post_consol_area",
+        "Specify failure criterion (max deviator stress/deviator stress at 15% strain/max eff. stress/other:": "fail_crit",
+        "Load carried by filter paper strips (kN/mm):": "load_filt_paper",
+        "Specimen perimeter covered by filter paper (mm):": "filt_paper_cov",
+        "Young's modulus of membrane material (kPa):": "young_mod_mem",
+        "Time of Test": "test_time",
+        "Date of Test": "test_date",
+        "Start of Repeated Data": "start_rep_data",
+        "dry_unit_weight": "dry_unit_weight",
+        "init_void_ratio": "init_void_ratio",
+        "init_sat": "init_sat",
+        "final_moisture": "final_moisture",
+        "Saturacao_c": "Saturacao_c",
+        "v_0": "v_0",
+        "vol_solid": "vol_solid",
+        "v_w_f": "v_w_f",
+        "ax_disp_0": "ax_disp_0",
+        "back_vol_0": "back_vol_0",
+        "back_press_0": "back_press_0",
+        "rad_press_0": "rad_press_0",
+        "pore_press_0": "pore_press_0",
+        "ax_disp_c": "ax_disp_c",
+        "back_vol_c": "back_vol_c",
+        "h_init_c": "h_init_c",
+        "back_vol_f": "back_vol_f",
+        "v_c_A": "v_c_A",
+        "cons_void_vol_A": "cons_void_vol_A",
+        "cons_void_vol_B": "cons_void_vol_B",
+        "v_c_B": "v_c_B",
+        "w_c_A": "w_c_A",
+        "w_c_B": "w_c_B",
+        "void_ratio_c": "void_ratio_c",
+        "void_ratio_f": "void_ratio_f",
+        "void_ratio_m": "void_ratio_m",
+        "vol_change_c": "vol_change_c",
+        "vol_change_f_c": "vol_change_f_c",
+        "final_void_vol": "final_void_vol",
+        "consolidated_area_A": "consolidated_area_A",
+        "consolidated_area_B": "consolidated_area_B",            
+        "camb_p_A0": "camb_p_A0",
+        "camb_p_B0": "camb_p_B0"
+    }
+
+    # 1) Renomear as chaves do dicionário metadados conforme 'possible_aliases'
+    for old_key, new_key in list(possible_aliases.items()):
+        if old_key in metadados:
+            # Se new_key estiver vazio ou não existir, substitui
+            if new_key not in metadados or not metadados[new_key]:
+                metadados[new_key] = metadados[old_key]
+            del metadados[old_key]
+
+    # 2) Exemplo: caso o arquivo .gds ainda use apenas "Cisalhamento"
+    # e a gente queira automaticamente criar '_cis_inicial' e '_cis_final'
+    if "Cisalhamento" in metadados:
+        valor_cis = str(metadados["Cisalhamento"]).strip()
+        if "-" in valor_cis:
+            ini, fim = valor_cis.split("-")
+        else:
+            ini, fim = valor_cis, valor_cis  # Ex.: se vier "8", então 8-8
+        metadados["_cis_inicial"] = ini
+        metadados["_cis_final"] = fim
+        del metadados["Cisalhamento"]
+
+    # 3) Ordenar metadados conforme 'desired_order'
+    ordered_metadata = []
+    remaining_metadata = []
+
+    for key, value in metadados.items():
+        if key in desired_order:
+            ordered_metadata.append((key, value))
+        else:
+            remaining_metadata.append((key, value))
+
+    # Reordena a lista final
+    metadata_items = ordered_metadata + remaining_metadata
+
+    # 4) Filtra apenas as colunas que serão salvas em MetadadosArquivo (se desejado)
+    # Exemplo:
+    metadadosarquivo_cols = [
+        "_B", "_ad", "_cis_inicial", "_cis_final",
+        "w_0", "w_f", "h_init", "d_init", "ram_diam", "spec_grav","sequencial",
+        "idcontrato", "idcampanha", "idamostra", "idtipoensaio", "depth",
+        "samp_date", "tipo", "init_mass", "init_dry_mass", "spec_grav_assmeas",
+        # ...
+    ]
+
+    final_dict = {}
+    for col in metadadosarquivo_cols:
+        if col in metadados:
+            final_dict[col] = metadados[col]
+
+    # Exemplos de cp e repeticao que podem não estar em metadadosarquivo_cols
+    if "cp" in metadados:
+        final_dict["cp"] = metadados["cp"]
+    if "repeticao" in metadados:
+        final_dict["repeticao"] = metadados["repeticao"]
+
+    return final_dict, metadata_items
+
+
+def preparar_metadados_gds(metadados, fixed_metadados=None):
+    """
+    Completa os metadados lidos de um .gds do mesmo modo que o fluxo
+    "Encontrar Arquivos": preenche com os metadados fixos do BD, repõe os
+    nomes legíveis, extrai idtipoensaio/sequencial de "Description of
+    Sample:" e cp/repeticao de "Test Number:" e, por fim, unifica as chaves.
+
+    Usada tanto pela interface quanto pela ingestão em lote (sem interface).
+
+    Returns:
+        tuple: (dict final para MetadadosArquivo, lista (chave, valor) ordenada)
+    """
+    if fixed_metadados:
+        for k, v in fixed_metadados.items():
+            if k not in metadados or not metadados[k]:
+                metadados[k] = v
+
+    if "idcontrato" in metadados and not metadados.get("Job reference:"):
+        metadados["Job reference:"] = metadados["idcontrato"]
+    if "idcampanha" in metadados and not metadados.get("Borehole:"):
+        metadados["Borehole:"] = metadados["idcampanha"]
+    if "idamostra" in metadados and not metadados.get("Sample Name:"):
+        metadados["Sample Name:"] = metadados["idamostra"]
+    if "tipo" in metadados and not metadados.get("Description of Sample:"):
+        metadados["Description of Sample:"] = metadados["tipo"]
+    if "test_number" in metadados and not metadados.get("Test Number:"):
+        metadados["Test Number:"] = metadados["test_number"]
+
+    # Ajusta caso o FileProcessor tenha usado a chave "Description of Sample" (sem dois-pontos)
+    if "Description of Sample" in metadados and "Description of Sample:" not in metadados:
+        metadados["Description of Sample:"] = metadados["Description of Sample"]
+        del metadados["Description of Sample"]
+
+    desc_value = metadados.get("Description of Sample:", "").strip()
+    match_desc = re.match(r"(\d+)[Ss](\d+)", desc_value)
+    if match_desc:
+        metadados["idtipoensaio"] = int(match_desc.group(1))
+        metadados["sequencial"] = int(match_desc.group(2))
+    else:
+        metadados["idtipoensaio"] = 0
+        metadados["sequencial"] = 0
+
+    test_value = metadados.get("Test Number:", "").strip()
+    match_test = re.match(r"([A-Za-z]+)[Rr]?(\d+)", test_value)
+    if match_test:
+        metadados["cp"] = match_test.group(1)[0].upper()
+        metadados["repeticao"] = int(match_test.group(2))
+    else:
+        metadados["cp"] = None
+        metadados["repeticao"] = None
+
+    return unify_metadados_keys(metadados)
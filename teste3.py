@@ -1,7 +1,13 @@
+import csv
+import io
 import os
 import pandas as pd
 import numpy as np
 
+from teste import tem_virgula_decimal, corrige_texto, DecimalCommaReader, hash_conteudo
+from cacheGDS import cache_padrao
+from medicao import medido, depuracao
+
 ###############################################################################
 # Função auxiliar para conversão segura de floats
 ###############################################################################
@@ -26,6 +32,19 @@ def safe_divide(numerator, denominator, default_value=0.0):
     except:
         return default_value
 
+def safe_divide_array(numerator, denominator, default_value=0.0):
+    """
+    safe_divide elemento a elemento (arrays numpy ou escalares): onde o
+    denominador é 0 o resultado é default_value; nos demais, a mesma
+    divisão em ponto flutuante de safe_divide.
+    """
+    numerator, denominator = np.broadcast_arrays(
+        np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float)
+    )
+    resultado = np.full(numerator.shape, default_value, dtype=float)
+    np.divide(numerator, denominator, out=resultado, where=(denominator != 0))
+    return resultado
+
 ###############################################################################
 # Função para encontrar, dinamicamente, a linha do cabeçalho no arquivo .gds
 ###############################################################################
@@ -41,6 +60,462 @@ def find_header_line(gds_file):
                 return i
     return None  # Caso não encontre
 
+###############################################################################
+# Mapeamento de cabeçalhos do .gds para colunas "_Original"
+###############################################################################
+GDS_HEADER_MAPPING = {
+    "Stage Number":                 "stage_no",
+    "Time since start of test (s)": "time_test_start",
+    "Time since start of stage (s)": "time_stage_start",
+    "Radial Pressure (kPa)":        "rad_press_Original",
+    "Radial Volume (mm³)":          "rad_vol_Original",
+    "Back Pressure (kPa)":          "back_press_Original",
+    "Back Volume (mm³)":            "back_vol_Original",
+    "Load Cell (kN)":               "load_cell_Original",
+    "Pore Pressure (kPa)":          "pore_press_Original",
+    "Axial Displacement (mm)":      "ax_disp_Original",
+    "Axial Force (kN)":             "ax_force_Original",
+    "Axial Strain (%)":             "ax_strain_Original",
+    "Av Diameter Change (mm)":      "avg_diam_chg_Original",
+    "Radial Strain (%)":            "rad_strain_Original",
+    "Axial Stress (kPa)":           "ax_strain_Original_2",
+    "Eff. Axial Stress (kPa)":      "eff_ax_stress_Original",
+    "Eff. Radial Stress (kPa)":     "eff_rad_stress_Original",
+    "Deviator Stress (kPa)":        "dev_stress_Original",
+    "Total Stress Ratio":           "total_stress_rat_Original",
+    "Eff. Stress Ratio":            "eff_stress_rat_Original",
+    "Current Area (mm²)":           "cur_area_Original",
+    "Shear Strain (%)":             "shear_strain_Original",
+    "Cambridge p (kPa)":            "camb_p_Original",
+    "Eff. Cambridge p' (kPa)":      "eff_camb_p_Original",
+    "Max Shear Stress t (kPa)":     "max_shear_stress_Original",
+    "Volume Change (mm³)":          "vol_change_Original",
+    "B Value":                      "b_value_Original",
+    "Mean Stress s/Eff. Axial Stress 2": "mean_stress_Original",
+}
+
+
+# Colunas (nomes já mapeados) lidas como float32 em vez de float64.
+# Vazio por padrão: os cálculos usam float64 em todas as colunas.
+GDS_FLOAT32_COLUMNS = frozenset()
+
+# Tipos das colunas mapeadas que não são float
+GDS_DTYPES_ESPECIAIS = {
+    "stage_no": "int64",
+}
+
+
+def gds_schema(cabecalho, float32=None):
+    """
+    Esquema de leitura da tabela .gds a partir da linha de cabeçalho:
+    só as colunas conhecidas (GDS_HEADER_MAPPING, pelo nome do arquivo ou
+    já mapeado) são lidas, com o tipo declarado.
+
+    Returns:
+        tuple: (usecols, dtype) para o pd.read_csv, ou (None, None) se o
+        cabeçalho tiver nomes repetidos (lido sem esquema).
+    """
+    float32 = GDS_FLOAT32_COLUMNS if float32 is None else float32
+    nomes = [c.strip() for c in cabecalho]
+    if len(set(nomes)) != len(nomes):
+        return None, None
+
+    conhecidas = set(GDS_HEADER_MAPPING.values())
+    usecols, dtype = [], {}
+    for bruto, nome in zip(cabecalho, nomes):
+        mapeado = GDS_HEADER_MAPPING.get(nome, nome)
+        if mapeado not in conhecidas:
+            continue
+        usecols.append(bruto)
+        if mapeado in GDS_DTYPES_ESPECIAIS:
+            dtype[bruto] = GDS_DTYPES_ESPECIAIS[mapeado]
+        else:
+            dtype[bruto] = "float32" if mapeado in float32 else "float64"
+    return usecols, dtype
+
+
+def _garantir_numerico(df, colunas=None):
+    """
+    Converte para número (coerce) só as colunas que ainda não são
+    numéricas; colunas já tipadas na leitura passam direto.
+    """
+    colunas = df.columns if colunas is None else colunas
+    for c in colunas:
+        if df[c].dtype.kind not in "biuf":
+            df[c] = pd.to_numeric(df[c], errors='coerce')
+    return df
+
+
+def map_gds_columns(df):
+    """
+    Retorna uma cópia rasa de 'df' com os nomes de coluna sem espaços
+    extras e renomeados segundo GDS_HEADER_MAPPING.
+    """
+    return df.rename(columns=lambda x: GDS_HEADER_MAPPING.get(x.strip(), x.strip()))
+
+###############################################################################
+# Leitura única do arquivo .gds (metadados + tabela)
+###############################################################################
+def parse_metadata_lines(lines, metadados_map=None):
+    """
+    Extrai os metadados das linhas "Chave,Valor" que aparecem antes do
+    cabeçalho "Stage Number". Se 'metadados_map' for informado, as chaves
+    são substituídas pelas abreviações correspondentes.
+    """
+    metadados_map = metadados_map or {}
+    metadados = {}
+    for line in lines:
+        parts = line.strip().split(',')
+        if len(parts) == 2 and parts[1].strip():
+            chave_completa = parts[0].strip().strip('"')
+            valor = parts[1].strip().strip('"')
+
+            # Se não houver mapeamento, manter a chave original
+            abreviacao = metadados_map.get(chave_completa)
+            metadados[abreviacao or chave_completa] = valor
+    return metadados
+
+
+# Versão do formato das tabelas no cache: aumentar sempre que a leitura
+# mudar (parser, correção da vírgula decimal, tipos), para que as entradas
+# antigas deixem de ser usadas. O mapeamento de cabeçalhos e os tipos
+# especiais já entram na chave por conta própria.
+CACHE_VERSAO = 1
+
+
+def _chave_cache(hash_arquivo, read_csv_kwargs):
+    """
+    Chave do cache de tabelas: hash do conteúdo e da versão da leitura
+    (CACHE_VERSAO, GDS_HEADER_MAPPING, GDS_DTYPES_ESPECIAIS) e das opções
+    do read_csv (ex.: on_bad_lines='skip' gera outra tabela).
+    Retorna None se alguma opção não tiver representação estável.
+    """
+    read_csv_kwargs = read_csv_kwargs or {}
+    if any(callable(v) for v in read_csv_kwargs.values()):
+        return None
+    versao = (CACHE_VERSAO, sorted(GDS_HEADER_MAPPING.items()),
+              sorted(GDS_DTYPES_ESPECIAIS.items()), sorted(read_csv_kwargs.items()))
+    return f"{hash_arquivo}-{hash_conteudo(repr(versao).encode('utf-8'))[:8]}"
+
+
+def ler_tabela_gds(texto_tabela, virgula_decimal=False, esquema=True, **read_csv_kwargs):
+    """
+    Interpreta o texto da tabela (a partir da linha de cabeçalho) e
+    devolve o DataFrame com os nomes de coluna sem espaços extras.
+    Ver read_gds para 'virgula_decimal' e 'esquema'.
+    """
+    def abrir_tabela():
+        tabela = io.StringIO(texto_tabela)
+        return DecimalCommaReader(tabela) if virgula_decimal else tabela
+
+    usecols = dtype = None
+    if esquema:
+        fim_cabecalho = texto_tabela.find('\n')
+        cabecalho = next(csv.reader([texto_tabela[:fim_cabecalho if fim_cabecalho != -1 else None]]))
+        usecols, dtype = gds_schema(cabecalho)
+
+    if usecols:
+        opcoes = {'usecols': usecols, 'dtype': dtype, 'engine': 'c'}
+        opcoes.update(read_csv_kwargs)
+        try:
+            df = pd.read_csv(abrir_tabela(), header=0, **opcoes)
+        except ValueError:
+            # Valor não numérico em alguma coluna: lê sem tipos e converte
+            opcoes.pop('dtype')
+            df = pd.read_csv(abrir_tabela(), header=0, **opcoes)
+            for bruto, tipo in dtype.items():
+                if bruto not in df.columns:
+                    continue
+                coluna = pd.to_numeric(df[bruto], errors='coerce')
+                if coluna.dtype.kind == 'f' and tipo == 'float32':
+                    coluna = coluna.astype('float32')
+                df[bruto] = coluna
+    else:
+        df = pd.read_csv(abrir_tabela(), header=0, **read_csv_kwargs)
+    df.rename(columns=lambda x: x.strip(), inplace=True)
+    return df
+
+
+@medido("leitura_gds", linhas=lambda r: None if r['df'] is None else len(r['df']))
+def read_gds(gds_file, metadados_map=None, usar_cache=True, esquema=True,
+             ate_ultima_linha=False, **read_csv_kwargs):
+    """
+    Lê o arquivo .gds UMA única vez e devolve os metadados e a tabela.
+
+    O texto é decodificado uma vez; a posição de "Stage Number" separa o
+    bloco de metadados da tabela, que é entregue ao pd.read_csv a partir
+    do próprio buffer em memória (sem reabrir o arquivo).
+
+    Exportações com vírgula decimal ("1.234,5") são corrigidas em memória
+    enquanto o parser consome o texto (teste.DecimalCommaReader); o
+    arquivo original é aberto somente para leitura e nunca reescrito.
+
+    Os bytes lidos também dão o hash do conteúdo; tamanho e mtime vêm do
+    mesmo handle, então 'registro' descreve exatamente o que foi lido
+    (ver DatabaseManager.registrar_arquivo).
+
+    Com 'usar_cache', a tabela já lida antes (mesmo hash e mesmas opções
+    do read_csv) vem do cache colunar (cacheGDS) e o texto não é
+    interpretado de novo.
+
+    Com 'esquema', a tabela é lida com tipos declarados (gds_schema):
+    só as colunas conhecidas, float64 (ou float32, GDS_FLOAT32_COLUMNS)
+    e engine C, sem passar por colunas object. Se algum valor não for
+    numérico, a leitura é refeita sem tipos e as colunas são convertidas
+    com coerce (valores inválidos viram NaN), como antes.
+
+    Com 'ate_ultima_linha', bytes depois da última quebra de linha (linha
+    ainda sendo gravada pelo equipamento) são ignorados; 'tamanho' passa
+    a ser a posição até onde o arquivo foi lido (ver acompanhamento.py).
+
+    Returns:
+        dict: {'metadados': dict, 'df': DataFrame ou None (sem cabeçalho),
+               'header_line': índice 0-based do cabeçalho ou None,
+               'registro': {'caminho', 'tamanho', 'mtime_ns', 'hash'}}
+    """
+    with open(gds_file, 'rb') as file:
+        dados = file.read()
+        mtime_ns = os.fstat(file.fileno()).st_mtime_ns
+
+    if ate_ultima_linha:
+        dados = dados[:dados.rfind(b'\n') + 1]
+
+    registro = {
+        'caminho': os.path.abspath(gds_file),
+        'tamanho': len(dados),
+        'mtime_ns': mtime_ns,
+        'hash': hash_conteudo(dados),
+    }
+
+    opcoes_chave = dict(read_csv_kwargs)
+    if esquema:
+        opcoes_chave['_esquema'] = sorted(GDS_FLOAT32_COLUMNS)
+    chave = _chave_cache(registro['hash'], opcoes_chave) if usar_cache else None
+    if chave:
+        em_cache = cache_padrao().obter(chave)
+        if em_cache is not None:
+            return {
+                'metadados': parse_metadata_lines(em_cache['bloco_metadados'].splitlines(),
+                                                  metadados_map),
+                'df': em_cache['df'],
+                'header_line': em_cache['header_line'],
+                'registro': registro,
+            }
+
+    # Mesmo resultado da leitura em modo texto (quebras de linha universais)
+    texto = dados.decode('latin-1')
+    del dados
+    if '\r' in texto:
+        texto = texto.replace('\r\n', '\n').replace('\r', '\n')
+
+    virgula_decimal = tem_virgula_decimal(texto)
+
+    pos = texto.find("Stage Number")
+    if pos == -1:
+        # Sem tabela: o arquivo inteiro é considerado metadados
+        if virgula_decimal:
+            texto = corrige_texto(texto)
+        return {
+            'metadados': parse_metadata_lines(texto.splitlines(), metadados_map),
+            'df': None,
+            'header_line': None,
+            'registro': registro,
+        }
+
+    inicio_tabela = texto.rfind('\n', 0, pos) + 1
+    header_line = texto.count('\n', 0, inicio_tabela)
+
+    bloco_metadados = texto[:inicio_tabela]
+    if virgula_decimal:
+        bloco_metadados = corrige_texto(bloco_metadados)
+
+    metadados = parse_metadata_lines(bloco_metadados.splitlines(), metadados_map)
+    df = ler_tabela_gds(texto[inicio_tabela:], virgula_decimal, esquema, **read_csv_kwargs)
+
+    if chave:
+        cache_padrao().guardar(chave, df, bloco_metadados, header_line)
+
+    return {'metadados': metadados, 'df': df, 'header_line': header_line,
+            'registro': registro}
+
+
+def _ler_ate_cabecalho(file):
+    """
+    Lê as linhas de metadados de 'file' (aberto em modo texto) até a
+    linha com "Stage Number". Retorna (linhas, posição do cabeçalho para
+    file.seek, índice do cabeçalho); posição/índice são None se não houver.
+    """
+    linhas = []
+    while True:
+        pos = file.tell()
+        linha = file.readline()
+        if not linha:
+            return linhas, None, None
+        if "Stage Number" in linha:
+            return linhas, pos, len(linhas)
+        linhas.append(linha)
+
+
+def ler_metadados_gds(gds_file, metadados_map=None):
+    """
+    Lê só o bloco de metadados (até "Stage Number"), sem carregar a
+    tabela. Vírgula decimal é corrigida como em read_gds.
+
+    Returns:
+        dict: {'metadados': dict, 'header_line': índice 0-based ou None}
+    """
+    with open(gds_file, 'r', encoding='latin-1') as file:
+        linhas, _, header_line = _ler_ate_cabecalho(file)
+    bloco = "".join(linhas)
+    if tem_virgula_decimal(bloco):
+        bloco = corrige_texto(bloco)
+    return {'metadados': parse_metadata_lines(bloco.splitlines(), metadados_map),
+            'header_line': header_line}
+
+
+def ler_gds_em_blocos(gds_file, linhas_por_bloco=100_000, esquema=True, **read_csv_kwargs):
+    """
+    Lê a tabela do .gds em blocos de até 'linhas_por_bloco' linhas, sem
+    carregar o arquivo inteiro (registros cíclicos de vários dias).
+    Cada bloco tem os mesmos nomes/tipos da tabela de read_gds.
+
+    A vírgula decimal é detectada no início do arquivo (metadados e
+    primeiras linhas) e corrigida enquanto o parser lê. Se algum valor
+    não for numérico, a leitura recomeça sem tipos (as linhas já
+    entregues são descartadas) e as colunas são convertidas com coerce,
+    como em ler_tabela_gds.
+
+    Yields:
+        DataFrame de cada bloco. Sem cabeçalho "Stage Number", nada é gerado.
+    """
+    with open(gds_file, 'r', encoding='latin-1') as file:
+        linhas, inicio, _ = _ler_ate_cabecalho(file)
+        if inicio is None:
+            return
+        file.seek(inicio)
+        cabecalho = next(csv.reader([file.readline()]))
+        virgula_decimal = tem_virgula_decimal("".join(linhas) + file.read(1 << 20))
+
+        usecols = dtype = None
+        if esquema and 'usecols' not in read_csv_kwargs:
+            usecols, dtype = gds_schema(cabecalho)
+
+        entregues = 0
+        tipado = bool(usecols)
+        while True:
+            file.seek(inicio)
+            fonte = DecimalCommaReader(file) if virgula_decimal else file
+            opcoes = dict(read_csv_kwargs)
+            if usecols:
+                opcoes.update(usecols=usecols, engine='c')
+                if tipado:
+                    opcoes['dtype'] = dtype
+            pular = entregues  # linhas já entregues antes de recomeçar
+            try:
+                for bloco in pd.read_csv(fonte, header=0, chunksize=linhas_por_bloco, **opcoes):
+                    if pular:
+                        if len(bloco) <= pular:
+                            pular -= len(bloco)
+                            continue
+                        bloco = bloco.iloc[pular:].copy()
+                        pular = 0
+                    if usecols and not tipado:
+                        for bruto, tipo in dtype.items():
+                            if bruto not in bloco.columns:
+                                continue
+                            coluna = pd.to_numeric(bloco[bruto], errors='coerce')
+                            if coluna.dtype.kind == 'f' and tipo == 'float32':
+                                coluna = coluna.astype('float32')
+                            bloco[bruto] = coluna
+                    bloco.rename(columns=lambda x: x.strip(), inplace=True)
+                    entregues += len(bloco)
+                    yield bloco
+                return
+            except ValueError:
+                if not tipado:
+                    raise
+                # Valor não numérico: recomeça sem tipos a partir daqui
+                tipado = False
+
+###############################################################################
+# Índice de estágios (trechos contínuos de stage_no)
+###############################################################################
+class IndiceEstagios:
+    """
+    Índice compacto dos estágios de uma tabela: um trecho por sequência
+    contínua de linhas com o mesmo stage_no, como (estágio, linha inicial,
+    linha final + 1). É montado uma vez (uma passada sobre stage_no) e
+    cada consulta por estágio vira um fatiamento iloc, em vez de uma
+    máscara + cópia sobre a tabela inteira.
+
+    Um estágio que aparece em mais de um trecho (stage_no que volta) é
+    devolvido como a lista das posições, na ordem da tabela — o mesmo
+    resultado de df[df['stage_no'] == estagio].
+    """
+    __slots__ = ('estagios', 'inicios', 'fins')
+
+    def __init__(self, stage_no=()):
+        valores = pd.to_numeric(pd.Series(stage_no), errors='coerce').to_numpy(dtype=float)
+        if len(valores):
+            inicios = np.flatnonzero(np.r_[True, valores[1:] != valores[:-1]])
+            fins = np.r_[inicios[1:], len(valores)]
+        else:
+            inicios = fins = np.empty(0, dtype=np.int64)
+        estagios = valores[inicios]
+        validos = ~np.isnan(estagios)  # linhas sem stage_no não entram em estágio nenhum
+        self.estagios = estagios[validos]
+        self.inicios = inicios[validos]
+        self.fins = fins[validos]
+
+    @classmethod
+    def de_trechos(cls, trechos):
+        """Monta o índice a partir de [(estágio, linha inicial, linha final + 1), ...]."""
+        indice = cls()
+        if trechos:
+            estagios, inicios, fins = zip(*trechos)
+            indice.estagios = np.asarray(estagios, dtype=float)
+            indice.inicios = np.asarray(inicios, dtype=np.int64)
+            indice.fins = np.asarray(fins, dtype=np.int64)
+        return indice
+
+    def trechos(self):
+        """[(estágio, linha inicial, linha final + 1), ...] na ordem da tabela."""
+        return [(float(e), int(i), int(f))
+                for e, i, f in zip(self.estagios, self.inicios, self.fins)]
+
+    def posicoes(self, inicial, final=None):
+        """
+        Posições das linhas com inicial <= stage_no <= final (final =
+        inicial se omitido): um slice quando os trechos são vizinhos,
+        senão um array de posições.
+        """
+        final = inicial if final is None else final
+        sel = np.flatnonzero((self.estagios >= inicial) & (self.estagios <= final))
+        if not len(sel):
+            return slice(0, 0)
+        inicios, fins = self.inicios[sel], self.fins[sel]
+        if np.array_equal(inicios[1:], fins[:-1]):
+            return slice(int(inicios[0]), int(fins[-1]))
+        return np.concatenate([np.arange(i, f) for i, f in zip(inicios, fins)])
+
+    def fatiar(self, df, inicial, final=None):
+        """Linhas de 'df' dos estágios inicial..final (view quando contínuas)."""
+        return df.iloc[self.posicoes(inicial, final)]
+
+    def primeiro(self, df, coluna, estagio, padrao=0.0):
+        """Primeiro valor de 'coluna' no estágio (ou 'padrao')."""
+        sel = np.flatnonzero(self.estagios == estagio)
+        if not len(sel) or coluna not in df.columns:
+            return padrao
+        return df[coluna].iloc[self.inicios[sel[0]]]
+
+    def ultimo(self, df, coluna, estagio, padrao=0.0):
+        """Último valor de 'coluna' no estágio (ou 'padrao')."""
+        sel = np.flatnonzero(self.estagios == estagio)
+        if not len(sel) or coluna not in df.columns:
+            return padrao
+        return df[coluna].iloc[self.fins[sel[-1]] - 1]
+
 ###############################################################################
 # Classe para agrupar e calcular metadados (parte 2)
 ###############################################################################
@@ -51,15 +526,55 @@ class METADADOS_PARTE2:
       - h_init_c => h_init - ax_disp_c
       - height   => h_init - ax_disp_Original (alterado na DF)
       - Evitar zeros indevidos em fin_mass, fin_dry_mass, final_moisture
+
+    Guarda só escalares (campos fixos em __slots__): a tabela recebida é
+    consultada no construtor e não fica referenciada no objeto.
     """
-    def __init__(self, df, metadados, init_dry_mass, v_0, vol_solid, v_w_f, h_init):
+    __slots__ = (
+        # Lidos dos metadados
+        'w_0', 'w_f', 'init_mass', 'final_moisture', 'Saturacao_c', 'h_init',
+        'd_init', 'spec_grav', 'fin_mass', 'fin_dry_mass',
+        # Estágios
+        'B', 'Adensamento', 'CisalhamentoInicial', 'CisalhamentoFinal',
+        # Iniciais
+        'init_dry_mass', 'v_0', 'vol_solid', 'v_w_f', 'init_vol', 'init_void_ratio',
+        'void_ratio_f', 'final_void_vol', 'init_sat',
+        # Primeiros valores da tabela e dos estágios
+        'back_vol_0', 'back_press_0', 'rad_press_0', 'pore_press_0',
+        'ax_disp_s', 'ax_disp_0', 'hs', 'ax_disp_c', 'h_init_c',
+        'back_vol_c', 'void_ratio_c', 'vol_change_c', 'vol_change_f_c',
+        # Consolidação (lados A e B)
+        'cons_void_vol_A', 'cons_void_vol_B', 'post_cons_void_A', 'post_cons_void_B',
+        'consolidated_area_A', 'consolidated_area_B',
+        # Adicionais
+        'dry_unit_weight', 'D_saturation', 'D_spec_grav', 'pore_press_c',
+        'camb_p_A0', 'camb_p_B0',
+    )
+
+    # Campos gravados em MetadadosArquivo (ver exportar_metadados_arquivo)
+    CAMPOS_METADADOS_ARQUIVO = (
+        'w_0', 'w_f', 'init_mass', 'final_moisture', 'Saturacao_c', 'h_init',
+        'd_init', 'spec_grav', 'fin_mass', 'fin_dry_mass', 'init_dry_mass',
+        'v_0', 'vol_solid', 'v_w_f', 'init_void_ratio', 'void_ratio_f',
+        'final_void_vol', 'init_sat', 'back_vol_0', 'back_press_0',
+        'rad_press_0', 'pore_press_0', 'ax_disp_0', 'ax_disp_c', 'h_init_c',
+        'back_vol_c', 'void_ratio_c', 'vol_change_c', 'vol_change_f_c',
+        'cons_void_vol_A', 'cons_void_vol_B', 'post_cons_void_A',
+        'post_cons_void_B', 'consolidated_area_A', 'consolidated_area_B',
+        'dry_unit_weight', 'pore_press_c', 'camb_p_A0', 'camb_p_B0',
+    )
+
+    def __init__(self, df, metadados, init_dry_mass, v_0, vol_solid, v_w_f, h_init,
+                 indice=None):
         """
         Parâmetros principais:
           - df: DataFrame completo, já renomeado
           - metadados: dict contendo w_0, w_f, init_mass etc.
           - init_dry_mass, v_0, vol_solid, v_w_f, h_init: calculados fora
+          - indice: IndiceEstagios de 'df' (montado aqui se omitido)
         """
-        self.df = df.copy()
+        if indice is None:
+            indice = IndiceEstagios(df['stage_no'])
 
         # ---------------------------------------------------------------------
         # 1) Ler do dicionário de metadados
@@ -110,24 +625,24 @@ class METADADOS_PARTE2:
         # ---------------------------------------------------------------------
         # 4) Capturar primeiros valores do DF => back_vol_0, etc.
         # ---------------------------------------------------------------------
-        if not self.df.empty:
-            if 'back_vol_Original' in self.df.columns:
-                self.back_vol_0 = self.df['back_vol_Original'].iloc[0]
+        if not df.empty:
+            if 'back_vol_Original' in df.columns:
+                self.back_vol_0 = df['back_vol_Original'].iloc[0]
             else:
                 self.back_vol_0 = 0.0
 
-            if 'back_press_Original' in self.df.columns:
-                self.back_press_0 = self.df['back_press_Original'].iloc[0]
+            if 'back_press_Original' in df.columns:
+                self.back_press_0 = df['back_press_Original'].iloc[0]
             else:
                 self.back_press_0 = 0.0
 
-            if 'rad_press_Original' in self.df.columns:
-                self.rad_press_0 = self.df['rad_press_Original'].iloc[0]
+            if 'rad_press_Original' in df.columns:
+                self.rad_press_0 = df['rad_press_Original'].iloc[0]
             else:
                 self.rad_press_0 = 0.0
 
-            if 'pore_press_Original' in self.df.columns:
-                self.pore_press_0 = self.df['pore_press_Original'].iloc[0]
+            if 'pore_press_Original' in df.columns:
+                self.pore_press_0 = df['pore_press_Original'].iloc[0]
             else:
                 self.pore_press_0 = 0.0
         else:
@@ -139,7 +654,7 @@ class METADADOS_PARTE2:
         # ---------------------------------------------------------------------
         # 5) ax_disp_s => primeiro valor do estágio de Adensamento
         # ---------------------------------------------------------------------
-        ad_stage_data = self.df[self.df['stage_no'] == self.Adensamento].copy()
+        ad_stage_data = indice.fatiar(df, self.Adensamento)
         if not ad_stage_data.empty:
             if 'ax_disp_Original' in ad_stage_data.columns:
                 self.ax_disp_s = ad_stage_data['ax_disp_Original'].iloc[0]
@@ -149,8 +664,8 @@ class METADADOS_PARTE2:
             self.ax_disp_s = 0.0
 
         # ax_disp_0 => primeiro valor de ax_disp_Original de toda a coluna
-        if not self.df.empty and 'ax_disp_Original' in self.df.columns:
-            self.ax_disp_0 = self.df['ax_disp_Original'].iloc[0]
+        if not df.empty and 'ax_disp_Original' in df.columns:
+            self.ax_disp_0 = df['ax_disp_Original'].iloc[0]
         else:
             self.ax_disp_0 = 0.0
 
@@ -160,7 +675,7 @@ class METADADOS_PARTE2:
         # 6) ax_disp_c => primeiro valor do estágio de cisalhamento (CisalhamentoInicial)
         #    em ax_disp_Original 
         # ---------------------------------------------------------------------
-        cis_data_for_disp = self.df[self.df['stage_no'] == self.CisalhamentoInicial].copy()
+        cis_data_for_disp = indice.fatiar(df, self.CisalhamentoInicial)
         if not cis_data_for_disp.empty and 'ax_disp_Original' in cis_data_for_disp.columns:
             self.ax_disp_c = cis_data_for_disp['ax_disp_Original'].iloc[0]
         else:
@@ -191,17 +706,14 @@ class METADADOS_PARTE2:
         # ---------------------------------------------------------------------
         # 8) capturar vol_change_c e vol_change_f_c do cisalhamento
         # ---------------------------------------------------------------------
-        cis_stage_data = self.df[
-            (self.df['stage_no'] >= self.CisalhamentoInicial) &
-            (self.df['stage_no'] <= self.CisalhamentoFinal)
-        ].copy()
+        cis_stage_data = indice.fatiar(df, self.CisalhamentoInicial, self.CisalhamentoFinal)
         if not cis_stage_data.empty and 'back_vol' in cis_stage_data.columns:
             self.vol_change_c = cis_stage_data['back_vol'].iloc[0] - cis_stage_data['back_vol'].iloc[-1]
         else:
             self.vol_change_c = 0.0
 
         next_stage = self.CisalhamentoFinal + 1
-        next_stage_data = self.df[self.df['stage_no'] == next_stage].copy()
+        next_stage_data = indice.fatiar(df, next_stage)
         if not next_stage_data.empty and 'back_vol' in next_stage_data.columns:
             self.vol_change_f_c = (
                 next_stage_data['back_vol'].iloc[0] - next_stage_data['back_vol'].iloc[-1]
@@ -253,7 +765,7 @@ class METADADOS_PARTE2:
         )
 
         # pore_press_c => primeiro valor no estágio cisalhamento da coluna pore_press_Original
-        cis_data_for_pore = self.df[self.df['stage_no'] == self.CisalhamentoInicial].copy()
+        cis_data_for_pore = indice.fatiar(df, self.CisalhamentoInicial)
         if not cis_data_for_pore.empty and 'pore_press_Original' in cis_data_for_pore.columns:
             self.pore_press_c = cis_data_for_pore['pore_press_Original'].iloc[0]
         else:
@@ -272,15 +784,22 @@ class METADADOS_PARTE2:
         Exibe todos os atributos calculados para inspeção/debug.
         """
         print("====================== DUMP DOS METADADOS ======================")
-        for attr, value in vars(self).items():
+        for attr, value in self.get_all_attributes().items():
             print(f"{attr} => {value}")
         print("===============================================================\n")
 
     def get_all_attributes(self):
         """
-        Retorna todas as variáveis calculadas como dicionário.
+        Retorna todas as variáveis calculadas como dicionário (novo a cada chamada).
         """
-        return vars(self)
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    def exportar_metadados_arquivo(self):
+        """
+        Campos do METADADOS_PARTE2 gravados em MetadadosArquivo, como
+        float do Python (valores numpy convertidos).
+        """
+        return {campo: float(getattr(self, campo)) for campo in self.CAMPOS_METADADOS_ARQUIVO}
 
 
 ###############################################################################
@@ -290,13 +809,13 @@ class CisalhamentoData:
     """
     Exemplo de classe para filtrar e checar dados do estágio de cisalhamento.
     """
-    def __init__(self, df, metadados):
+    def __init__(self, df, metadados, indice=None):
         cis_inicial = int(metadados.get("_cis_inicial", 8))
         cis_final   = int(metadados.get("_cis_final", 8))
 
-        self.df_cisalhamento = df[
-            (df['stage_no'] >= cis_inicial) & (df['stage_no'] <= cis_final)
-        ].copy()
+        if indice is None:
+            indice = IndiceEstagios(df['stage_no'])
+        self.df_cisalhamento = indice.fatiar(df, cis_inicial, cis_final)
 
         if self.df_cisalhamento.empty:
             raise ValueError(
@@ -353,362 +872,702 @@ class CisalhamentoData:
         }
 
 ###############################################################################
-# Classe principal TableProcessor
+# Etapas de cálculo da tabela (usadas pelo TableProcessor e pelo modo tail)
 ###############################################################################
-class TableProcessor:
-    @staticmethod
-    def process_table_data(db_manager, metadados, gds_file):
+# Colunas gravadas em EnsaiosTriaxiais, na ordem
+GDS_COLUNAS_SALVAR = [
+    # Originais
+    "stage_no","time_test_start","time_stage_start",
+    "rad_press_Original","rad_vol_Original","back_press_Original",
+    "back_vol_Original","load_cell_Original","pore_press_Original",
+    "ax_disp_Original","ax_force_Original","ax_strain_Original",
+    "avg_diam_chg_Original","rad_strain_Original","eff_ax_stress_Original",
+    "eff_rad_stress_Original","dev_stress_Original","total_stress_rat_Original",
+    "eff_stress_rat_Original","cur_area_Original","shear_strain_Original",
+    "camb_p_Original","eff_camb_p_Original","max_shear_stress_Original",
+    "vol_change_Original","b_value_Original","mean_stress_Original",
+
+    # Novas (calculadas)
+    "ax_strain","ax_force","rad_vol_delta","rad_vol","rad_press",
+    "back_press","back_vol_delta","back_vol","ax_disp","ax_disp_delta",
+    "cur_area_A","cur_area_B","diameter_A","diameter_B","rad_strain_A","rad_strain_B",
+    "height","vol_A","vol_B","vol_strain_A","vol_strain_B","void_ratio_A","void_ratio_B",
+    "load","ax_stress","eff_ax_stress_A","eff_ax_stress_B","eff_rad_stress","dev_stress_A",
+    "dev_stress_B","eff_stress_rat_A","eff_stress_rat_B","shear_strain_A","shear_strain_B",
+    "camb_p_A","camb_p_B","eff_camb_A","eff_camb_B","max_shear_stress_A","max_shear_stress_B",
+    "avg_mean_stress","avg_eff_stress_A","avg_eff_stress_B","b_val","excessPWP","su_A","su_B",
+    "nqp_B","nqp_A","m_A","m_B","du_kpa"
+]
+
+# Originais (lidas do .gds) e calculadas, na ordem de GDS_COLUNAS_SALVAR
+GDS_COLUNAS_ORIGINAIS = GDS_COLUNAS_SALVAR[:GDS_COLUNAS_SALVAR.index("ax_strain")]
+GDS_COLUNAS_CALCULADAS = GDS_COLUNAS_SALVAR[len(GDS_COLUNAS_ORIGINAIS):]
+
+# Colunas acumuladas (diff + cumsum) e o estado levado de um bloco para o outro
+_COLUNAS_ACUMULADAS = ('rad_vol', 'back_vol', 'ax_disp')
+
+# Atributos do METADADOS_PARTE2 que entram no cálculo linha a linha.
+# Enquanto eles não mudam, linhas novas podem ser calculadas sozinhas.
+CONSTANTES_LINHAS = (
+    "CisalhamentoInicial", "Adensamento", "ax_disp_c", "hs", "back_vol_c",
+    "vol_change_f_c", "pore_press_c", "consolidated_area_A",
+    "consolidated_area_B", "cons_void_vol_B", "void_ratio_f",
+)
+
+
+def _diff_cumsum(coluna, anterior, nome, inicios=None):
+    """
+    diff().fillna(0) e cumsum() de uma coluna "_Original". Com 'anterior'
+    (estado do bloco anterior), a primeira diferença usa o último valor
+    já lido e a soma continua do último acumulado, dando o mesmo resultado
+    que o cálculo sobre a tabela inteira.
+
+    Com 'inicios' (posições onde começa cada ensaio de uma tabela
+    empilhada, ver calcular_amostra), diff e cumsum recomeçam em cada um.
+    """
+    if inicios is not None:
+        valores = coluna.to_numpy(dtype=float)
+        delta = np.diff(valores, prepend=np.nan)
+        delta[inicios] = np.nan
+        delta[np.isnan(delta)] = 0.0
+        acumulado = np.empty_like(delta)
+        for ini, fim in zip(inicios, list(inicios[1:]) + [len(delta)]):
+            np.cumsum(delta[ini:fim], out=acumulado[ini:fim])
+        return (pd.Series(delta, index=coluna.index),
+                pd.Series(acumulado, index=coluna.index))
+
+    if anterior is None:
+        delta = coluna.diff().fillna(0.0)
+        return delta, delta.cumsum()
+
+    valores = coluna.to_numpy(dtype=float)
+    delta = np.diff(valores, prepend=anterior[f'{nome}_Original'])
+    delta[np.isnan(delta)] = 0.0
+    acumulado = np.cumsum(np.concatenate(([anterior[f'{nome}_cumsum']], delta)))[1:]
+    return (pd.Series(delta, index=coluna.index),
+            pd.Series(acumulado, index=coluna.index))
+
+
+@medido("mapeamento_cabecalho", linhas=len)
+def preparar_tabela(df):
+    """
+    Passos 2 a 4 do process_table_data: mapeia os cabeçalhos, confere as
+    colunas obrigatórias e garante as colunas-base numéricas.
+    Retorna um novo DataFrame (o recebido não é alterado).
+    """
+    # Remover espaços extras e mapear cabeçalhos para colunas "_Original"
+    # (sem alterar o df recebido)
+    df = map_gds_columns(df)
+
+    # 3) Checar colunas obrigatórias
+    required_cols = [
+        "stage_no",
+        "time_test_start",
+        "time_stage_start",
+        "rad_press_Original",
+        "rad_vol_Original",
+        "back_press_Original",
+        "back_vol_Original",
+        "load_cell_Original",
+        "pore_press_Original",
+        "ax_disp_Original",
+        "ax_force_Original",
+    ]
+    missing_cols = [c for c in required_cols if c not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Colunas faltantes: {missing_cols}")
+
+    # 4) Garantir colunas-base numéricas (já vêm tipadas do read_gds;
+    #    só um df recebido sem esquema precisa de conversão)
+    numeric_base = [
+        "rad_press_Original", "rad_vol_Original", "back_press_Original",
+        "back_vol_Original",  "load_cell_Original", "pore_press_Original",
+        "ax_disp_Original",   "ax_force_Original"
+    ]
+    df = _garantir_numerico(df, numeric_base)
+    return df
+
+
+def constantes_amostra(metadados):
+    """
+    Passo 5 do process_table_data: dimensões e volumes iniciais do corpo
+    de prova a partir dos metadados.
+
+    Returns:
+        tuple: (h_init, d_init, init_dry_mass, v_0, vol_solid, v_w_f)
+    """
+    w_0       = safe_float_conversion(metadados.get('w_0', 0))
+    w_f       = safe_float_conversion(metadados.get('w_f', 0))
+    init_mass = safe_float_conversion(metadados.get('init_mass', 0))
+    h_init    = safe_float_conversion(metadados.get('h_init', 1))
+    d_init    = safe_float_conversion(metadados.get('d_init', 1))
+    spec_grav = safe_float_conversion(metadados.get('spec_grav', 1))
+
+    init_dry_mass = safe_divide(init_mass, (1 + w_0), 0.0)
+    v_0           = h_init * (np.pi * (d_init ** 2) / 4.0)
+    vol_solid     = safe_divide(init_dry_mass * 1000.0, spec_grav, 0.0)
+    v_w_f         = w_f * init_dry_mass * 1000.0
+    return h_init, d_init, init_dry_mass, v_0, vol_solid, v_w_f
+
+
+def calcular_colunas_base(df, h_init, v_0, anterior=None, inicios=None):
+    """
+    Passo 6 do process_table_data: colunas que só dependem da própria
+    linha e dos acumulados (diff/cumsum). Altera 'df' e retorna o estado
+    para continuar num próximo bloco de linhas (ver _diff_cumsum).
+
+    Com 'inicios' (tabela empilhada de vários ensaios), h_init e v_0 são
+    arrays com um valor por linha e nenhum estado é retornado.
+    """
+    df['ax_force'] = df['load_cell_Original']
+    df['load']     = df['load_cell_Original']
+
+    # (A) Volume radial
+    df['rad_vol_delta'], df['rad_vol_cumsum'] = _diff_cumsum(df['rad_vol_Original'], anterior, 'rad_vol', inicios)
+    df['rad_vol']        = df['rad_vol_cumsum']
+
+    df['rad_press']  = df['rad_press_Original']
+    df['back_press'] = df['back_press_Original']
+
+    # (B) Volume back
+    df['back_vol_delta'], df['back_vol_cumsum'] = _diff_cumsum(df['back_vol_Original'], anterior, 'back_vol', inicios)
+    df['back_vol']        = df['back_vol_cumsum']
+
+    # (C) Desloc. axial
+    df['ax_disp_delta'], df['ax_disp_cumsum'] = _diff_cumsum(df['ax_disp_Original'], anterior, 'ax_disp', inicios)
+    df['ax_disp']        = df['ax_disp_cumsum']
+
+    # (D) height = h_init - ax_disp_Original (pedido)
+    df['height'] = h_init - df['ax_disp_Original']
+
+    # (E) vol_A e vol_B (iguais se for caso isotrópico)
+    df['vol_A'] = v_0 - df['back_vol']
+    df['vol_B'] = v_0 - df['back_vol']
+
+    # (F) Área corrente lado A
+    df['cur_area_A'] = (
+        safe_divide(df['vol_A'], df['height'].replace(0, np.nan), 0.0)
+    ) * 1e-6
+
+    if df.empty or inicios is not None:
+        return anterior
+    estado = {}
+    for nome in _COLUNAS_ACUMULADAS:
+        estado[f'{nome}_Original'] = float(df[f'{nome}_Original'].iloc[-1])
+        estado[f'{nome}_cumsum'] = float(df[f'{nome}_cumsum'].iloc[-1])
+    return estado
+
+
+###############################################################################
+# Colunas derivadas (passo 8) declaradas com as suas dependências
+###############################################################################
+# nome -> (dependências, função). Cada função recebe o ColunasDerivadas
+# (constantes do ensaio) e os valores das dependências, na ordem declarada.
+# A ordem de registro é a ordem em que as colunas entram no DataFrame.
+COLUNAS_DERIVADAS = {}
+
+
+def _derivada(nome, *dependencias):
+    """Registra a função como cálculo da coluna 'nome' (decorador)."""
+    def registrar(funcao):
+        COLUNAS_DERIVADAS[nome] = (dependencias, funcao)
+        return funcao
+    return registrar
+
+
+def _m_graus(nqp):
+    # m = arcsin( (3*nqp) / (6+nqp) ), em graus
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.degrees(np.arcsin(np.clip((3.0*nqp)/(6.0+nqp), -1.0, 1.0)))
+
+
+# -- A) Axial strain ajustado para cisalhamento --
+# (ax_disp - ax_disp_c)/(h_init - ax_disp) se >= cis_inicial
+@_derivada('ax_strain', 'stage_no', 'ax_disp')
+def _ax_strain(c, stage_no, ax_disp):
+    ax_disp = np.asarray(ax_disp, dtype=float)
+    return np.where(
+        stage_no >= c.cis_stage,
+        safe_divide_array(ax_disp - c.ax_disp_c, c.h_init - ax_disp, 0.0),
+        safe_divide_array(ax_disp, c.h_init, 0.0)
+    )
+
+# Du (pore pressure excess) = (pore_press_Original - ppc inicial)
+@_derivada('du_kpa', 'pore_press_Original')
+def _du_kpa(c, pore_press):
+    return pore_press - c.pore_press_c
+
+@_derivada('eff_rad_stress', 'rad_press_Original', 'pore_press_Original')
+def _eff_rad_stress(c, rad_press, pore_press):
+    return rad_press - pore_press
+
+
+def _registrar_lado(lado, cons_void_vol):
+    """
+    Colunas do lado 'A' ou 'B' (mesmas fórmulas; muda o volume de vazios
+    pós-consolidação e a área consolidada).
+    """
+    # Deformação volumétrica: (back_vol_c - back_vol) / (cons_void_vol + vol_solid)
+    @_derivada(f'vol_strain_{lado}', 'back_vol')
+    def _vol_strain(c, back_vol):
+        return safe_divide_array(c.back_vol_c - np.asarray(back_vol, dtype=float),
+                                 cons_void_vol(c) + c.vol_solid, 0.0)
+
+    # Área corrigida, dependendo de vol_strain e ax_strain
+    @_derivada(f'cur_area_{lado}', f'vol_strain_{lado}', 'ax_strain')
+    def _cur_area(c, vol_strain, ax_strain):
+        area = getattr(c, f'consolidated_area_{lado}')
+        return area * safe_divide_array(1 - vol_strain, 1 - ax_strain, 0.0)
+
+    # dev_stress = load / cur_area
+    @_derivada(f'dev_stress_{lado}', 'load', f'cur_area_{lado}')
+    def _dev_stress(c, load, cur_area):
+        return safe_divide_array(np.asarray(load, dtype=float), cur_area, 0.0)
+
+    @_derivada(f'eff_ax_stress_{lado}', f'dev_stress_{lado}', 'eff_rad_stress')
+    def _eff_ax_stress(c, dev_stress, eff_rad_stress):
+        return dev_stress + eff_rad_stress
+
+    @_derivada(f'eff_camb_{lado}', 'eff_rad_stress', f'eff_ax_stress_{lado}')
+    def _eff_camb(c, eff_rad_stress, eff_ax_stress):
+        return (eff_rad_stress*2.0 + eff_ax_stress)/3.0
+
+    # nqp = dev_stress / eff_camb ; m em graus
+    @_derivada(f'nqp_{lado}', f'dev_stress_{lado}', f'eff_camb_{lado}')
+    def _nqp(c, dev_stress, eff_camb):
+        return safe_divide_array(dev_stress, eff_camb, 0.0)
+
+    @_derivada(f'm_{lado}', f'nqp_{lado}')
+    def _m(c, nqp):
+        return _m_graus(nqp)
+
+    # void_ratio = (cons_void_vol - (back_vol_c - back_vol_Original)) / vol_solid
+    @_derivada(f'void_ratio_{lado}', 'back_vol_Original')
+    def _void_ratio(c, back_vol_orig):
+        return safe_divide_array(
+            cons_void_vol(c) - (c.back_vol_c - np.asarray(back_vol_orig, dtype=float)),
+            c.vol_solid, 0.0
+        )
+
+    # su = dev_stress / 2
+    @_derivada(f'su_{lado}', f'dev_stress_{lado}')
+    def _su(c, dev_stress):
+        return dev_stress / 2.0
+
+# Lado A: volume de vazios do cons_vol; lado B: o do METADADOS_PARTE2
+_registrar_lado('A', lambda c: c.cons_void_vol_A)
+_registrar_lado('B', lambda c: c.cons_void_vol_B)
+
+# a) ax_stress = load / cur_area_A (por convenção do lado A).
+#    safe_divide recebe Series e devolve o valor padrão (0.0) — mantido.
+@_derivada('ax_stress', 'load', 'cur_area_A')
+def _ax_stress(c, load, cur_area_A):
+    return safe_divide(load, pd.Series(cur_area_A).replace(0, np.nan), 0.0)
+
+# b) diameter_A e diameter_B (2 * sqrt( area * 1e6 / pi ))
+#    (área negativa vira 0, como no Series.clip(lower=0.0))
+@_derivada('diameter_A', 'cur_area_A')
+def _diameter_A(c, cur_area):
+    return 2.0 * np.sqrt(np.where(cur_area < 0.0, 0.0, cur_area)*1e6 / np.pi)
+
+@_derivada('diameter_B', 'cur_area_B')
+def _diameter_B(c, cur_area):
+    return 2.0 * np.sqrt(np.where(cur_area < 0.0, 0.0, cur_area)*1e6 / np.pi)
+
+# c) rad_strain_A e rad_strain_B
+@_derivada('rad_strain_A', 'diameter_A')
+def _rad_strain_A(c, diameter):
+    return safe_divide_array((diameter - c.d_init), c.d_init, 0.0)*100.0
+
+@_derivada('rad_strain_B', 'diameter_B')
+def _rad_strain_B(c, diameter):
+    return safe_divide_array((diameter - c.d_init), c.d_init, 0.0)*100.0
+
+# d) shear_strain_A e shear_strain_B
+@_derivada('shear_strain_A', 'ax_strain', 'vol_strain_A')
+def _shear_strain_A(c, ax_strain, vol_strain):
+    return (2.0*(ax_strain - vol_strain))/3.0
+
+@_derivada('shear_strain_B', 'ax_strain', 'vol_strain_B')
+def _shear_strain_B(c, ax_strain, vol_strain):
+    return (2.0*(ax_strain - vol_strain))/3.0
+
+# e) max_shear_stress_A/B
+@_derivada('max_shear_stress_A', 'dev_stress_A')
+def _max_shear_stress_A(c, dev_stress):
+    return dev_stress/2.0
+
+@_derivada('max_shear_stress_B', 'dev_stress_B')
+def _max_shear_stress_B(c, dev_stress):
+    return dev_stress/2.0
+
+# f) avg_mean_stress = (ax_stress + rad_press) / 2
+@_derivada('avg_mean_stress', 'ax_stress', 'rad_press')
+def _avg_mean_stress(c, ax_stress, rad_press):
+    return (ax_stress + rad_press)/2.0
+
+# g) avg_eff_stress_A = (eff_ax_stress_A + eff_rad_stress)/2
+@_derivada('avg_eff_stress_A', 'eff_ax_stress_A', 'eff_rad_stress')
+def _avg_eff_stress_A(c, eff_ax_stress, eff_rad_stress):
+    return (eff_ax_stress + eff_rad_stress)/2.0
+
+@_derivada('avg_eff_stress_B', 'eff_ax_stress_B', 'eff_rad_stress')
+def _avg_eff_stress_B(c, eff_ax_stress, eff_rad_stress):
+    return (eff_ax_stress + eff_rad_stress)/2.0
+
+# h) b_val e excessPWP
+#    b_val não definido => np.nan
+@_derivada('b_val')
+def _b_val(c):
+    return np.nan
+
+@_derivada('excessPWP', 'pore_press_Original', 'back_press')
+def _excess_pwp(c, pore_press, back_press):
+    return pore_press - back_press
+
+# i) Por conveniência, "eff_stress_rat_A" e "eff_stress_rat_B"
+#    se quisermos igualar nqp_A / nqp_B
+@_derivada('eff_stress_rat_A', 'nqp_A')
+def _eff_stress_rat_A(c, nqp):
+    return nqp
+
+@_derivada('eff_stress_rat_B', 'nqp_B')
+def _eff_stress_rat_B(c, nqp):
+    return nqp
+
+
+def constantes_derivadas(metadados_parte2, h_init, v_0, vol_solid, d_init):
+    """
+    Constantes do ensaio usadas pelas colunas do passo 8 (as mesmas do
+    METADADOS_PARTE2, ver CONSTANTES_LINHAS), como dict {nome: valor}.
+    """
+    # vol_change_s e cons_vol p/ consolidação
+    # (já vem em metadados_parte2, mas repetimos para colunas)
+    if metadados_parte2.hs < 0:
+        vol_change_s = 0.0
+    else:
+        vol_change_s = 3.0 * v_0 * safe_divide(metadados_parte2.hs, h_init, 0.0)
+    cons_vol = v_0 - metadados_parte2.vol_change_f_c - vol_change_s
+
+    return {
+        'h_init': h_init,
+        'vol_solid': vol_solid,
+        'd_init': d_init,
+        'cis_stage': int(metadados_parte2.CisalhamentoInicial),
+        'ax_disp_c': metadados_parte2.ax_disp_c,
+        'pore_press_c': metadados_parte2.pore_press_c,
+        # back_vol_c = último back_vol do adensamento (o mesmo valor de METADADOS_PARTE2)
+        'back_vol_c': metadados_parte2.back_vol_c,
+        'cons_void_vol_A': cons_vol - vol_solid,
+        'cons_void_vol_B': metadados_parte2.cons_void_vol_B,
+        'consolidated_area_A': metadados_parte2.consolidated_area_A,
+        'consolidated_area_B': metadados_parte2.consolidated_area_B,
+    }
+
+
+class ColunasDerivadas:
+    """
+    Avaliação sob demanda das colunas do passo 8: c['nqp_A'] calcula
+    dev_stress_A e eff_camb_A (e o que eles pedirem) uma única vez e
+    guarda os valores. Só as colunas pedidas e as suas dependências são
+    calculadas.
+
+    As 'constantes' (constantes_derivadas) viram atributos: escalares para
+    um ensaio, ou arrays com um valor por linha para uma tabela empilhada
+    de vários ensaios (calcular_amostra) — as fórmulas são as mesmas.
+    """
+    def __init__(self, df, constantes):
+        self.df = df
+        self._valores = {}
+        for nome, valor in constantes.items():
+            setattr(self, nome, valor)
+
+    def __getitem__(self, nome):
+        if nome not in self._valores:
+            if nome in COLUNAS_DERIVADAS:
+                dependencias, funcao = COLUNAS_DERIVADAS[nome]
+                valor = funcao(self, *[self[d] for d in dependencias])
+                if np.ndim(valor) == 0:
+                    valor = np.full(len(self.df), valor, dtype=float)
+            else:
+                valor = self.df[nome].to_numpy()
+            self._valores[nome] = valor
+        return self._valores[nome]
+
+    def calcular(self, colunas=None):
         """
-        Faz a leitura do arquivo GDS, localiza o cabeçalho,
-        ajusta as colunas e realiza os cálculos, retornando um dict
-        com DataFrame final e a instância METADADOS_PARTE2.
-        Inclui a mudança em 'height = h_init - ax_disp_Original'.
-        Garante a criação e o preenchimento das colunas solicitadas.
+        Calcula 'colunas' (padrão: todas as derivadas, na ordem de registro)
+        e as grava no DataFrame. Retorna o DataFrame.
         """
-        try:
-            # 1) Encontrar a linha do cabeçalho no .gds
-            header_line = find_header_line(gds_file)
-            if header_line is None:
-                raise ValueError(
-                    f"Cabeçalho com 'Stage Number' não encontrado no arquivo {gds_file}."
-                )
-
-            # 2) Ler CSV a partir dessa linha do cabeçalho
-            df = pd.read_csv(
-                gds_file,
-                encoding='latin-1',
-                skiprows=header_line,  # Pular as linhas até 'Stage Number'
-                header=0               # A próxima linha é o nome das colunas
-            )
+        colunas = list(COLUNAS_DERIVADAS) if colunas is None else colunas
+        for nome in colunas:
+            self.df[nome] = self[nome]
+        return self.df
 
-            # Debug (opcional)
-            print("DEBUG - COLUNAS LIDAS DO ARQUIVO:")
-            print(df.columns.tolist())
-            print("DEBUG - PRIMEIRAS LINHAS DO DATAFRAME LIDO:")
-            print(df.head(5))
-
-            # Remover espaços extras dos nomes de colunas
-            df.rename(columns=lambda x: x.strip(), inplace=True)
-
-            # Mapeamento de cabeçalhos para colunas "_Original"
-            header_mapping = {
-                "Stage Number":                 "stage_no",
-                "Time since start of test (s)": "time_test_start",
-                "Time since start of stage (s)": "time_stage_start",
-                "Radial Pressure (kPa)":        "rad_press_Original",
-                "Radial Volume (mm³)":          "rad_vol_Original",
-                "Back Pressure (kPa)":          "back_press_Original",
-                "Back Volume (mm³)":            "back_vol_Original",
-                "Load Cell (kN)":               "load_cell_Original",
-                "Pore Pressure (kPa)":          "pore_press_Original",
-                "Axial Displacement (mm)":      "ax_disp_Original",
-                "Axial Force (kN)":             "ax_force_Original",
-                "Axial Strain (%)":             "ax_strain_Original",
-                "Av Diameter Change (mm)":      "avg_diam_chg_Original",
-                "Radial Strain (%)":            "rad_strain_Original",
-                "Axial Stress (kPa)":           "ax_strain_Original_2",
-                "Eff. Axial Stress (kPa)":      "eff_ax_stress_Original",
-                "Eff. Radial Stress (kPa)":     "eff_rad_stress_Original",
-                "Deviator Stress (kPa)":        "dev_stress_Original",
-                "Total Stress Ratio":           "total_stress_rat_Original",
-                "Eff. Stress Ratio":            "eff_stress_rat_Original",
-                "Current Area (mm²)":           "cur_area_Original",
-                "Shear Strain (%)":             "shear_strain_Original",
-                "Cambridge p (kPa)":            "camb_p_Original",
-                "Eff. Cambridge p' (kPa)":      "eff_camb_p_Original",
-                "Max Shear Stress t (kPa)":     "max_shear_stress_Original",
-                "Volume Change (mm³)":          "vol_change_Original",
-                "B Value":                      "b_value_Original",
-                "Mean Stress s/Eff. Axial Stress 2": "mean_stress_Original",
-            }
-            df.rename(columns=header_mapping, inplace=True)
 
-            # 3) Checar colunas obrigatórias
-            required_cols = [
-                "stage_no",
-                "time_test_start",
-                "time_stage_start",
-                "rad_press_Original",
-                "rad_vol_Original",
-                "back_press_Original",
-                "back_vol_Original",
-                "load_cell_Original",
-                "pore_press_Original",
-                "ax_disp_Original",
-                "ax_force_Original",
-            ]
-            missing_cols = [c for c in required_cols if c not in df.columns]
-            if missing_cols:
-                raise ValueError(f"Colunas faltantes: {missing_cols}")
-
-            # 4) Converter colunas-base para numérico (coerce)
-            numeric_base = [
-                "rad_press_Original", "rad_vol_Original", "back_press_Original",
-                "back_vol_Original",  "load_cell_Original", "pore_press_Original",
-                "ax_disp_Original",   "ax_force_Original"
-            ]
-            df[numeric_base] = df[numeric_base].apply(pd.to_numeric, errors='coerce')
-
-            # 5) Ler metadados principais p/ cálculo inicial
-            w_0       = safe_float_conversion(metadados.get('w_0', 0))
-            w_f       = safe_float_conversion(metadados.get('w_f', 0))
-            init_mass = safe_float_conversion(metadados.get('init_mass', 0))
-            h_init    = safe_float_conversion(metadados.get('h_init', 1))
-            d_init    = safe_float_conversion(metadados.get('d_init', 1))
-            spec_grav = safe_float_conversion(metadados.get('spec_grav', 1))
-
-            init_dry_mass = safe_divide(init_mass, (1 + w_0), 0.0)
-            v_0           = h_init * (np.pi * (d_init ** 2) / 4.0)
-            vol_solid     = safe_divide(init_dry_mass * 1000.0, spec_grav, 0.0)
-            v_w_f         = w_f * init_dry_mass * 1000.0
-
-            # 6) Colunas derivadas “base”
-            df['ax_force'] = df['load_cell_Original']
-            df['load']     = df['load_cell_Original']
-
-            # (A) Volume radial
-            df['rad_vol_delta']  = df['rad_vol_Original'].diff().fillna(0.0)
-            df['rad_vol_cumsum'] = df['rad_vol_delta'].cumsum()
-            df['rad_vol']        = df['rad_vol_cumsum']
-
-            df['rad_press']  = df['rad_press_Original']
-            df['back_press'] = df['back_press_Original']
-
-            # (B) Volume back
-            df['back_vol_delta']  = df['back_vol_Original'].diff().fillna(0.0)
-            df['back_vol_cumsum'] = df['back_vol_delta'].cumsum()
-            df['back_vol']        = df['back_vol_cumsum']
-
-            # (C) Desloc. axial
-            df['ax_disp_delta']  = df['ax_disp_Original'].diff().fillna(0.0)
-            df['ax_disp_cumsum'] = df['ax_disp_delta'].cumsum()
-            df['ax_disp']        = df['ax_disp_cumsum']
-
-            # (D) height = h_init - ax_disp_Original (pedido)
-            df['height'] = h_init - df['ax_disp_Original']
-
-            # (E) vol_A e vol_B (iguais se for caso isotrópico)
-            df['vol_A'] = v_0 - df['back_vol']
-            df['vol_B'] = v_0 - df['back_vol']
-
-            # (F) Área corrente lado A
-            df['cur_area_A'] = (
-                safe_divide(df['vol_A'], df['height'].replace(0, np.nan), 0.0)
-            ) * 1e-6
-
-            # 7) Instanciar METADADOS_PARTE2 e recalcular metadados
-            metadados_parte2 = METADADOS_PARTE2(
-                df=df,
-                metadados=metadados,
-                init_dry_mass=init_dry_mass,
-                v_0=v_0,
-                vol_solid=vol_solid,
-                v_w_f=v_w_f,
-                h_init=h_init
-            )
+def calcular_colunas_derivadas(df, metadados_parte2, h_init, v_0, vol_solid, d_init,
+                               colunas=None):
+    """
+    Passo 8 do process_table_data: colunas calculadas linha a linha com as
+    constantes do METADADOS_PARTE2 (ver CONSTANTES_LINHAS). Altera 'df'.
 
-            # -- A) Axial strain ajustado para cisalhamento --
-            cis_stage = int(metadados_parte2.CisalhamentoInicial)
-            def calc_ax_strain(row):
-                # (ax_disp - ax_disp_c)/(h_init - ax_disp) se >= cis_inicial
-                if row['stage_no'] >= cis_stage:
-                    return safe_divide(
-                        (row['ax_disp'] - metadados_parte2.ax_disp_c),
-                        (h_init - row['ax_disp']),
-                        0.0
-                    )
-                else:
-                    return safe_divide(row['ax_disp'], h_init, 0.0)
-            df['ax_strain'] = df.apply(calc_ax_strain, axis=1)
-
-            # 8) Calcular vol_change_s e vol_change_f_c p/ consolidação
-            #    (já vem em metadados_parte2, mas repetimos para colunas)
-            ad_data = df[df['stage_no'] == metadados_parte2.Adensamento]
-            if not ad_data.empty:
-                back_vol_c = ad_data['back_vol'].iloc[-1]
-            else:
-                back_vol_c = 0.0
+    Com 'colunas', só essas (e as suas dependências) são calculadas e
+    gravadas; sem, todas as de COLUNAS_DERIVADAS (ver ColunasDerivadas).
+    """
+    constantes = constantes_derivadas(metadados_parte2, h_init, v_0, vol_solid, d_init)
+    ColunasDerivadas(df, constantes).calcular(colunas)
 
-            if metadados_parte2.hs < 0:
-                vol_change_s = 0.0
-            else:
-                vol_change_s = 3.0 * v_0 * safe_divide(metadados_parte2.hs, h_init, 0.0)
-
-            cons_vol = v_0 - metadados_parte2.vol_change_f_c - vol_change_s
-            cons_void_vol_A = cons_vol - vol_solid
-            cons_void_vol_B = vol_solid * metadados_parte2.void_ratio_f
-
-            # (A) Deformação volumétrica lado A
-            def calc_vol_strain_A(row):
-                # (back_vol_c - back_vol) / (cons_void_vol_A + vol_solid)
-                return safe_divide(
-                    (back_vol_c - row['back_vol']),
-                    (cons_void_vol_A + vol_solid),
-                    0.0
-                )
-            df['vol_strain_A'] = df.apply(calc_vol_strain_A, axis=1)
-
-            # (B) Du (pore pressure excess) = (pore_press_Original - ppc inicial)
-            df['du_kpa'] = df['pore_press_Original'] - metadados_parte2.pore_press_c
-
-            # (C) Eff radial stress
-            df['eff_rad_stress'] = df['rad_press_Original'] - df['pore_press_Original']
-
-            # (D) Área lado A corrigida, dependendo de vol_strain_A e ax_strain
-            def calc_cur_area_A(row):
-                vs_ = row['vol_strain_A']
-                as_ = row['ax_strain']
-                return metadados_parte2.consolidated_area_A * safe_divide((1 - vs_), (1 - as_), 0.0)
-            df['cur_area_A'] = df.apply(calc_cur_area_A, axis=1)
-
-            # (E) dev_stress_A = load / cur_area_A
-            df['dev_stress_A'] = df.apply(
-                lambda r: safe_divide(r['load'], r['cur_area_A'], 0.0),
-                axis=1
-            )
-            # Eixo axial efetivo lado A
-            df['eff_ax_stress_A'] = df['dev_stress_A'] + df['eff_rad_stress']
-            df['eff_camb_A'] = (df['eff_rad_stress']*2.0 + df['eff_ax_stress_A'])/3.0
-
-            # (F) nqp_A = dev_stress_A / eff_camb_A
-            df['nqp_A'] = df.apply(lambda r: safe_divide(r['dev_stress_A'], r['eff_camb_A'], 0.0), axis=1)
-            # (G) m_A = arcsin( (3*nqp) / (6+nqp) ), em graus
-            df['m_A'] = df['nqp_A'].apply(
-                lambda val: np.degrees(np.arcsin(np.clip((3.0*val)/(6.0+val), -1.0, 1.0)))
-            )
 
-            # (H) void_ratio_A
-            def calc_void_ratio_A(row):
-                # (cons_void_vol_A - (back_vol_c - back_vol_Original)) / vol_solid
-                return safe_divide(
-                    (cons_void_vol_A - (back_vol_c - row['back_vol_Original'])),
-                    vol_solid,
-                    0.0
-                )
-            df['void_ratio_A'] = df.apply(calc_void_ratio_A, axis=1)
-
-            # (I) su_A = dev_stress_A / 2
-            df['su_A'] = df['dev_stress_A'] / 2.0
-
-            # -- Lado B --
-            def calc_vol_strain_B(row):
-                return safe_divide(
-                    (back_vol_c - row['back_vol']),
-                    (metadados_parte2.cons_void_vol_B + vol_solid),
-                    0.0
-                )
-            df['vol_strain_B'] = df.apply(calc_vol_strain_B, axis=1)
-
-            def calc_cur_area_B(row):
-                vs_b = row['vol_strain_B']
-                as_  = row['ax_strain']
-                return metadados_parte2.consolidated_area_B * safe_divide((1 - vs_b), (1 - as_), 0.0)
-            df['cur_area_B'] = df.apply(calc_cur_area_B, axis=1)
-
-            df['dev_stress_B'] = df.apply(
-                lambda r: safe_divide(r['load'], r['cur_area_B'], 0.0),
-                axis=1
-            )
-            df['eff_ax_stress_B'] = df['dev_stress_B'] + df['eff_rad_stress']
-            df['eff_camb_B'] = (df['eff_rad_stress']*2.0 + df['eff_ax_stress_B'])/3.0
-            df['nqp_B'] = df.apply(lambda r: safe_divide(r['dev_stress_B'], r['eff_camb_B'], 0.0), axis=1)
-            df['m_B'] = df['nqp_B'].apply(
-                lambda val: np.degrees(np.arcsin(np.clip((3.0*val)/(6.0+val), -1.0, 1.0)))
-            )
+def montar_df_para_salvar(df):
+    """
+    Passos 10 e 11 do process_table_data: DataFrame com GDS_COLUNAS_SALVAR
+    (colunas ausentes = 0.0), numérico e sem NaN.
+    """
+    columns_to_save = GDS_COLUNAS_SALVAR
+    # 10) Garante que as colunas existam
+    for c in columns_to_save:
+        if c not in df.columns:
+            df[c] = 0.0
 
-            def calc_void_ratio_B(row):
-                return safe_divide(
-                    (metadados_parte2.cons_void_vol_B - (back_vol_c - row['back_vol_Original'])),
-                    vol_solid,
-                    0.0
-                )
-            df['void_ratio_B'] = df.apply(calc_void_ratio_B, axis=1)
-            df['su_B'] = df['dev_stress_B'] / 2.0
-
-            # -- Precisamos também de ax_stress, diameter_A, etc. --
-            # a) ax_stress = load / cur_area_A (por convenção do lado A)
-            df['ax_stress'] = safe_divide(df['load'], df['cur_area_A'].replace(0, np.nan), 0.0)
-
-            # b) diameter_A e diameter_B (2 * sqrt( area * 1e6 / pi ))
-            df['diameter_A'] = 2.0 * np.sqrt(df['cur_area_A'].clip(lower=0.0)*1e6 / np.pi)
-            df['diameter_B'] = 2.0 * np.sqrt(df['cur_area_B'].clip(lower=0.0)*1e6 / np.pi)
-
-            # c) rad_strain_A e rad_strain_B
-            df['rad_strain_A'] = safe_divide((df['diameter_A'] - d_init), d_init, 0.0)*100.0
-            df['rad_strain_B'] = safe_divide((df['diameter_B'] - d_init), d_init, 0.0)*100.0
-
-            # d) shear_strain_A e shear_strain_B
-            df['shear_strain_A'] = (2.0*(df['ax_strain'] - df['vol_strain_A']))/3.0
-            df['shear_strain_B'] = (2.0*(df['ax_strain'] - df['vol_strain_B']))/3.0
-
-            # e) max_shear_stress_A/B
-            df['max_shear_stress_A'] = df['dev_stress_A']/2.0
-            df['max_shear_stress_B'] = df['dev_stress_B']/2.0
-
-            # f) avg_mean_stress = (ax_stress + rad_press) / 2
-            df['avg_mean_stress'] = (df['ax_stress'] + df['rad_press'])/2.0
-
-            # g) avg_eff_stress_A = (eff_ax_stress_A + eff_rad_stress)/2
-            df['avg_eff_stress_A'] = (df['eff_ax_stress_A'] + df['eff_rad_stress'])/2.0
-            df['avg_eff_stress_B'] = (df['eff_ax_stress_B'] + df['eff_rad_stress'])/2.0
-
-            # h) b_val e excessPWP
-            #    b_val não definido => np.nan
-            df['b_val'] = np.nan
-            df['excessPWP'] = df['pore_press_Original'] - df['back_press']
-
-            # i) Por conveniência, "eff_stress_rat_A" e "eff_stress_rat_B"
-            #    se quisermos igualar nqp_A / nqp_B
-            df['eff_stress_rat_A'] = df['nqp_A']
-            df['eff_stress_rat_B'] = df['nqp_B']
-
-            # 9) Definir columns_to_save, incluindo TODAS as que você listou
-            columns_to_save = [
-                # Originais
-                "stage_no","time_test_start","time_stage_start",
-                "rad_press_Original","rad_vol_Original","back_press_Original",
-                "back_vol_Original","load_cell_Original","pore_press_Original",
-                "ax_disp_Original","ax_force_Original","ax_strain_Original",
-                "avg_diam_chg_Original","rad_strain_Original","eff_ax_stress_Original",
-                "eff_rad_stress_Original","dev_stress_Original","total_stress_rat_Original",
-                "eff_stress_rat_Original","cur_area_Original","shear_strain_Original",
-                "camb_p_Original","eff_camb_p_Original","max_shear_stress_Original",
-                "vol_change_Original","b_value_Original","mean_stress_Original",
-
-                # Novas (calculadas)
-                "ax_strain","ax_force","rad_vol_delta","rad_vol","rad_press",
-                "back_press","back_vol_delta","back_vol","ax_disp","ax_disp_delta",
-                "cur_area_A","cur_area_B","diameter_A","diameter_B","rad_strain_A","rad_strain_B",
-                "height","vol_A","vol_B","vol_strain_A","vol_strain_B","void_ratio_A","void_ratio_B",
-                "load","ax_stress","eff_ax_stress_A","eff_ax_stress_B","eff_rad_stress","dev_stress_A",
-                "dev_stress_B","eff_stress_rat_A","eff_stress_rat_B","shear_strain_A","shear_strain_B",
-                "camb_p_A","camb_p_B","eff_camb_A","eff_camb_B","max_shear_stress_A","max_shear_stress_B",
-                "avg_mean_stress","avg_eff_stress_A","avg_eff_stress_B","b_val","excessPWP","su_A","su_B",
-                "nqp_B","nqp_A","m_A","m_B","du_kpa"
-            ]
+    # 11) Limpa e finaliza df_to_save
+    df_to_save = df[columns_to_save].copy()
+    df_to_save = _garantir_numerico(df_to_save).fillna(0.0)
+    return df_to_save
 
-            # 10) Garante que as colunas existam
-            for c in columns_to_save:
-                if c not in df.columns:
-                    df[c] = 0.0
 
-            # 11) Limpa e finaliza df_to_save
-            df_to_save = df[columns_to_save].copy()
-            df_to_save = df_to_save.apply(pd.to_numeric, errors='coerce').fillna(0.0)
+def resumo_estagios(df, resumo=None, inicio=0):
+    """
+    Resumo da tabela com só as linhas que o METADADOS_PARTE2 consulta:
+    a primeira linha e a primeira/última de cada estágio. Filtrar o
+    resumo por estágio dá os mesmos iloc[0]/iloc[-1] da tabela inteira.
 
-            # 12) Atualizar metadados com todos os atributos do METADADOS_PARTE2
-            all_attrs = metadados_parte2.get_all_attributes()
-            for attr, value in all_attrs.items():
-                metadados[attr] = value
+    Com 'resumo' (de blocos anteriores) e 'inicio' (posição da primeira
+    linha de 'df' na tabela completa), o resumo é atualizado.
+    """
+    def extremos(estagios, posicoes):
+        serie = pd.Series(posicoes, index=estagios)
+        serie = serie[serie.index.notna()]
+        grupos = serie.groupby(level=0, sort=False)
+        return set(grupos.min()) | set(grupos.max())
+
+    posicoes = set()
+    if len(df):
+        posicoes = extremos(df['stage_no'].to_numpy(), np.arange(len(df)))
+        if resumo is None or resumo.empty:
+            posicoes.add(0)
+    ordem = sorted(posicoes)
+    novas = df.iloc[ordem].assign(_pos=np.array(ordem, dtype=np.int64) + inicio)
+
+    if resumo is None:
+        return novas.reset_index(drop=True)
+
+    resumo = pd.concat([resumo, novas], ignore_index=True)
+    manter = extremos(resumo['stage_no'].to_numpy(), resumo['_pos'].to_numpy())
+    manter.add(resumo['_pos'].min())
+    return resumo[resumo['_pos'].isin(manter)].reset_index(drop=True)
+
+@medido("calculo", linhas=lambda r: len(r['df']))
+def calcular_tabela(df, metadados):
+    """
+    Núcleo de cálculo único (arquivo, DataFrame e fluxo cíclico): recebe a
+    tabela tipada (nomes do .gds ou já mapeados) e os metadados, e faz os
+    passos 2 a 12 do process_table_data.
+
+    Os 'metadados' recebem todos os atributos do METADADOS_PARTE2.
 
-            # Debug: exibir dump do METADADOS_PARTE2 se quiser
+    Returns:
+        dict: {'df': DataFrame com GDS_COLUNAS_SALVAR, 'metadados_parte2': METADADOS_PARTE2,
+               'indice_estagios': IndiceEstagios da tabela}
+    """
+    # 2) a 4) Mapear colunas, checar obrigatórias e garantir numéricas
+    df = preparar_tabela(df)
+
+    # Índice de estágios (uma passada; usado por todas as consultas por estágio)
+    indice = IndiceEstagios(df['stage_no'])
+
+    # 5) Ler metadados principais p/ cálculo inicial
+    h_init, d_init, init_dry_mass, v_0, vol_solid, v_w_f = constantes_amostra(metadados)
+
+    # 6) Colunas derivadas “base”
+    calcular_colunas_base(df, h_init, v_0)
+
+    # 7) Instanciar METADADOS_PARTE2 e recalcular metadados
+    metadados_parte2 = METADADOS_PARTE2(
+        df=df,
+        metadados=metadados,
+        init_dry_mass=init_dry_mass,
+        v_0=v_0,
+        vol_solid=vol_solid,
+        v_w_f=v_w_f,
+        h_init=h_init,
+        indice=indice
+    )
+
+    # 8) Colunas calculadas (lados A e B)
+    calcular_colunas_derivadas(df, metadados_parte2, h_init, v_0, vol_solid, d_init)
+
+    # 9), 10) e 11) Colunas gravadas (GDS_COLUNAS_SALVAR)
+    df_to_save = montar_df_para_salvar(df)
+
+    # 12) Atualizar metadados com todos os atributos do METADADOS_PARTE2
+    all_attrs = metadados_parte2.get_all_attributes()
+    for attr, value in all_attrs.items():
+        metadados[attr] = value
+
+    # Debug: dump do METADADOS_PARTE2 (VALE_DEPURACAO=1)
+    if depuracao():
+        metadados_parte2.print_attributes()
+
+    return {
+        'df': df_to_save,
+        'metadados_parte2': metadados_parte2,
+        'indice_estagios': indice
+    }
+
+@medido("calculo_amostra", linhas=lambda r: len(r['df']))
+def calcular_amostra(tabelas, metadados):
+    """
+    calcular_tabela em lote para os corpos de prova de uma amostra: as
+    tabelas são empilhadas numa só (com o início de cada uma) e os passos
+    6 e 8 rodam uma única vez sobre a pilha, com as constantes de cada
+    ensaio repetidas nas suas linhas. Só o METADADOS_PARTE2 (consultas por
+    estágio) é montado ensaio a ensaio. O resultado de cada ensaio é o
+    mesmo do calcular_tabela.
+
+    Args:
+        tabelas: lista de DataFrames (um por ensaio, como no calcular_tabela).
+        metadados: lista de dicts na mesma ordem; cada um recebe os
+            atributos do seu METADADOS_PARTE2.
+
+    Returns:
+        dict: {'df': DataFrame empilhado com GDS_COLUNAS_SALVAR,
+               'inicios': posição da primeira linha de cada ensaio em 'df',
+               'metadados_parte2': lista de METADADOS_PARTE2,
+               'indices_estagios': lista de IndiceEstagios (de cada ensaio)}
+    """
+    if len(tabelas) != len(metadados):
+        raise ValueError("É preciso um dict de metadados para cada tabela.")
+    tabelas = [preparar_tabela(df) for df in tabelas]
+    if not tabelas or any(df.empty for df in tabelas):
+        raise ValueError("Tabela sem linhas de dados na amostra.")
+
+    tamanhos = np.array([len(df) for df in tabelas])
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    df = pd.concat(tabelas, ignore_index=True)
+
+    # 5) e 6) Constantes de cada ensaio e colunas "base" da pilha inteira
+    constantes = [constantes_amostra(m) for m in metadados]
+    h_init, _, _, v_0, _, _ = (np.repeat(np.array(c, dtype=float), tamanhos)
+                               for c in zip(*constantes))
+    calcular_colunas_base(df, h_init, v_0, inicios=inicios)
+
+    # 7) METADADOS_PARTE2 de cada ensaio (sobre o seu trecho da pilha)
+    partes2, indices, por_linha = [], [], []
+    for ini, n, meta, (h, d, dry, v0, vs, vwf) in zip(inicios, tamanhos, metadados, constantes):
+        trecho = df.iloc[ini:ini + n]
+        indice = IndiceEstagios(trecho['stage_no'])
+        metadados_parte2 = METADADOS_PARTE2(
+            df=trecho,
+            metadados=meta,
+            init_dry_mass=dry,
+            v_0=v0,
+            vol_solid=vs,
+            v_w_f=vwf,
+            h_init=h,
+            indice=indice
+        )
+        partes2.append(metadados_parte2)
+        indices.append(indice)
+        por_linha.append(constantes_derivadas(metadados_parte2, h, v0, vs, d))
+
+    # 8) Colunas calculadas da pilha inteira (constantes repetidas por linha)
+    constantes_linhas = {
+        nome: np.repeat(np.array([c[nome] for c in por_linha]), tamanhos)
+        for nome in por_linha[0]
+    }
+    ColunasDerivadas(df, constantes_linhas).calcular()
+
+    # 9) a 11) e 12)
+    df_to_save = montar_df_para_salvar(df)
+    for meta, metadados_parte2 in zip(metadados, partes2):
+        meta.update(metadados_parte2.get_all_attributes())
+        if depuracao():
             metadados_parte2.print_attributes()
 
-            # Retorno final
-            return {
-                'df': df_to_save,
-                'metadados_parte2': metadados_parte2
-            }
+    return {
+        'df': df_to_save,
+        'inicios': inicios,
+        'metadados_parte2': partes2,
+        'indices_estagios': indices
+    }
+
+
+def inicios_grupos(grupos):
+    """Posições onde muda o valor de 'grupos' (ex.: idnome de uma tabela empilhada)."""
+    grupos = np.asarray(grupos)
+    if not len(grupos):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], grupos[1:] != grupos[:-1])))
+
+
+def resumo_segmentos(df, inicios, colunas):
+    """
+    Resumo de cada ensaio de uma tabela empilhada (calcular_amostra ou
+    DatabaseManager.get_dados_amostra) numa única passada por coluna
+    (ufunc.reduceat sobre os trechos): máximo, mínimo (NaN ignorados) e
+    último valor de cada coluna.
+
+    Returns:
+        DataFrame: uma linha por ensaio, colunas '<coluna>_max', '<coluna>_min',
+        '<coluna>_final' e 'n_linhas'.
+    """
+    inicios = np.asarray(inicios, dtype=np.int64)
+    if not len(inicios):
+        return pd.DataFrame()
+    fins = np.append(inicios[1:], len(df))
+    resumo = {'n_linhas': fins - inicios}
+    for coluna in colunas:
+        valores = df[coluna].to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            resumo[f'{coluna}_max'] = np.fmax.reduceat(valores, inicios)
+            resumo[f'{coluna}_min'] = np.fmin.reduceat(valores, inicios)
+        resumo[f'{coluna}_final'] = valores[fins - 1]
+    return pd.DataFrame(resumo)
+
+###############################################################################
+# Classe principal TableProcessor
+###############################################################################
+class TableProcessor:
+    @staticmethod
+    def process_table_data(db_manager, metadados, gds_file, df=None):
+        """
+        Faz a leitura do arquivo GDS, localiza o cabeçalho,
+        ajusta as colunas e realiza os cálculos, retornando um dict
+        com DataFrame final e a instância METADADOS_PARTE2.
+        Inclui a mudança em 'height = h_init - ax_disp_Original'.
+        Garante a criação e o preenchimento das colunas solicitadas.
+
+        Se 'df' for informado (tabela já lida por read_gds), o arquivo
+        não é lido novamente.
+        """
+        try:
+            # 1) e 2) Ler a tabela a partir do cabeçalho 'Stage Number'
+            if df is None:
+                df = read_gds(gds_file, usar_cache=False)['df']
+                if df is None:
+                    raise ValueError(
+                        f"Cabeçalho com 'Stage Number' não encontrado no arquivo {gds_file}."
+                    )
+
+            # Debug (VALE_DEPURACAO=1)
+            if depuracao():
+                print("DEBUG - COLUNAS LIDAS DO ARQUIVO:")
+                print(df.columns.tolist())
+                print("DEBUG - PRIMEIRAS LINHAS DO DATAFRAME LIDO:")
+                print(df.head(5))
+
+            # 2) a 12) Cálculos (núcleo comum)
+            return calcular_tabela(df, metadados)
 
         except Exception as e:
             print(f"Erro ao processar o arquivo '{gds_file}': {e}")
@@ -718,28 +1577,15 @@ class TableProcessor:
     def process_table_data_from_dataframe(db_manager, metadados, df):
         """
         Versão caso o DataFrame já esteja lido em 'df' (não precisamos
-        abrir o arquivo). A lógica de cálculo é similar, aproveitando
-        a classe METADADOS_PARTE2 para obter os valores corrigidos.
-        Também define 'height = h_init - ax_disp_Original'.
+        abrir o arquivo). Usa o mesmo núcleo de cálculo (calcular_tabela)
+        do process_table_data; 'df' pode ter os nomes do .gds ou os já
+        mapeados, e não é alterado.
+        Colunas-base ausentes são consideradas 0.0.
         """
         try:
-            # Copiamos o df para não sobrescrever
-            df = df.copy()
-
-            # 1) Ler do dicionário de metadados
-            w_0       = safe_float_conversion(metadados.get('w_0', 0))
-            w_f       = safe_float_conversion(metadados.get('w_f', 0))
-            init_mass = safe_float_conversion(metadados.get('init_mass', 0))
-            h_init    = safe_float_conversion(metadados.get('h_init', 1))
-            d_init    = safe_float_conversion(metadados.get('d_init', 1))
-            spec_grav = safe_float_conversion(metadados.get('spec_grav', 1))
-
-            init_dry_mass = safe_divide(init_mass, (1 + w_0), 0.0)
-            v_0           = h_init * (np.pi * (d_init ** 2)/4.0)
-            vol_solid     = safe_divide(init_dry_mass*1000.0, spec_grav, 0.0)
-            v_w_f         = w_f * init_dry_mass * 1000.0
-
-            # 2) Verificar colunas mínimas
+            df = map_gds_columns(df)
+
+            # Verificar colunas mínimas
             needed_cols = [
                 "rad_press_Original",
                 "rad_vol_Original",
@@ -753,197 +1599,8 @@ class TableProcessor:
             for col in needed_cols:
                 if col not in df.columns:
                     df[col] = 0.0
-                else:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # 3) Ajustar colunas derivadas
-            df['ax_force'] = df['load_cell_Original']
-            df['load']     = df['load_cell_Original']
-
-            df['rad_vol_delta']  = df['rad_vol_Original'].diff().fillna(0.0)
-            df['rad_vol_cumsum'] = df['rad_vol_delta'].cumsum()
-            df['rad_vol']        = df['rad_vol_cumsum']
-
-            df['rad_press']  = df['rad_press_Original']
-            df['back_press'] = df['back_press_Original']
-
-            df['back_vol_delta']  = df['back_vol_Original'].diff().fillna(0.0)
-            df['back_vol_cumsum'] = df['back_vol_delta'].cumsum()
-            df['back_vol']        = df['back_vol_cumsum']
-
-            df['ax_disp_delta']   = df['ax_disp_Original'].diff().fillna(0.0)
-            df['ax_disp_cumsum']  = df['ax_disp_delta'].cumsum()
-            df['ax_disp']         = df['ax_disp_cumsum']
-
-            # height = h_init - ax_disp_Original (alterado)
-            df['height'] = h_init - df['ax_disp_Original']
-
-            df['vol_A'] = v_0 - df['back_vol']
-            df['vol_B'] = v_0 - df['back_vol']
-
-            df['cur_area_A'] = (
-                safe_divide(df['vol_A'], df['height'].replace(0, np.nan), 0.0)
-            ) * 1e-6
-
-            # 4) Instanciar METADADOS_PARTE2
-            cis_parte2 = METADADOS_PARTE2(
-                df=df,
-                metadados=metadados,
-                init_dry_mass=init_dry_mass,
-                v_0=v_0,
-                vol_solid=vol_solid,
-                v_w_f=v_w_f,
-                h_init=h_init
-            )
-
-            # 5) Ajustar a deformação axial para cisalhamento
-            cis_inicial = int(metadados.get("_cis_inicial", 8))
-
-            def calc_ax_strain(row):
-                if row['stage_no'] >= cis_inicial:
-                    return safe_divide(
-                        (row['ax_disp'] - cis_parte2.ax_disp_c),
-                        (h_init - row['ax_disp']),
-                        0.0
-                    )
-                else:
-                    return safe_divide(row['ax_disp'], h_init, 0.0)
-
-            df['ax_strain'] = df.apply(calc_ax_strain, axis=1)
-
-            # ax_stress = load / cur_area_A
-            df['ax_stress'] = safe_divide(df['load'], df['cur_area_A'].replace(0, np.nan), 0.0)
-
-            def calc_vol_strain_A(row):
-                if row['stage_no'] >= cis_inicial:
-                    return safe_divide(
-                        (cis_parte2.back_vol_c - row['back_vol']),
-                        (cis_parte2.cons_void_vol_A + vol_solid),
-                        0.0
-                    )
-                else:
-                    return safe_divide(row['back_vol'], v_0, 0.0)
-                
-            def calc_vol_strain_B(row):
-                if row['stage_no'] >= cis_inicial:
-                    return safe_divide(
-                        (cis_parte2.back_vol_c - row['back_vol']),
-                        (cis_parte2.cons_void_vol_B + vol_solid),
-                        0.0
-                    )
-                else:
-                    return safe_divide(row['back_vol'], v_0, 0.0)                
-
-            df['vol_strain_A'] = df.apply(calc_vol_strain_A, axis=1)
-            df['vol_strain_B'] = df.apply(calc_vol_strain_B, axis=1)
-
-            df['dev_stress_A'] = safe_divide(df['load'], df['cur_area_A'].replace(0, np.nan), 0.0)
-            df['dev_stress_B'] = df['dev_stress_A']
-
-            df['eff_rad_stress'] = df['rad_press_Original'] - df['pore_press_Original']
-
-            df['camb_p_A'] = ((df['ax_stress'] - df['dev_stress_A'])*2 + df['ax_stress'])/3.0
-            df['camb_p_B'] = ((df['ax_stress'] - df['dev_stress_B'])*2 + df['ax_stress'])/3.0
-
-            df['su_A'] = df.apply(
-                lambda row: 0.0 if abs(row['camb_p_A']) < 1e-12
-                else (row['dev_stress_A']/2.0) / row['camb_p_A'],
-                axis=1
-            )
-            df['su_B'] = df.apply(
-                lambda row: 0.0 if abs(row['camb_p_B']) < 1e-12
-                else (row['dev_stress_B']/2.0) / row['camb_p_B'],
-                axis=1
-            )
-
-            df['void_ratio_A'] = safe_divide((df['vol_A'] - vol_solid), vol_solid, 0.0)
-            df['void_ratio_B'] = safe_divide((df['vol_B'] - vol_solid), vol_solid, 0.0)
-
-            df['eff_ax_stress_A'] = df['dev_stress_A'] + df['eff_rad_stress']
-            df['eff_ax_stress_B'] = df['dev_stress_B'] + df['eff_rad_stress']
-
-            df['eff_camb_A'] = (df['eff_rad_stress']*2.0 + df['eff_ax_stress_A'])/3.0
-            df['eff_camb_B'] = (df['eff_rad_stress']*2.0 + df['eff_ax_stress_B'])/3.0
-
-            df['nqp_A'] = safe_divide(df['dev_stress_A'], df['eff_camb_A'], 0.0)
-            df['nqp_B'] = safe_divide(df['dev_stress_B'], df['eff_camb_B'], 0.0)
-
-            df['m_A'] = df['nqp_A'].apply(
-                lambda val: np.degrees(np.arcsin(np.clip((3.0*val)/(6.0+val), -1.0, 1.0)))
-            )
-            df['m_B'] = df['nqp_B'].apply(
-                lambda val: np.degrees(np.arcsin(np.clip((3.0*val)/(6.0+val), -1.0, 1.0)))
-            )
-
-            cis_stage_data = df[df['stage_no'] == cis_inicial]
-            if not cis_stage_data.empty and 'pore_press_Original' in cis_stage_data.columns:
-                pore_press_cis_first = cis_stage_data['pore_press_Original'].iloc[0]
-                df['du_kpa'] = df['pore_press_Original'] - pore_press_cis_first
-            else:
-                df['du_kpa'] = 0.0
-
-            df['shear_strain_A'] = (
-                2.0 * (df['ax_strain'] - df['vol_strain_A'])
-            ) / 3.0
-
-            df['shear_strain_B'] = (
-                2.0 * (df['ax_strain'] - df['vol_strain_B'])
-            ) / 3.0
-
-            df['diameter_A'] = 2.0 * np.sqrt(df['cur_area_A'].clip(lower=0.0)*1e6 / np.pi)
-            df['diameter_B'] = df['diameter_A']
-
-            df['b_val'] = np.nan
-
-            df['avg_eff_stress_A'] = (df['eff_ax_stress_A'] + df['eff_rad_stress'])/2.0
-            df['avg_eff_stress_B'] = (df['eff_ax_stress_B'] + df['eff_rad_stress'])/2.0
-            df['avg_mean_stress']  = (df['ax_stress'] + df['rad_press'])/2.0
-
-            df['rad_strain_A'] = safe_divide((df['diameter_A'] - d_init), d_init, 0.0)*100.0
-            df['rad_strain_B'] = df['rad_strain_A']
-
-            df['max_shear_stress_A'] = df['dev_stress_A']/2.0
-            df['max_shear_stress_B'] = df['dev_stress_B']/2.0
-            df['excessPWP']          = df['pore_press_Original'] - df['back_press']
-
-            columns_to_save = [
-                'stage_no','time_test_start','time_stage_start','rad_press_Original',
-                'rad_vol_Original','back_press_Original','back_vol_Original',
-                'load_cell_Original','pore_press_Original','ax_disp_Original',
-                'ax_force_Original','ax_strain_Original','avg_diam_chg_Original',
-                'rad_strain_Original','ax_strain_Original_2','eff_ax_stress_Original',
-                'eff_rad_stress_Original','dev_stress_Original','total_stress_rat_Original',
-                'eff_stress_rat_Original','cur_area_Original','shear_strain_Original',
-                'camb_p_Original','eff_camb_p_Original','max_shear_stress_Original',
-                'vol_change_Original','b_value_Original','mean_stress_Original','ax_force',
-                'load','rad_vol_delta','rad_vol','rad_press','back_press','back_vol_delta',
-                'back_vol','ax_disp_delta','ax_disp','height','vol_A','vol_B','cur_area_A',
-                'cur_area_B','eff_rad_stress','dev_stress_A','dev_stress_B','ax_stress',
-                'ax_strain','vol_strain_A','vol_strain_B','void_ratio_B','void_ratio_A','eff_ax_stress_A',
-                'eff_ax_stress_B','eff_stress_rat_A','eff_stress_rat_B','eff_camb_A',
-                'eff_camb_B','camb_p_A','camb_p_B','max_shear_stress_A','max_shear_stress_B',
-                'excessPWP','du_kpa','nqp_A','nqp_B','m_A','m_B','shear_strain_A','shear_strain_B','diameter_A',
-                'diameter_B','b_val','avg_eff_stress_A','avg_eff_stress_B','avg_mean_stress',
-                'rad_strain_A','rad_strain_B','su_A','su_B'
-            ]
-            for col in columns_to_save:
-                if col not in df.columns:
-                    df[col] = 0.0
-
-            df_to_save = df[columns_to_save].copy()
-            df_to_save = df_to_save.fillna(0.0)
-
-            # 6) Atualizar metadados
-            all_attrs = cis_parte2.get_all_attributes()
-            for attr, value in all_attrs.items():
-                metadados[attr] = value
 
-            cis_parte2.print_attributes()
-
-            return {
-                'df': df_to_save,
-                'metadados_parte2': cis_parte2
-            }
+            return calcular_tabela(df, metadados)
 
         except Exception as e:
             print(f"Erro em process_table_data_from_dataframe: {e}")
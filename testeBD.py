@@ -1,10 +1,16 @@
 import os
+import time
+import atexit
 import sqlite3
 import re
 import pandas as pd
 import traceback
 import numpy as np
 
+from teste import hash_arquivo
+from ruptura import pontos_ruptura, criterio_ruptura, COLUNAS_RUPTURA
+from medicao import medido
+
 # Exemplo de conversão segura para float
 ###############################################################################
 def safe_float_conversion(value, default=0.0):
@@ -146,23 +152,367 @@ TIPOENSAIO_MAP = {
 }
 
 
+def _safe_str(value):
+    if isinstance(value, bytes):
+        try:
+            return value.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            return ""
+    return str(value).strip() if value is not None else ""
+
+def _convert_numpy_types(value):
+    if isinstance(value, (np.float64, np.float32)):
+        return float(value)
+    elif isinstance(value, (np.int64, np.int32)):
+        return int(value)
+    elif isinstance(value, bytes):
+        try:
+            return value.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            return ""
+    else:
+        return value
+
+###############################################################################
+# Índice de estágios gravado com o ensaio (EstagiosEnsaio)
+###############################################################################
+# Trechos contínuos de mesmo stage_no das linhas de um ensaio (na ordem do
+# id), com as faixas de id: ROW_NUMBER geral - ROW_NUMBER do estágio é
+# constante dentro de cada trecho.
+_SQL_TRECHOS_ESTAGIOS = """
+    SELECT stage_no, MIN(id) AS id_inicio, MAX(id) AS id_fim, COUNT(*) AS n_linhas
+    FROM (
+        SELECT id, stage_no,
+               ROW_NUMBER() OVER (ORDER BY id)
+             - ROW_NUMBER() OVER (PARTITION BY stage_no ORDER BY id) AS trecho
+        FROM EnsaiosTriaxiais
+        WHERE idnome = ?
+    )
+    WHERE stage_no IS NOT NULL
+    GROUP BY stage_no, trecho
+    ORDER BY id_inicio
+"""
+
+
+def trechos_estagios(conn, idnome):
+    """
+    [(stage_no, id_inicio, id_fim, n_linhas), ...] do ensaio, na ordem das
+    linhas: lidos de EstagiosEnsaio ou, para ensaios gravados antes do
+    índice, calculados na hora a partir de EnsaiosTriaxiais.
+    """
+    trechos = conn.execute("""
+        SELECT stage_no, id_inicio, id_fim, n_linhas FROM EstagiosEnsaio
+        WHERE idnome = ? ORDER BY id_inicio
+    """, (idnome,)).fetchall()
+    if not trechos:
+        trechos = conn.execute(_SQL_TRECHOS_ESTAGIOS, (idnome,)).fetchall()
+    return trechos
+
+
+def faixas_estagios(trechos, inicial, final=None):
+    """
+    Faixas de id [(id_inicio, id_fim), ...] das linhas com
+    inicial <= stage_no <= final (final = inicial se omitido); trechos
+    vizinhos viram uma só faixa.
+    """
+    final = inicial if final is None else final
+    faixas = []
+    anterior = None
+    for i, (stage_no, id_inicio, id_fim, _) in enumerate(trechos):
+        if not inicial <= stage_no <= final:
+            continue
+        if faixas and anterior == i - 1:
+            faixas[-1] = (faixas[-1][0], id_fim)
+        else:
+            faixas.append((id_inicio, id_fim))
+        anterior = i
+    return faixas
+
+
+def _lista_colunas(colunas):
+    """Lista de colunas para o SELECT ('*' se vazia); só nomes simples."""
+    if not colunas:
+        return "*"
+    invalidas = [c for c in colunas if not re.fullmatch(r"\w+", c)]
+    if invalidas:
+        raise ValueError(f"Nomes de coluna inválidos: {invalidas}")
+    return ", ".join(colunas)
+
+
+def sql_linhas_estagios(faixas, colunas=None):
+    """
+    SELECT das linhas de EnsaiosTriaxiais nas 'faixas' de id (parâmetros:
+    idnome + faixas). Com 'colunas' (nomes de EnsaiosTriaxiais), só elas
+    são lidas.
+    """
+    condicao = " OR ".join(["id BETWEEN ? AND ?"] * len(faixas)) or "0"
+    sql = f"""
+        SELECT {_lista_colunas(colunas)} FROM EnsaiosTriaxiais
+        WHERE idnome = ? AND ({condicao})
+        ORDER BY id
+    """
+    return sql, [v for faixa in faixas for v in faixa]
+
+
+def sql_linhas_ensaios(n_ensaios, colunas=None):
+    """
+    SELECT das linhas de dados (sem as fictícias) de vários ensaios de uma
+    vez, empilhadas por idnome (parâmetros: os 'n_ensaios' idnomes).
+    A primeira coluna é sempre idnome.
+    """
+    colunas = ["idnome"] + [c for c in colunas if c != "idnome"] if colunas else None
+    marcadores = ", ".join(["?"] * n_ensaios)
+    return f"""
+        SELECT {_lista_colunas(colunas)} FROM EnsaiosTriaxiais
+        WHERE idnome IN ({marcadores}) AND time_test_start IS NOT NULL
+        ORDER BY idnome, id
+    """
+
+
+###############################################################################
+# Perfil de desempenho do SQLite (PRAGMAs aplicados ao conectar)
+###############################################################################
+# "desempenho": journal WAL (leituras dos gráficos/planilhas em paralelo com
+# a gravação da ingestão), synchronous=NORMAL (seguro com WAL; só a última
+# transação pode se perder numa queda de energia), cache de 64 MB, mmap de
+# 256 MB e temporários em memória. page_size só vale para banco novo
+# (antes da primeira tabela). "padrao": configuração original do SQLite.
+# Escolha pelo argumento 'perfil' do DatabaseManager ou por VALE_SQLITE_PERFIL.
+PERFIS_SQLITE = {
+    "desempenho": {
+        "page_size": 8192,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,          # em KiB (negativo)
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "padrao": {},
+}
+PERFIL_SQLITE_PADRAO = "desempenho"
+
+# PRAGMAs que valem para o arquivo (os demais são da conexão)
+_PRAGMAS_DO_ARQUIVO = ("page_size", "journal_mode")
+
+# Intervalo mínimo entre dois "PRAGMA optimize" da mesma conexão (s)
+INTERVALO_OTIMIZACAO = 3600
+
+
+def perfil_sqlite(perfil=None):
+    """PRAGMAs do 'perfil' (nome em PERFIS_SQLITE ou dict); None: VALE_SQLITE_PERFIL ou o padrão."""
+    if isinstance(perfil, dict):
+        return perfil
+    nome = perfil or os.environ.get("VALE_SQLITE_PERFIL") or PERFIL_SQLITE_PADRAO
+    if nome not in PERFIS_SQLITE:
+        raise ValueError(f"Perfil do SQLite desconhecido: {nome!r} (opções: {', '.join(PERFIS_SQLITE)})")
+    return PERFIS_SQLITE[nome]
+
+
+def aplicar_perfil_sqlite(conn, perfil=None, leitura=False):
+    """
+    Aplica à conexão os PRAGMAs do perfil (ver PERFIS_SQLITE). Com
+    'leitura' (conexões só de leitura, ex.: processos do recálculo,
+    PreencherExcel), só os da conexão: o journal WAL já fica gravado no
+    arquivo pela conexão principal. Retorna {pragma: valor em vigor}.
+    """
+    pragmas = perfil_sqlite(perfil)
+    em_vigor = {}
+    for pragma, valor in pragmas.items():
+        if pragma in _PRAGMAS_DO_ARQUIVO and leitura:
+            continue
+        if pragma == "page_size" and conn.execute("PRAGMA page_count").fetchone()[0] > 0:
+            continue  # banco já criado: page_size só muda com VACUUM
+        conn.execute(f"PRAGMA {pragma} = {valor}")
+        em_vigor[pragma] = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+    return em_vigor
+
+
+###############################################################################
+# Migrações do esquema (versão em PRAGMA user_version)
+###############################################################################
+# Cada migração: (versao, descricao, comandos, planos). Os comandos rodam
+# numa transação só, junto com a troca do user_version, e nunca de novo no
+# mesmo arquivo. 'planos' são as consultas que a migração deve acelerar:
+# (sql, parâmetros, índice que o EXPLAIN QUERY PLAN tem que mostrar), e
+# são conferidos por verificar_planos_consulta depois de migrar.
+# Migração nova: acrescentar no fim, com a versão seguinte (não alterar as
+# que já foram aplicadas nos bancos dos usuários).
+MIGRACOES = (
+    (1, "índices de EnsaiosTriaxiais por ensaio e por estágio",
+     (
+         # (idnome, id): linhas de um ensaio já na ordem de gravação
+         # (get_data_for_file(s), sql_linhas_ensaios, remover_linhas_ensaio)
+         "CREATE INDEX IF NOT EXISTS idx_ensaios_idnome ON EnsaiosTriaxiais (idnome)",
+         # (idnome, stage_no): filtro por estágio (linhas fictícias, trechos antigos)
+         "CREATE INDEX IF NOT EXISTS idx_ensaios_idnome_estagio ON EnsaiosTriaxiais (idnome, stage_no)",
+     ),
+     (
+         ("SELECT * FROM EnsaiosTriaxiais WHERE idnome = ? ORDER BY id",
+          (1,), "idx_ensaios_idnome"),
+         ("SELECT id FROM EnsaiosTriaxiais WHERE idnome = ? AND stage_no BETWEEN 8 AND 11"
+          " AND time_test_start IS NULL",
+          (1,), "idx_ensaios_idnome_estagio"),
+     )),
+    (2, "índices de Cp por amostra, tipo de ensaio e status",
+     (
+         "CREATE INDEX IF NOT EXISTS idx_cp_amostra_tipo_status ON Cp (idamostra, idtipoensaio, status)",
+         "CREATE INDEX IF NOT EXISTS idx_cp_status ON Cp (status)",
+         "CREATE INDEX IF NOT EXISTS idx_cp_contrato_campanha ON Cp (idcontrato, idcampanha, idamostra)",
+     ),
+     (
+         ("SELECT filename FROM Cp WHERE idamostra = ? AND idtipoensaio = ? AND status = ?",
+          ("A", 1, "Aprovado"), "idx_cp_amostra_tipo_status"),
+         ("SELECT filename FROM Cp WHERE idamostra = ? AND status != ?",
+          ("A", "Refugado"), "idx_cp_amostra_tipo_status"),
+         ("SELECT filename FROM Cp WHERE status = ?",
+          ("Aprovado",), "idx_cp_status"),
+         ("SELECT idnome FROM Cp WHERE idcontrato = ? AND idcampanha = ? AND idamostra = ?",
+          ("C", "K", "A"), "idx_cp_contrato_campanha"),
+     )),
+    (3, "impressão do arquivo no estado do modo tail (acompanhamento.py)",
+     (
+         "ALTER TABLE AcompanhamentoArquivos ADD COLUMN impressao TEXT",
+     ),
+     ()),
+)
+VERSAO_ESQUEMA = MIGRACOES[-1][0]
+
+
+def versao_esquema(conn):
+    """Versão do esquema gravada no arquivo (PRAGMA user_version)."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migracoes(conn, migracoes=MIGRACOES):
+    """
+    Aplica as migrações com versão acima da do arquivo, cada uma na sua
+    transação (se uma falhar, o banco fica na versão anterior a ela).
+    Retorna a lista das versões aplicadas.
+    """
+    aplicadas = []
+    atual = versao_esquema(conn)
+    for versao, descricao, comandos, _ in migracoes:
+        if versao <= atual:
+            continue
+        conn.execute("BEGIN")
+        try:
+            for sql in comandos:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {int(versao)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"Banco de dados migrado para a versão {versao}: {descricao}.")
+        aplicadas.append(versao)
+        atual = versao
+    return aplicadas
+
+
+def plano_consulta(conn, sql, parametros=()):
+    """Linhas de detalhe do EXPLAIN QUERY PLAN de 'sql'."""
+    return [linha[-1] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)]
+
+
+def _copia_esquema(conn):
+    """Banco em memória, vazio e sem estatísticas, com o esquema de 'conn'."""
+    copia = sqlite3.connect(":memory:")
+    for (sql,) in conn.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY type = 'index'
+    """):
+        copia.execute(sql)
+    copia.execute(f"PRAGMA user_version = {versao_esquema(conn)}")
+    return copia
+
+
+def verificar_planos_consulta(conn, migracoes=MIGRACOES):
+    """
+    Confere, com EXPLAIN QUERY PLAN, se as consultas de cada migração já
+    aplicada usam o índice esperado. Os planos saem de uma cópia vazia do
+    esquema, para não depender dos dados: com poucas linhas e estatísticas
+    (ANALYZE) o SQLite prefere, com razão, varrer a tabela. Retorna a lista
+    de problemas [(versao, sql, plano), ...] (vazia se está tudo certo).
+    """
+    problemas = []
+    copia = _copia_esquema(conn)
+    try:
+        atual = versao_esquema(copia)
+        for versao, _, _, planos in migracoes:
+            if versao > atual:
+                continue
+            for sql, parametros, indice in planos:
+                plano = plano_consulta(copia, sql, parametros)
+                if not any(re.search(rf"\bUSING (COVERING )?INDEX {indice}\b", p) for p in plano):
+                    problemas.append((versao, sql, plano))
+    finally:
+        copia.close()
+    return problemas
+
+
 class DatabaseManager:
     _instance = None
 
-    def __new__(cls, db_path="database.db"):
+    def __new__(cls, db_path="database.db", perfil=None):
         if cls._instance is None:
             cls._instance = super(DatabaseManager, cls).__new__(cls)
             try:
                 cls._instance.conn = sqlite3.connect(db_path, timeout=30)
+                cls._instance.pragmas = aplicar_perfil_sqlite(cls._instance.conn, perfil)
                 cls._instance.conn.execute("PRAGMA foreign_keys = ON;")
                 cls._instance.create_tables()
+                cls._instance.migrar()
                 cls._instance.populate_fixed_tables()
+                cls._instance._ultima_otimizacao = None
+                cls._instance.otimizar()
+                atexit.register(cls._instance.otimizar)
             except Exception as e:
                 print(f"Erro ao inicializar o banco de dados: {e}")
                 traceback.print_exc()
                 cls._instance = None
         return cls._instance
 
+    def migrar(self):
+        """
+        Leva o esquema à VERSAO_ESQUEMA (ver MIGRACOES). Se alguma migração
+        foi aplicada, confere os planos das consultas com os índices novos
+        e atualiza as estatísticas (ANALYZE).
+        """
+        try:
+            if not aplicar_migracoes(self.conn):
+                return
+            for versao, sql, plano in verificar_planos_consulta(self.conn):
+                print(f"Aviso: consulta da migração {versao} não usa o índice esperado: "
+                      f"{sql} -> {plano}")
+            self.conn.execute("PRAGMA analysis_limit = 400")
+            self.conn.execute("ANALYZE")
+            self.conn.commit()
+        except Exception as e:
+            print(f"Erro ao migrar o banco de dados: {e}")
+            traceback.print_exc()
+
+    def otimizar(self):
+        """
+        PRAGMA optimize (atualiza as estatísticas do planejador só onde
+        precisa). Roda ao conectar, ao sair e, via otimizar_se_preciso,
+        depois das gravações grandes.
+        """
+        if self.conn is None:
+            return  # conexão já fechada (close)
+        try:
+            self.conn.execute("PRAGMA analysis_limit = 400")
+            self.conn.execute("PRAGMA optimize")
+            self._ultima_otimizacao = time.monotonic()
+        except sqlite3.Error as e:
+            print(f"Erro ao otimizar o banco de dados: {e}")
+
+    def otimizar_se_preciso(self):
+        """otimizar() se a última foi há mais de INTERVALO_OTIMIZACAO segundos."""
+        if (self._ultima_otimizacao is None
+                or time.monotonic() - self._ultima_otimizacao > INTERVALO_OTIMIZACAO):
+            self.otimizar()
+
     def create_tables(self):
         try:
             with self.conn:
@@ -473,6 +823,134 @@ class DatabaseManager:
                     )
                 """)
 
+                # RegistroArquivos: tamanho/mtime/hash de cada .gds ingerido
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS RegistroArquivos (
+                        filename TEXT PRIMARY KEY,
+                        caminho TEXT,
+                        tamanho INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        hash TEXT NOT NULL,
+                        idnome INTEGER,
+                        data_registro TEXT DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (idnome) REFERENCES Cp(idnome)
+                    )
+                """)
+
+                # AcompanhamentoArquivos: estado do modo tail (ensaios em andamento)
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS AcompanhamentoArquivos (
+                        filename TEXT PRIMARY KEY,
+                        caminho TEXT NOT NULL,
+                        idnome INTEGER NOT NULL,
+                        offset INTEGER NOT NULL,
+                        cabecalho TEXT NOT NULL,
+                        n_linhas INTEGER NOT NULL,
+                        metadados TEXT NOT NULL,
+                        estado TEXT,
+                        resumo TEXT,
+                        constantes TEXT,
+                        status TEXT NOT NULL DEFAULT 'ativo',
+                        data_atualizacao TEXT DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (idnome) REFERENCES Cp(idnome)
+                    )
+                """)
+
+                # FilaIngestao: arquivos detectados pelo monitorGDS.py aguardando ingestão
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS FilaIngestao (
+                        filename TEXT PRIMARY KEY,
+                        caminho TEXT NOT NULL,
+                        tamanho INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pendente',
+                        tentativas INTEGER NOT NULL DEFAULT 0,
+                        mensagem TEXT,
+                        data_inclusao TEXT DEFAULT CURRENT_TIMESTAMP,
+                        data_atualizacao TEXT DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+
+                # EstagiosEnsaio: trechos de cada estágio em EnsaiosTriaxiais (faixa de id)
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS EstagiosEnsaio (
+                        idnome INTEGER NOT NULL,
+                        stage_no REAL NOT NULL,
+                        id_inicio INTEGER NOT NULL,
+                        id_fim INTEGER NOT NULL,
+                        n_linhas INTEGER NOT NULL,
+                        tempo_inicio REAL,
+                        tempo_fim REAL,
+                        PRIMARY KEY (idnome, id_inicio),
+                        FOREIGN KEY (idnome) REFERENCES Cp(idnome)
+                    )
+                """)
+
+                # CiclosEnsaio: métricas por ciclo dos ensaios cíclicos (ciclico.analisar_ciclos)
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS CiclosEnsaio (
+                        idnome INTEGER NOT NULL,
+                        ciclo INTEGER NOT NULL,
+                        stage_no REAL,
+                        linha_inicio INTEGER NOT NULL,
+                        linha_pico INTEGER NOT NULL,
+                        linha_fim INTEGER NOT NULL,
+                        q_max REAL,
+                        q_min REAL,
+                        eps_max REAL,
+                        eps_min REAL,
+                        eps_pico_a_pico REAL,
+                        modulo_secante REAL,
+                        area_laco REAL,
+                        amortecimento REAL,
+                        du_max REAL,
+                        du_final REAL,
+                        du_acumulado REAL,
+                        PRIMARY KEY (idnome, ciclo),
+                        FOREIGN KEY (idnome) REFERENCES Cp(idnome)
+                    )
+                """)
+
+                # RupturaEnsaio: estado na ruptura por critério e lado (ruptura.py)
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS RupturaEnsaio (
+                        idnome INTEGER NOT NULL,
+                        criterio TEXT NOT NULL,
+                        lado TEXT NOT NULL,
+                        adotado INTEGER NOT NULL DEFAULT 0,
+                        id_linha INTEGER,
+                        stage_no REAL,
+                        ax_strain REAL,
+                        q REAL,
+                        p_efetiva REAL,
+                        e REAL,
+                        u REAL,
+                        du REAL,
+                        nqp REAL,
+                        razao_tensoes REAL,
+                        eff_ax_stress REAL,
+                        eff_rad_stress REAL,
+                        PRIMARY KEY (idnome, criterio, lado),
+                        FOREIGN KEY (idnome) REFERENCES Cp(idnome)
+                    )
+                """)
+                self.conn.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_ruptura_criterio
+                    ON RupturaEnsaio (criterio, lado, adotado)
+                """)
+
+                # RecalculoEnsaios: progresso do recálculo em lote (recalculo.py)
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS RecalculoEnsaios (
+                        idnome INTEGER PRIMARY KEY,
+                        status TEXT NOT NULL DEFAULT 'pendente',
+                        tentativas INTEGER NOT NULL DEFAULT 0,
+                        mensagem TEXT,
+                        data_atualizacao TEXT DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (idnome) REFERENCES Cp(idnome)
+                    )
+                """)
+
         except Exception as e:
             print(f"Erro ao criar tabelas: {e}")
             traceback.print_exc()
@@ -511,6 +989,162 @@ class DatabaseManager:
             traceback.print_exc()
             return None
 
+    def get_indice_estagios(self, idnome):
+        """
+        Trechos [(stage_no, id_inicio, id_fim, n_linhas), ...] do ensaio
+        (ver trechos_estagios). Retorna [] em caso de erro.
+        """
+        try:
+            return trechos_estagios(self.conn, idnome)
+        except Exception as e:
+            print(f"Erro ao obter o índice de estágios para idnome={idnome}: {e}")
+            traceback.print_exc()
+            return []
+
+    def get_dados_estagios(self, filename, estagio_inicial, estagio_final=None, colunas=None):
+        """
+        DataFrame só com as linhas de EnsaiosTriaxiais de 'filename' cujo
+        stage_no está entre estagio_inicial e estagio_final, lidas pelas
+        faixas de id do índice de estágios (sem varrer o ensaio inteiro).
+        Com 'colunas', só essas colunas são lidas.
+        Retorna None se o arquivo não for encontrado ou em caso de erro.
+        """
+        try:
+            idnome = self.get_idnome_by_filename(filename)
+            if idnome is None:
+                print(f"Arquivo '{filename}' não encontrado na tabela 'Cp'.")
+                return None
+
+            faixas = faixas_estagios(trechos_estagios(self.conn, idnome),
+                                     estagio_inicial, estagio_final)
+            sql, faixas_params = sql_linhas_estagios(faixas, colunas)
+            return pd.read_sql_query(sql, self.conn, params=[idnome] + faixas_params)
+
+        except Exception as e:
+            print(f"Erro ao recuperar estágios de '{filename}': {e}")
+            traceback.print_exc()
+            return None
+
+    def get_rupturas(self, filename, criterio=None):
+        """
+        DataFrame de RupturaEnsaio do ensaio 'filename' (um critério, ou
+        todos). Retorna None se o arquivo não for encontrado ou em caso de erro.
+        """
+        try:
+            idnome = self.get_idnome_by_filename(filename)
+            if idnome is None:
+                print(f"Arquivo '{filename}' não encontrado na tabela 'Cp'.")
+                return None
+            sql = "SELECT * FROM RupturaEnsaio WHERE idnome = ?"
+            params = [idnome]
+            if criterio:
+                sql += " AND criterio = ?"
+                params.append(criterio)
+            return pd.read_sql_query(sql + " ORDER BY criterio, lado", self.conn, params=params)
+
+        except Exception as e:
+            print(f"Erro ao recuperar a ruptura de '{filename}': {e}")
+            traceback.print_exc()
+            return None
+
+    def get_rupturas_amostra(self, idcontrato, idcampanha, idamostra, criterio=None):
+        """
+        Pontos de ruptura de todos os corpos de prova da amostra (com
+        filename e cp), sem ler as séries. Sem 'criterio', só os adotados
+        (fail_crit de cada ensaio). Retorna None em caso de erro.
+        """
+        try:
+            condicao = "r.criterio = ?" if criterio else "r.adotado = 1"
+            params = [idcontrato, idcampanha, idamostra] + ([criterio] if criterio else [])
+            return pd.read_sql_query(f"""
+                SELECT Cp.filename, Cp.cp, r.*
+                FROM Cp JOIN RupturaEnsaio AS r ON r.idnome = Cp.idnome
+                WHERE Cp.idcontrato = ? AND Cp.idcampanha = ? AND Cp.idamostra = ?
+                  AND {condicao}
+                ORDER BY Cp.idnome, r.lado
+            """, self.conn, params=params)
+
+        except Exception as e:
+            print(f"Erro ao recuperar as rupturas da amostra '{idamostra}': {e}")
+            traceback.print_exc()
+            return None
+
+    def get_rupturas_campanha(self, idcontrato, idcampanha, status='Aprovado', criterios=None):
+        """
+        Pontos de ruptura de todos os corpos de prova da campanha com o
+        status informado (None: todos), numa única consulta, com idamostra,
+        tipo de ensaio (TipoEnsaio.tipo), filename e cp. Sem 'criterios',
+        vêm os adotados (fail_crit) e os do critério 'ultimo'.
+        Retorna None em caso de erro.
+        """
+        try:
+            condicoes = ["Cp.idcontrato = ?", "Cp.idcampanha = ?"]
+            params = [idcontrato, idcampanha]
+            if status:
+                condicoes.append("Cp.status = ?")
+                params.append(status)
+            if criterios:
+                condicoes.append(f"r.criterio IN ({', '.join(['?'] * len(criterios))})")
+                params.extend(criterios)
+            else:
+                condicoes.append("(r.adotado = 1 OR r.criterio = 'ultimo')")
+            return pd.read_sql_query(f"""
+                SELECT Cp.idamostra, COALESCE(TipoEnsaio.tipo, CAST(Cp.idtipoensaio AS TEXT)) AS tipo,
+                       Cp.filename, Cp.cp, r.*
+                FROM Cp
+                JOIN RupturaEnsaio AS r ON r.idnome = Cp.idnome
+                LEFT JOIN TipoEnsaio ON TipoEnsaio.idtipoensaio = Cp.idtipoensaio
+                WHERE {' AND '.join(condicoes)}
+                ORDER BY Cp.idamostra, tipo, r.lado, Cp.idnome
+            """, self.conn, params=params)
+
+        except Exception as e:
+            print(f"Erro ao recuperar as rupturas da campanha '{idcampanha}': {e}")
+            traceback.print_exc()
+            return None
+
+    def get_ciclos(self, filename):
+        """
+        DataFrame de CiclosEnsaio (um ciclo por linha) do ensaio 'filename'.
+        Retorna None se o arquivo não for encontrado ou em caso de erro.
+        """
+        try:
+            idnome = self.get_idnome_by_filename(filename)
+            if idnome is None:
+                print(f"Arquivo '{filename}' não encontrado na tabela 'Cp'.")
+                return None
+            return pd.read_sql_query(
+                "SELECT * FROM CiclosEnsaio WHERE idnome = ? ORDER BY ciclo",
+                self.conn, params=(idnome,)
+            )
+
+        except Exception as e:
+            print(f"Erro ao recuperar os ciclos de '{filename}': {e}")
+            traceback.print_exc()
+            return None
+
+    def get_dados_amostra(self, idcontrato, idcampanha, idamostra, colunas=None):
+        """
+        Linhas de dados de todos os corpos de prova da amostra numa única
+        consulta, empilhadas por idnome (coluna 'idnome' sempre presente;
+        ver teste3.inicios_grupos / teste3.resumo_segmentos).
+        Retorna None em caso de erro.
+        """
+        try:
+            c = self.conn.execute("""
+                SELECT idnome FROM Cp
+                WHERE idcontrato = ? AND idcampanha = ? AND idamostra = ?
+                ORDER BY idnome
+            """, (idcontrato, idcampanha, idamostra))
+            idnomes = [row[0] for row in c.fetchall()]
+            return pd.read_sql_query(sql_linhas_ensaios(len(idnomes), colunas),
+                                     self.conn, params=idnomes)
+
+        except Exception as e:
+            print(f"Erro ao recuperar a amostra '{idamostra}': {e}")
+            traceback.print_exc()
+            return None
+
     def delete_user(self, login):
         """
         Exclui um usuário com base no login fornecido.
@@ -658,6 +1292,235 @@ class DatabaseManager:
             traceback.print_exc()
             return []
 
+    ##########################################################################
+    # Registro de arquivos ingeridos (tamanho, mtime, hash)
+    ##########################################################################
+    def registrar_arquivo(self, filename, registro, idnome=None, commit=True):
+        """
+        Grava/atualiza o registro do arquivo. 'registro' é o dict
+        devolvido por teste3.read_gds ({'caminho','tamanho','mtime_ns','hash'}).
+        Um idnome já registrado não é apagado quando idnome=None.
+        """
+        self.conn.execute("""
+            INSERT INTO RegistroArquivos (filename, caminho, tamanho, mtime_ns, hash, idnome)
+            VALUES (?,?,?,?,?,?)
+            ON CONFLICT(filename) DO UPDATE SET
+                caminho = excluded.caminho,
+                tamanho = excluded.tamanho,
+                mtime_ns = excluded.mtime_ns,
+                hash = excluded.hash,
+                idnome = COALESCE(excluded.idnome, RegistroArquivos.idnome),
+                data_registro = CURRENT_TIMESTAMP
+        """, (
+            filename,
+            registro.get('caminho'),
+            int(registro['tamanho']),
+            int(registro['mtime_ns']),
+            registro['hash'],
+            idnome
+        ))
+        if commit:
+            self.conn.commit()
+
+    def get_registro_arquivos(self):
+        """Retorna {filename: (tamanho, mtime_ns, hash)}."""
+        try:
+            c = self.conn.execute("SELECT filename, tamanho, mtime_ns, hash FROM RegistroArquivos")
+            return {row[0]: (row[1], row[2], row[3]) for row in c.fetchall()}
+        except Exception as e:
+            print(f"Erro ao obter registro de arquivos: {e}")
+            traceback.print_exc()
+            return {}
+
+    def escanear_diretorio(self, directory):
+        """
+        Classifica os .gds de 'directory' comparando com RegistroArquivos:
+
+        - 'inalterados': mesmo tamanho e mtime do registro (o arquivo nem é
+          aberto), ou mtime diferente mas mesmo hash (registro atualizado);
+        - 'alterados': já ingeridos, mas o conteúdo mudou depois;
+        - 'novos': ainda não estão em Cp;
+        - 'em_andamento': acompanhados em modo tail (acompanhamento.py),
+          que crescem a cada leitura e só entram no registro ao finalizar.
+
+        Arquivos salvos em Cp antes da existência do registro são
+        registrados aqui na primeira varredura (hash do conteúdo atual).
+
+        Returns:
+            dict: {'novos': [...], 'alterados': [...], 'inalterados': [...],
+                   'em_andamento': [...]}
+        """
+        resultado = {'novos': [], 'alterados': [], 'inalterados': [], 'em_andamento': []}
+        registro = self.get_registro_arquivos()
+        em_andamento = set(self.listar_acompanhamentos('ativo'))
+        salvos = None  # Cp só é consultado se algum arquivo não estiver no registro
+        mudou = False
+
+        with os.scandir(directory) as it:
+            entradas = sorted((e for e in it if e.is_file() and e.name.endswith('.gds')),
+                              key=lambda e: e.name)
+
+        for entrada in entradas:
+            nome = entrada.name
+            if nome in em_andamento:
+                resultado['em_andamento'].append(nome)
+                continue
+            st = entrada.stat()
+            atual = registro.get(nome)
+
+            if atual is not None:
+                tamanho, mtime_ns, hash_reg = atual
+                if tamanho == st.st_size and mtime_ns == st.st_mtime_ns:
+                    resultado['inalterados'].append(nome)
+                    continue
+                try:
+                    hash_novo = hash_arquivo(entrada.path)
+                except OSError as e:
+                    print(f"Erro ao ler '{nome}': {e}")
+                    continue
+                if hash_novo == hash_reg:
+                    # Só o mtime mudou (cópia, touch...): atualiza o registro
+                    self.registrar_arquivo(nome, {
+                        'caminho': os.path.abspath(entrada.path),
+                        'tamanho': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                        'hash': hash_novo}, commit=False)
+                    mudou = True
+                    resultado['inalterados'].append(nome)
+                else:
+                    resultado['alterados'].append(nome)
+                continue
+
+            if salvos is None:
+                c = self.conn.execute("SELECT filename, idnome FROM Cp")
+                salvos = dict(c.fetchall())
+
+            if nome in salvos:
+                # Ingerido antes do registro existir
+                try:
+                    hash_novo = hash_arquivo(entrada.path)
+                except OSError as e:
+                    print(f"Erro ao ler '{nome}': {e}")
+                    continue
+                self.registrar_arquivo(nome, {
+                    'caminho': os.path.abspath(entrada.path),
+                    'tamanho': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                    'hash': hash_novo}, idnome=salvos[nome], commit=False)
+                mudou = True
+                resultado['inalterados'].append(nome)
+            else:
+                resultado['novos'].append(nome)
+
+        if mudou:
+            self.conn.commit()
+        return resultado
+
+    ##########################################################################
+    # Estado do modo tail (AcompanhamentoArquivos)
+    ##########################################################################
+    _CAMPOS_ACOMPANHAMENTO = (
+        "caminho", "idnome", "offset", "cabecalho", "n_linhas",
+        "metadados", "estado", "resumo", "constantes", "status", "impressao",
+    )
+
+    def salvar_acompanhamento(self, filename, campos, commit=True):
+        """
+        Grava/atualiza o estado de um arquivo em modo tail. 'campos' é um
+        dict com as colunas de AcompanhamentoArquivos (textos JSON já
+        serializados por acompanhamento.py).
+        """
+        nomes = [c for c in self._CAMPOS_ACOMPANHAMENTO if c in campos]
+        valores = [campos[c] for c in nomes]
+        # Atualização parcial (só os campos informados); se não existir, insere
+        c = self.conn.execute(f"""
+            UPDATE AcompanhamentoArquivos
+            SET {", ".join(f"{n} = ?" for n in nomes)}, data_atualizacao = CURRENT_TIMESTAMP
+            WHERE filename = ?
+        """, valores + [filename])
+        if c.rowcount == 0:
+            self.conn.execute(f"""
+                INSERT INTO AcompanhamentoArquivos (filename, {", ".join(nomes)})
+                VALUES ({", ".join(["?"] * (1 + len(nomes)))})
+            """, [filename] + valores)
+        if commit:
+            self.conn.commit()
+
+    def get_acompanhamento(self, filename):
+        """Retorna o estado (dict) de 'filename' em modo tail, ou None."""
+        c = self.conn.execute("SELECT * FROM AcompanhamentoArquivos WHERE filename = ?", (filename,))
+        row = c.fetchone()
+        if not row:
+            return None
+        return dict(zip([d[0] for d in c.description], row))
+
+    def listar_acompanhamentos(self, status='ativo'):
+        """Nomes dos arquivos em modo tail com o 'status' informado."""
+        c = self.conn.execute(
+            "SELECT filename FROM AcompanhamentoArquivos WHERE status = ? ORDER BY filename",
+            (status,)
+        )
+        return [row[0] for row in c.fetchall()]
+
+    ##########################################################################
+    # Fila de ingestão (monitorGDS.py)
+    ##########################################################################
+    def enfileirar_arquivo(self, filename, caminho, tamanho, mtime_ns, commit=True):
+        """
+        Coloca o arquivo na fila como 'pendente'. Um arquivo já na fila com
+        o mesmo tamanho/mtime não volta a ser pendente (ex.: deu 'erro' e
+        não mudou desde então). Retorna True se ficou pendente.
+        """
+        c = self.conn.execute("""
+            INSERT INTO FilaIngestao (filename, caminho, tamanho, mtime_ns)
+            VALUES (?,?,?,?)
+            ON CONFLICT(filename) DO UPDATE SET
+                caminho = excluded.caminho,
+                tamanho = excluded.tamanho,
+                mtime_ns = excluded.mtime_ns,
+                status = 'pendente',
+                mensagem = NULL,
+                data_atualizacao = CURRENT_TIMESTAMP
+            WHERE FilaIngestao.tamanho != excluded.tamanho
+               OR FilaIngestao.mtime_ns != excluded.mtime_ns
+               OR FilaIngestao.status = 'ok'
+        """, (filename, caminho, int(tamanho), int(mtime_ns)))
+        if commit:
+            self.conn.commit()
+        return c.rowcount > 0
+
+    def proximos_da_fila(self, limite):
+        """Até 'limite' arquivos pendentes (mais antigos primeiro): [(filename, caminho)]."""
+        c = self.conn.execute("""
+            SELECT filename, caminho FROM FilaIngestao
+            WHERE status = 'pendente'
+            ORDER BY data_inclusao, filename
+            LIMIT ?
+        """, (limite,))
+        return c.fetchall()
+
+    def marcar_fila(self, filename, status, mensagem=None, commit=True):
+        """Atualiza o status de um item da fila ('processando', 'ok', 'erro')."""
+        self.conn.execute("""
+            UPDATE FilaIngestao
+            SET status = ?,
+                mensagem = ?,
+                tentativas = tentativas + (CASE WHEN ? = 'processando' THEN 1 ELSE 0 END),
+                data_atualizacao = CURRENT_TIMESTAMP
+            WHERE filename = ?
+        """, (status, mensagem, status, filename))
+        if commit:
+            self.conn.commit()
+
+    def retomar_fila(self):
+        """
+        Itens que ficaram 'processando' (monitor interrompido) voltam a
+        'pendente'. Retorna quantos foram retomados.
+        """
+        c = self.conn.execute(
+            "UPDATE FilaIngestao SET status = 'pendente' WHERE status = 'processando'"
+        )
+        self.conn.commit()
+        return c.rowcount
+
     def get_metadata_for_file(self, filename):
         """
         Retorna {NomeLegivel: Valor} consultando MetadadosArquivo,
@@ -796,6 +1659,7 @@ class DatabaseManager:
             return False
 
     def close(self):
+        atexit.unregister(self.otimizar)
         if self.conn:
             self.conn.close()
             print("Conexão fechada.")
@@ -844,213 +1708,444 @@ class DatabaseManager:
             return False
 
     ##########################################################################
-    # save_to_database
+    # Recálculo em lote das colunas calculadas (recalculo.py)
     ##########################################################################
-    def save_to_database(self, metadados, df_to_save, filename):
-        import traceback
-        import numpy as np
-        import re
+    def selecionar_ensaios(self, idcontrato=None, idamostra=None, tipo_ensaio=None):
+        """
+        [(idnome, filename, idcontrato, idcampanha, idamostra), ...] dos
+        ensaios em Cp, opcionalmente filtrados por contrato, amostra e tipo
+        de ensaio (TipoEnsaio.tipo ou número). Os ensaios de uma mesma
+        amostra ficam juntos.
+        """
+        condicoes, params = [], []
+        if idcontrato:
+            condicoes.append("Cp.idcontrato = ?")
+            params.append(idcontrato)
+        if idamostra:
+            condicoes.append("Cp.idamostra = ?")
+            params.append(idamostra)
+        if tipo_ensaio:
+            condicoes.append("(TipoEnsaio.tipo = ? OR CAST(Cp.idtipoensaio AS TEXT) = ?)")
+            params.extend([str(tipo_ensaio), str(tipo_ensaio)])
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        c = self.conn.execute(f"""
+            SELECT Cp.idnome, Cp.filename, Cp.idcontrato, Cp.idcampanha, Cp.idamostra
+            FROM Cp LEFT JOIN TipoEnsaio ON TipoEnsaio.idtipoensaio = Cp.idtipoensaio
+            {where}
+            ORDER BY Cp.idcontrato, Cp.idcampanha, Cp.idamostra, Cp.idnome
+        """, params)
+        return c.fetchall()
+
+    def enfileirar_recalculo(self, idnomes, reiniciar=False):
+        """
+        Coloca os ensaios em RecalculoEnsaios como 'pendente'. Os já
+        presentes mantêm o status (retomada), a não ser com 'reiniciar'.
+        Retorna quantos ficaram pendentes.
+        """
+        with self.conn:
+            for idnome in idnomes:
+                if reiniciar:
+                    self.conn.execute("""
+                        INSERT INTO RecalculoEnsaios (idnome) VALUES (?)
+                        ON CONFLICT(idnome) DO UPDATE SET
+                            status = 'pendente', tentativas = 0, mensagem = NULL,
+                            data_atualizacao = CURRENT_TIMESTAMP
+                    """, (idnome,))
+                else:
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO RecalculoEnsaios (idnome) VALUES (?)", (idnome,)
+                    )
+        return len(self.pendentes_recalculo(idnomes))
+
+    def pendentes_recalculo(self, idnomes=None):
+        """idnomes 'pendente' em RecalculoEnsaios (só os de 'idnomes', se informado)."""
+        c = self.conn.execute(
+            "SELECT idnome FROM RecalculoEnsaios WHERE status = 'pendente' ORDER BY idnome"
+        )
+        pendentes = [row[0] for row in c.fetchall()]
+        if idnomes is not None:
+            selecionados = set(idnomes)
+            pendentes = [i for i in pendentes if i in selecionados]
+        return pendentes
+
+    def marcar_recalculo(self, idnome, status, mensagem=None, commit=True):
+        """Atualiza o status de um ensaio no recálculo ('processando', 'ok', 'erro')."""
+        self.conn.execute("""
+            UPDATE RecalculoEnsaios
+            SET status = ?,
+                mensagem = ?,
+                tentativas = tentativas + (CASE WHEN ? = 'processando' THEN 1 ELSE 0 END),
+                data_atualizacao = CURRENT_TIMESTAMP
+            WHERE idnome = ?
+        """, (status, mensagem, status, idnome))
+        if commit:
+            self.conn.commit()
 
-        cursor = self.conn.cursor()
+    def retomar_recalculo(self):
+        """
+        Ensaios que ficaram 'processando' (recálculo interrompido) voltam a
+        'pendente'. Retorna quantos foram retomados.
+        """
+        c = self.conn.execute(
+            "UPDATE RecalculoEnsaios SET status = 'pendente' WHERE status = 'processando'"
+        )
+        self.conn.commit()
+        return c.rowcount
+
+    def progresso_recalculo(self):
+        """{status: quantidade} de RecalculoEnsaios."""
+        c = self.conn.execute("SELECT status, COUNT(*) FROM RecalculoEnsaios GROUP BY status")
+        return dict(c.fetchall())
+
+    @medido("regravacao_banco", linhas=int)
+    def regravar_colunas_calculadas(self, cursor, ids, df_calculadas):
+        """
+        Regrava as colunas de 'df_calculadas' nas linhas de EnsaiosTriaxiais
+        de 'ids' (mesma ordem), com um único executemany (sem commit).
+        """
+        colunas = df_calculadas.columns.tolist()
+        atribuicoes = ", ".join(f"{c} = ?" for c in colunas)
+        valores = df_calculadas.to_numpy(dtype=float).tolist()
+        cursor.executemany(
+            f"UPDATE EnsaiosTriaxiais SET {atribuicoes} WHERE id = ?",
+            [linha + [int(i)] for linha, i in zip(valores, ids)]
+        )
+        return len(valores)
+
+    def atualizar_campos_metadados(self, cursor, idnome, campos):
+        """Atualiza só os 'campos' ({coluna: valor}) de MetadadosArquivo de 'idnome' (sem commit)."""
+        atribuicoes = ", ".join(f"{c} = ?" for c in campos)
+        cursor.execute(
+            f"UPDATE MetadadosArquivo SET {atribuicoes} WHERE idnome = ?",
+            [_convert_numpy_types(v) for v in campos.values()] + [idnome]
+        )
 
-        def safe_str(value):
-            if isinstance(value, bytes):
-                try:
-                    return value.decode('utf-8').strip()
-                except UnicodeDecodeError:
-                    return ""
-            return str(value).strip() if value is not None else ""
-
-        def convert_numpy_types(value):
-            if isinstance(value, (np.float64, np.float32)):
-                return float(value)
-            elif isinstance(value, (np.int64, np.int32)):
-                return int(value)
-            elif isinstance(value, bytes):
-                try:
-                    return value.decode('utf-8').strip()
-                except UnicodeDecodeError:
-                    return ""
-            else:
-                return value
+    ##########################################################################
+    # save_to_database (e as etapas usadas também pelo modo tail)
+    ##########################################################################
+    def criar_registro_ensaio(self, cursor, metadados, filename, registro=None):
+        """
+        Insere Contrato/Campanha/Amostra/Ensaio/Cp e MetadadosArquivo de um
+        arquivo (sem commit). Se 'registro' (ver teste3.read_gds) for
+        informado, o arquivo também entra em RegistroArquivos.
 
-        try:
-            # Se não houver "sequencial", tenta extrair de "Description of Sample:"
-            desc_value = str(metadados.get("Description of Sample:", "")).strip()
-            if not metadados.get("sequencial"):
-                match_desc = re.match(r"(\d+)[Ss](\d+)", desc_value)
-                if match_desc:
-                    metadados["sequencial"] = match_desc.group(2)
-                else:
-                    metadados["sequencial"] = "00"
-
-            # Campos principais
-            idcontrato   = metadados.get("idcontrato", "")
-            idcampanha   = metadados.get("idcampanha", "")
-            idamostra    = metadados.get("idamostra", "")
-            idtipoensaio = metadados.get("idtipoensaio", 0)
-
-            # Ajustar strings
-            sequencial = safe_str(metadados.get("sequencial", ""))
-            cp_str     = safe_str(metadados.get("cp", ""))
-            rep_str    = safe_str(metadados.get("repeticao", ""))
-
-            # Converter tipos em metadados
-            for key in metadados:
-                metadados[key] = convert_numpy_types(metadados[key])
-
-            # Validações obrigatórias
-            if not idcontrato:
-                raise ValueError("idcontrato está vazio.")
-            if not idcampanha:
-                raise ValueError("idcampanha está vazio.")
-            if not idamostra:
-                raise ValueError("idamostra está vazio.")
-            if sequencial == "":
-                raise ValueError("sequencial está vazio.")
-            if not cp_str:
-                raise ValueError("cp está vazio.")
-            if not rep_str:
-                raise ValueError("repeticao está vazio.")
-
-            tipo_num = int(idtipoensaio) if idtipoensaio else 0
+        Returns:
+            tuple: (idnome, idensaio)
+        """
+        # Se não houver "sequencial", tenta extrair de "Description of Sample:"
+        desc_value = str(metadados.get("Description of Sample:", "")).strip()
+        if not metadados.get("sequencial"):
+            match_desc = re.match(r"(\d+)[Ss](\d+)", desc_value)
+            if match_desc:
+                metadados["sequencial"] = match_desc.group(2)
+            else:
+                metadados["sequencial"] = "00"
+
+        # Campos principais
+        idcontrato   = metadados.get("idcontrato", "")
+        idcampanha   = metadados.get("idcampanha", "")
+        idamostra    = metadados.get("idamostra", "")
+        idtipoensaio = metadados.get("idtipoensaio", 0)
+
+        # Ajustar strings
+        sequencial = _safe_str(metadados.get("sequencial", ""))
+        cp_str     = _safe_str(metadados.get("cp", ""))
+        rep_str    = _safe_str(metadados.get("repeticao", ""))
+
+        # Converter tipos em metadados
+        for key in metadados:
+            metadados[key] = _convert_numpy_types(metadados[key])
+
+        # Validações obrigatórias
+        if not idcontrato:
+            raise ValueError("idcontrato está vazio.")
+        if not idcampanha:
+            raise ValueError("idcampanha está vazio.")
+        if not idamostra:
+            raise ValueError("idamostra está vazio.")
+        if sequencial == "":
+            raise ValueError("sequencial está vazio.")
+        if not cp_str:
+            raise ValueError("cp está vazio.")
+        if not rep_str:
+            raise ValueError("repeticao está vazio.")
+
+        tipo_num = int(idtipoensaio) if idtipoensaio else 0
+        if not self.is_tipo_ensaio_valid(tipo_num):
+            tipo_num = 0
             if not self.is_tipo_ensaio_valid(tipo_num):
-                tipo_num = 0
-                if not self.is_tipo_ensaio_valid(tipo_num):
-                    raise ValueError("TipoEnsaio inválido e 'UNKNOWN' não encontrado.")
+                raise ValueError("TipoEnsaio inválido e 'UNKNOWN' não encontrado.")
+
+        # Inserir Contrato / Campanha / Amostra
+        cursor.execute("INSERT OR IGNORE INTO Contrato (idcontrato) VALUES (?)", (idcontrato,))
+        cursor.execute("""
+            INSERT OR IGNORE INTO Campanha (idcontrato, idcampanha)
+            VALUES (?,?)
+        """, (idcontrato, idcampanha))
+        cursor.execute("""
+            INSERT OR IGNORE INTO Amostra (idcontrato, idcampanha, idamostra)
+            VALUES (?,?,?)
+        """, (idcontrato, idcampanha, idamostra))
+
+        # Criar Ensaio
+        cursor.execute("""
+            INSERT INTO Ensaio (idcontrato, idcampanha, idamostra, idtipoensaio)
+            VALUES (?,?,?,?)
+        """, (idcontrato, idcampanha, idamostra, tipo_num))
+        idensaio = cursor.lastrowid
+
+        # Criar Cp
+        cursor.execute("""
+            INSERT INTO Cp (
+                idcontrato, idcampanha, idamostra, idtipoensaio, idensaio,
+                sequencial, cp, repeticao, filename, status
+            ) VALUES (?,?,?,?,?,?,?,?,?,'NV')
+        """, (
+            idcontrato,
+            idcampanha,
+            idamostra,
+            tipo_num,
+            idensaio,
+            sequencial.zfill(2),
+            cp_str,
+            rep_str,
+            filename
+        ))
+        idnome = cursor.lastrowid
+
+        if registro:
+            self.registrar_arquivo(filename, registro, idnome=idnome, commit=False)
+
+        self._inserir_metadados_arquivo(cursor, idnome, metadados)
+        return idnome, idensaio
+
+    def _inserir_metadados_arquivo(self, cursor, idnome, metadados):
+        """Insere a linha de MetadadosArquivo de 'idnome' (sem commit)."""
+        # Preparar metadados para inserir em MetadadosArquivo
+        metadados_columns = [
+            # 1) Já existentes no cabeçalho do seu array (se desejar manter):
+            "_B","_ad","_cis_inicial","_cis_final",
+            "w_0","w_f","h_init","d_init","sequencial","ram_diam","spec_grav",
+            "idcontrato","idcampanha","idamostra","depth","samp_date","tipo",
+            "init_mass","init_dry_mass","spec_grav_assmeas","date_test_started","date_test_finished",
+            "spec_type","top_drain","base_drain","side_drains","fin_mass","fin_dry_mass",
+            "mach_no","press_sys","cell_no","ring_no","job_loc","mem_thick","sequencial","tech_name",
+            "liq_lim","plas_lim","avg_wc_trim","notes","mass_no4","mass_no10","mass_no40","mass_no200",
+            "mass_silt","mass_clay","mass_coll","trim_proc","moist_cond","ax_stress_inund","water_desc",
+            "test_meth","interp_cv","astm_dep","wc_obt","sat_meth","post_consol_area","fail_crit",
+            "load_filt_paper","filt_paper_cov","young_mod_mem","test_time","test_date","start_rep_data",
+
+            # 2) Metadados computados na classe METADADOS_PARTE2:
+            "dry_unit_weight",       # self.dry_unit_weight
+            "init_void_ratio",       # self.init_void_ratio
+            "init_sat",              # self.init_sat
+            "final_moisture",        # self.final_moisture
+            "Saturacao_c",           # self.Saturacao_c
+            "v_0",                   # self.v_0
+            "vol_solid",             # self.vol_solid
+            "v_w_f",                 # self.v_w_f
+            "ax_disp_0",            # self.ax_disp_0
+            "back_vol_0",           # self.back_vol_0
+            "back_press_0",         # self.back_press_0
+            "rad_press_0",          # self.rad_press_0
+            "pore_press_0",         # self.pore_press_0
+
+            "ax_disp_c",            # self.ax_disp_c
+            "back_vol_c",           # self.back_vol_c
+            "h_init_c",             # self.h_init_c
+            "void_ratio_c",         # self.void_ratio_c
+            "void_ratio_f",         # self.void_ratio_f
+            "final_void_vol",       # self.final_void_vol
+
+            "vol_change_c",         # self.vol_change_c
+            "vol_change_f_c",       # self.vol_change_f_c
+
+            "cons_void_vol_A",      # self.cons_void_vol_A
+            "cons_void_vol_B",      # self.cons_void_vol_B
+            "post_cons_void_A",     # self.post_cons_void_A
+            "post_cons_void_B",     # self.post_cons_void_B
+
+            "consolidated_area_A",  # self.consolidated_area_A
+            "consolidated_area_B",  # self.consolidated_area_B
+            "pore_press_c",         # self.pore_press_c
+            "camb_p_A0",            # self.camb_p_A0
+            "camb_p_B0",            # self.camb_p_B0
+        ]
+
+
+        metadados_db = {}
+        for legivel, abv in METADADOS_MAPPING.items():
+            if abv != "idtipoensaio":  # já usamos acima
+                metadados_db[abv] = metadados.get(abv, None)
+
+        metadados_db["sequencial"] = _safe_str(metadados.get("sequencial", "")).zfill(2)
+
+        col_join     = ", ".join(["idnome"] + metadados_columns)
+        placeholders = ", ".join(["?"] * (1 + len(metadados_columns)))
+        vals         = [idnome]
+
+        for col in metadados_columns:
+            vals.append(metadados_db.get(col, None))
+
+        cursor.execute(f"""
+            INSERT INTO MetadadosArquivo ({col_join})
+            VALUES ({placeholders})
+        """, vals)
+
+    def atualizar_metadados_arquivo(self, idnome, metadados, commit=True):
+        """
+        Regrava a linha de MetadadosArquivo de 'idnome' (ex.: metadados
+        recalculados de um ensaio acompanhado em modo tail).
+        """
+        cursor = self.conn.cursor()
+        for key in metadados:
+            metadados[key] = _convert_numpy_types(metadados[key])
+        cursor.execute("DELETE FROM MetadadosArquivo WHERE idnome = ?", (idnome,))
+        self._inserir_metadados_arquivo(cursor, idnome, metadados)
+        if commit:
+            self.conn.commit()
 
-            # Inserir Contrato / Campanha / Amostra
-            cursor.execute("INSERT OR IGNORE INTO Contrato (idcontrato) VALUES (?)", (idcontrato,))
-            cursor.execute("""
-                INSERT OR IGNORE INTO Campanha (idcontrato, idcampanha)
-                VALUES (?,?)
-            """, (idcontrato, idcampanha))
+    @medido("insercao_banco", linhas=int)
+    def inserir_linhas_ensaio(self, cursor, idnome, df_to_save):
+        """
+        Insere as linhas de 'df_to_save' em EnsaiosTriaxiais para 'idnome'
+        com um único executemany (sem commit; a transação é a de quem
+        chama). Retorna o número de linhas inseridas.
+
+        Tabela só com colunas numéricas (o caso normal): a conversão para
+        tipos do Python é feita de uma vez (to_numpy().tolist(), o mesmo
+        upcast para float do iterrows de antes). Com colunas de outros
+        tipos, cada valor passa pelo _convert_numpy_types.
+        """
+        col_str = ", ".join(["idnome"] + df_to_save.columns.tolist())
+        # idnome (inteiro) vai como constante no SQL: as linhas seguem direto do tolist
+        placeholders = ", ".join([str(int(idnome))] + ["?"] * len(df_to_save.columns))
+
+        if all(dtype.kind in "biuf" for dtype in df_to_save.dtypes):
+            linhas = df_to_save.to_numpy().tolist()
+        else:
+            linhas = [[_convert_numpy_types(v) for v in linha]
+                      for linha in df_to_save.itertuples(index=False, name=None)]
+        cursor.executemany(
+            f"INSERT INTO EnsaiosTriaxiais ({col_str}) VALUES ({placeholders})", linhas
+        )
+        return len(linhas)
+
+    def inserir_linhas_ficticias(self, cursor, idnome, substituir=False):
+        """
+        Linhas só com idnome e stage_no (estágios de cisalhamento 8 a 11)
+        gravadas ao final de cada ensaio. Com 'substituir' (modo tail), as
+        já existentes são removidas antes, ficando sempre depois dos dados.
+        """
+        if substituir:
             cursor.execute("""
-                INSERT OR IGNORE INTO Amostra (idcontrato, idcampanha, idamostra)
-                VALUES (?,?,?)
-            """, (idcontrato, idcampanha, idamostra))
-
-            # Criar Ensaio
+                DELETE FROM EnsaiosTriaxiais
+                WHERE idnome = ? AND stage_no BETWEEN 8 AND 11 AND time_test_start IS NULL
+            """, (idnome,))
+        for stage_no in range(8, 12):
             cursor.execute("""
-                INSERT INTO Ensaio (idcontrato, idcampanha, idamostra, idtipoensaio)
-                VALUES (?,?,?,?)
-            """, (idcontrato, idcampanha, idamostra, tipo_num))
-            idensaio = cursor.lastrowid
+                INSERT INTO EnsaiosTriaxiais (idnome, stage_no)
+                VALUES (?, ?)
+            """, (idnome, stage_no))
+        return 4
+
+    def remover_linhas_ensaio(self, cursor, idnome):
+        """Apaga todas as linhas de EnsaiosTriaxiais de 'idnome' (sem commit)."""
+        cursor.execute("DELETE FROM EnsaiosTriaxiais WHERE idnome = ?", (idnome,))
+        cursor.execute("DELETE FROM EstagiosEnsaio WHERE idnome = ?", (idnome,))
+        cursor.execute("DELETE FROM CiclosEnsaio WHERE idnome = ?", (idnome,))
+        cursor.execute("DELETE FROM RupturaEnsaio WHERE idnome = ?", (idnome,))
+
+    def salvar_ruptura(self, cursor, idnome):
+        """
+        Regrava os pontos de ruptura (RupturaEnsaio) de 'idnome' a partir
+        das linhas já inseridas do cisalhamento (_cis_inicial a _cis_final
+        de MetadadosArquivo, sem as fictícias); o critério de fail_crit fica
+        marcado como 'adotado' (sem commit). Chamado ao final de cada
+        gravação do ensaio, depois do salvar_estagios. Retorna o nº de linhas.
+        """
+        cursor.execute("DELETE FROM RupturaEnsaio WHERE idnome = ?", (idnome,))
+        meta = cursor.execute(
+            "SELECT _cis_inicial, _cis_final, fail_crit FROM MetadadosArquivo WHERE idnome = ?",
+            (idnome,)
+        ).fetchone() or (None, None, None)
+        cis_ini = int(safe_float_conversion(meta[0], 8))
+        cis_fim = int(safe_float_conversion(meta[1], 11))
+
+        faixas = faixas_estagios(trechos_estagios(self.conn, idnome), cis_ini, cis_fim)
+        sql, params = sql_linhas_estagios(faixas, ["id", "stage_no", "time_test_start"]
+                                          + list(COLUNAS_RUPTURA))
+        df = pd.read_sql_query(sql, self.conn, params=[idnome] + params)
+        df = df[df["time_test_start"].notna()].reset_index(drop=True)
+
+        pontos = pontos_ruptura(df)
+        if pontos.empty:
+            return 0
+        pontos["id_linha"] = df["id"].to_numpy()[pontos["linha"].to_numpy()]
+        pontos["adotado"] = (pontos["criterio"] == criterio_ruptura(meta[2])).astype(int)
+        colunas = ["criterio", "lado", "adotado", "id_linha", "stage_no", "ax_strain",
+                   "q", "p_efetiva", "e", "u", "du", "nqp", "razao_tensoes",
+                   "eff_ax_stress", "eff_rad_stress"]
+        cursor.executemany(
+            f"INSERT INTO RupturaEnsaio (idnome, {', '.join(colunas)}) "
+            f"VALUES ({', '.join(['?'] * (len(colunas) + 1))})",
+            [[idnome] + [_convert_numpy_types(v) for v in linha]
+             for linha in pontos[colunas].itertuples(index=False)]
+        )
+        return len(pontos)
+
+    def salvar_ciclos(self, cursor, idnome, ciclos):
+        """
+        Regrava a tabela por ciclo (ciclico.analisar_ciclos) de 'idnome'
+        em CiclosEnsaio, com um único executemany (sem commit).
+        Retorna o nº de ciclos.
+        """
+        cursor.execute("DELETE FROM CiclosEnsaio WHERE idnome = ?", (idnome,))
+        if ciclos is None or ciclos.empty:
+            return 0
+        colunas = ciclos.columns.tolist()
+        cursor.executemany(
+            f"INSERT INTO CiclosEnsaio (idnome, {', '.join(colunas)}) "
+            f"VALUES ({', '.join(['?'] * (len(colunas) + 1))})",
+            [[idnome] + [_convert_numpy_types(v) for v in linha]
+             for linha in ciclos.itertuples(index=False)]
+        )
+        return len(ciclos)
+
+    def salvar_estagios(self, cursor, idnome):
+        """
+        Regrava o índice de estágios (EstagiosEnsaio) de 'idnome' a partir
+        das linhas já inseridas, incluindo as fictícias (sem commit).
+        Chamado ao final de cada gravação do ensaio. Retorna o nº de trechos.
+        """
+        cursor.execute("DELETE FROM EstagiosEnsaio WHERE idnome = ?", (idnome,))
+        cursor.execute(f"""
+            INSERT INTO EstagiosEnsaio
+                (idnome, stage_no, id_inicio, id_fim, n_linhas, tempo_inicio, tempo_fim)
+            SELECT ?, t.stage_no, t.id_inicio, t.id_fim, t.n_linhas,
+                   (SELECT time_test_start FROM EnsaiosTriaxiais WHERE id = t.id_inicio),
+                   (SELECT time_test_start FROM EnsaiosTriaxiais WHERE id = t.id_fim)
+            FROM ({_SQL_TRECHOS_ESTAGIOS}) AS t
+        """, (idnome, idnome))
+        return cursor.rowcount
+
+    def save_to_database(self, metadados, df_to_save, filename, registro=None):
+        """
+        Grava Contrato/Campanha/Amostra/Ensaio/Cp, MetadadosArquivo e a
+        tabela em EnsaiosTriaxiais numa única transação. Se 'registro'
+        (ver teste3.read_gds) for informado, o arquivo também entra em
+        RegistroArquivos. Retorna True/False.
+        """
+        cursor = self.conn.cursor()
 
-            # Criar Cp
-            cursor.execute("""
-                INSERT INTO Cp (
-                    idcontrato, idcampanha, idamostra, idtipoensaio, idensaio,
-                    sequencial, cp, repeticao, filename, status
-                ) VALUES (?,?,?,?,?,?,?,?,?,'NV')
-            """, (
-                idcontrato,
-                idcampanha,
-                idamostra,
-                tipo_num,
-                idensaio,
-                sequencial.zfill(2),
-                cp_str,
-                rep_str,
-                filename
-            ))
-            idnome = cursor.lastrowid
-
-            # Preparar metadados para inserir em MetadadosArquivo
-            metadados_columns = [
-                # 1) Já existentes no cabeçalho do seu array (se desejar manter):
-                "_B","_ad","_cis_inicial","_cis_final",
-                "w_0","w_f","h_init","d_init","sequencial","ram_diam","spec_grav",
-                "idcontrato","idcampanha","idamostra","depth","samp_date","tipo",
-                "init_mass","init_dry_mass","spec_grav_assmeas","date_test_started","date_test_finished",
-                "spec_type","top_drain","base_drain","side_drains","fin_mass","fin_dry_mass",
-                "mach_no","press_sys","cell_no","ring_no","job_loc","mem_thick","sequencial","tech_name",
-                "liq_lim","plas_lim","avg_wc_trim","notes","mass_no4","mass_no10","mass_no40","mass_no200",
-                "mass_silt","mass_clay","mass_coll","trim_proc","moist_cond","ax_stress_inund","water_desc",
-                "test_meth","interp_cv","astm_dep","wc_obt","sat_meth","post_consol_area","fail_crit",
-                "load_filt_paper","filt_paper_cov","young_mod_mem","test_time","test_date","start_rep_data",
-
-                # 2) Metadados computados na classe METADADOS_PARTE2:
-                "dry_unit_weight",       # self.dry_unit_weight
-                "init_void_ratio",       # self.init_void_ratio
-                "init_sat",              # self.init_sat
-                "final_moisture",        # self.final_moisture
-                "Saturacao_c",           # self.Saturacao_c
-                "v_0",                   # self.v_0
-                "vol_solid",             # self.vol_solid
-                "v_w_f",                 # self.v_w_f
-                "ax_disp_0",            # self.ax_disp_0
-                "back_vol_0",           # self.back_vol_0
-                "back_press_0",         # self.back_press_0
-                "rad_press_0",          # self.rad_press_0
-                "pore_press_0",         # self.pore_press_0
-
-                "ax_disp_c",            # self.ax_disp_c
-                "back_vol_c",           # self.back_vol_c
-                "h_init_c",             # self.h_init_c
-                "void_ratio_c",         # self.void_ratio_c
-                "void_ratio_f",         # self.void_ratio_f
-                "final_void_vol",       # self.final_void_vol
-
-                "vol_change_c",         # self.vol_change_c
-                "vol_change_f_c",       # self.vol_change_f_c
-
-                "cons_void_vol_A",      # self.cons_void_vol_A
-                "cons_void_vol_B",      # self.cons_void_vol_B
-                "post_cons_void_A",     # self.post_cons_void_A
-                "post_cons_void_B",     # self.post_cons_void_B
-
-                "consolidated_area_A",  # self.consolidated_area_A
-                "consolidated_area_B",  # self.consolidated_area_B
-                "pore_press_c",         # self.pore_press_c
-                "camb_p_A0",            # self.camb_p_A0
-                "camb_p_B0",            # self.camb_p_B0
-            ]
-
-
-            metadados_db = {}
-            for legivel, abv in METADADOS_MAPPING.items():
-                if abv != "idtipoensaio":  # já usamos acima
-                    metadados_db[abv] = metadados.get(abv, None)
-
-            metadados_db["sequencial"] = sequencial.zfill(2)
-
-            col_join     = ", ".join(["idnome"] + metadados_columns)
-            placeholders = ", ".join(["?"] * (1 + len(metadados_columns)))
-            vals         = [idnome]
-
-            for col in metadados_columns:
-                vals.append(metadados_db.get(col, None))
-
-            cursor.execute(f"""
-                INSERT INTO MetadadosArquivo ({col_join})
-                VALUES ({placeholders})
-            """, vals)
-
-            # Inserir dados em EnsaiosTriaxiais
-            inserted_rows = 0
-            ensaios_columns = df_to_save.columns.tolist()
-            ensaios_columns_with_id = ["idnome"] + ensaios_columns
-            placeholders2 = ", ".join(["?"] * len(ensaios_columns_with_id))
-            col_str = ", ".join(ensaios_columns_with_id)
-
-            for _, row_data in df_to_save.iterrows():
-                row_list = list(row_data.values)
-                row_list = [convert_numpy_types(val) for val in row_list]
-                insert_data = [idnome] + row_list
-                cursor.execute(f"""
-                    INSERT INTO EnsaiosTriaxiais ({col_str})
-                    VALUES ({placeholders2})
-                """, insert_data)
-                inserted_rows += 1
+        try:
+            idnome, idensaio = self.criar_registro_ensaio(cursor, metadados, filename, registro)
+            inserted_rows = self.inserir_linhas_ensaio(cursor, idnome, df_to_save)
 
             # inserir estágios cisalhamento (exemplo: 8 a 11)
-            for stage_no in range(8, 12):
-                cursor.execute("""
-                    INSERT INTO EnsaiosTriaxiais (idnome, stage_no)
-                    VALUES (?, ?)
-                """, (idnome, stage_no))
-                inserted_rows += 1
+            inserted_rows += self.inserir_linhas_ficticias(cursor, idnome)
+            self.salvar_estagios(cursor, idnome)
+            self.salvar_ruptura(cursor, idnome)
 
             # Se houver dados de granulometria
             if "granA_data" in metadados:
@@ -1060,17 +2155,23 @@ class DatabaseManager:
 
             self.conn.commit()
             print("Salvo no banco de dados com sucesso.")
+            self.otimizar_se_preciso()
+            return True
 
         except sqlite3.IntegrityError as e:
+            self.conn.rollback()
             if "UNIQUE constraint failed: Cp.filename" in str(e):
                 print(f"Erro ao salvar no banco: {str(e)}")
                 traceback.print_exc()
             else:
                 print(f"Erro ao salvar no banco: {str(e)}")
                 traceback.print_exc()
+            return False
         except Exception as e:
+            self.conn.rollback()
             print(f"Erro ao salvar no banco de dados: {e}")
             traceback.print_exc()
+            return False
 
 
 import os
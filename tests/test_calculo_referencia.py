@@ -0,0 +1,56 @@
+# Núcleo de cálculo (teste3.calcular_tabela) contra uma referência
+# congelada: a saída do TableProcessor.process_table_data original (commit
+# "baseline", com o teste.fix_gds antes para a vírgula decimal) para os
+# arquivos sintéticos de gerador_gds.gerar_gds(600 linhas, semente 7),
+# com ponto e com vírgula decimal, guardada em dados/referencia_calculo.npz.
+# O resultado tem que ser idêntico bit a bit, inclusive os atributos do
+# METADADOS_PARTE2.
+#
+# PARA RODAR, DIGITAR PELO PROMPT:
+# python -m pytest tests
+
+import os
+import json
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gerador_gds import gerar_gds
+from teste import hash_arquivo
+from teste2 import preparar_metadados_gds
+from teste3 import calcular_tabela, ler_metadados_gds, read_gds
+from testeBD import METADADOS_MAPPING
+
+REFERENCIA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados",
+                          "referencia_calculo.npz")
+N_LINHAS = 600
+SEMENTE = 7
+
+
+def _referencia(variante):
+    with np.load(REFERENCIA) as z:
+        info = json.loads(str(z["__info__"]))[variante]
+        df = pd.DataFrame({c: z[f"{variante}_{i}"] for i, c in enumerate(info["colunas"])})
+    return df, info
+
+
+@pytest.mark.parametrize("variante, virgula_decimal", [("ponto", False), ("virgula", True)])
+def test_calcular_tabela_igual_a_referencia(tmp_path, variante, virgula_decimal):
+    esperado, info = _referencia(variante)
+
+    caminho = gerar_gds(str(tmp_path / f"{variante}.gds"), N_LINHAS, virgula_decimal, SEMENTE)
+    # Gerador alterado: a referência tem que ser refeita com o código original
+    assert hash_arquivo(caminho) == info["hash_gds"]
+
+    lido = ler_metadados_gds(caminho, METADADOS_MAPPING)
+    metadados, _ = preparar_metadados_gds(dict(lido["metadados"]))
+    resultado = calcular_tabela(read_gds(caminho, usar_cache=False)["df"], metadados)
+
+    pd.testing.assert_frame_equal(resultado["df"].reset_index(drop=True), esperado,
+                                  check_exact=True)
+
+    for attr, valor in info["metadados_parte2"].items():
+        atual = float(metadados[attr])
+        assert atual == valor or (math.isnan(atual) and math.isnan(valor)), attr
@@ -0,0 +1,75 @@
+# Migrações do esquema (testeBD.MIGRACOES): as consultas de cada migração
+# devem usar o índice esperado no EXPLAIN QUERY PLAN.
+#
+# PARA RODAR, DIGITAR PELO PROMPT:
+# python -m pytest tests
+
+import sqlite3
+
+import pytest
+
+from testeBD import (DatabaseManager, MIGRACOES, VERSAO_ESQUEMA, aplicar_migracoes,
+                     verificar_planos_consulta, versao_esquema)
+
+
+def _esquema_sem_migracoes():
+    """Conexão em memória só com as tabelas do create_tables (versão 0)."""
+    db = object.__new__(DatabaseManager)
+    db.conn = sqlite3.connect(":memory:")
+    db.create_tables()
+    return db.conn
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    """DatabaseManager (singleton) num banco novo, descartado no fim."""
+    DatabaseManager._instance = None
+    db = DatabaseManager(db_path=str(tmp_path / "database.db"))
+    yield db
+    db.close()
+    DatabaseManager._instance = None
+
+
+def test_migracoes_aplicadas_ao_conectar(db_manager):
+    assert versao_esquema(db_manager.conn) == VERSAO_ESQUEMA
+    assert verificar_planos_consulta(db_manager.conn) == []
+
+
+def test_planos_usam_indices_depois_de_migrar():
+    conn = _esquema_sem_migracoes()
+    assert aplicar_migracoes(conn) == [m[0] for m in MIGRACOES]
+    assert versao_esquema(conn) == VERSAO_ESQUEMA
+    assert verificar_planos_consulta(conn) == []
+    # Já migrado: nada a aplicar
+    assert aplicar_migracoes(conn) == []
+
+
+def test_planos_sem_indices_sao_apontados():
+    conn = _esquema_sem_migracoes()
+    conn.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+    problemas = verificar_planos_consulta(conn)
+    esperados = [(versao, sql) for versao, _, _, planos in MIGRACOES for sql, _, _ in planos]
+    assert [(versao, sql) for versao, sql, _ in problemas] == esperados
+
+
+def test_planos_independem_dos_dados():
+    # Poucas linhas iguais + ANALYZE: o SQLite pode preferir varrer Cp, mas
+    # a conferência é feita numa cópia vazia do esquema
+    conn = _esquema_sem_migracoes()
+    aplicar_migracoes(conn)
+    conn.executemany("""
+        INSERT INTO Cp (idcontrato, idcampanha, idamostra, idtipoensaio, idensaio, filename, status)
+        VALUES ('C', 'K', 'A', 1, 1, ?, 'Aprovado')
+    """, [(f"f{i}.gds",) for i in range(4)])
+    conn.execute("ANALYZE")
+    assert verificar_planos_consulta(conn) == []
+
+
+def test_migracao_com_erro_fica_na_versao_anterior():
+    conn = _esquema_sem_migracoes()
+    migracoes = MIGRACOES + ((VERSAO_ESQUEMA + 1, "inválida",
+                              ("CREATE INDEX idx_invalido ON TabelaInexistente (x)",), ()),)
+    with pytest.raises(sqlite3.OperationalError):
+        aplicar_migracoes(conn, migracoes)
+    assert versao_esquema(conn) == VERSAO_ESQUEMA
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'idx_invalido'").fetchone()[0] == 0